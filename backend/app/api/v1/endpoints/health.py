@@ -1,9 +1,15 @@
-# import asyncpg
-import asyncpg
 from fastapi import APIRouter
+from sqlalchemy import text
 
 from app.core.logging import get_logger
 from app.core.settings import settings
+from app.db.database import sessionmanager
+from app.services.document_preprocessor import document_preprocessor
+from app.services.llm_cache import llm_response_cache
+from app.services.model_router import model_router
+from app.services.rate_limiter import rate_limiter
+from app.services.task_dedupe import task_deduplicator
+from app.services.task_scheduler import task_scheduler
 
 router = APIRouter(prefix="/api/v1/health", tags=["Health"])
 logger = get_logger()
@@ -15,6 +21,11 @@ async def health_check():
     - Application is running
     - Database is reachable
     - LLM services are responsive
+    - Connection pool usage (checked out, overflow, checkout wait)
+    - Task scheduler slots and queue
+    - LLM rate limiter delays per model
+    - LLM response cache hits and misses
+    - LLM deployment latency, errors and failovers
     """
     health_status = {"status": "ok"}
 
@@ -26,6 +37,16 @@ async def health_check():
         logger.error(f"Database connection error: {e}")
         health_status["database"] = "unreachable"
         health_status["status"] = "error"
+    try:
+        health_status["database_pool"] = sessionmanager.pool_stats()
+    except Exception:
+        logger.exception("Could not read connection pool stats")
+    health_status["task_scheduler"] = task_scheduler.stats()
+    health_status["rate_limiter"] = rate_limiter.stats()
+    health_status["llm_cache"] = llm_response_cache.stats()
+    health_status["llm_router"] = model_router.stats()
+    health_status["document_preprocessor"] = document_preprocessor.stats()
+    health_status["task_dedupe"] = task_deduplicator.stats()
     return health_status
 
 
@@ -33,9 +54,9 @@ async def test_db_connection():
     try:
         logger.info(f"Testing connection to {settings.DATABASE_URL}")
         # conn = psycopg2.connect(settings.DATABASE_URL)
-        conn = asyncpg.connect(settings.DATABASE_URL)
+        async with sessionmanager.connect() as connection:
+            await connection.execute(text("SELECT 1"))
         logger.info("Successfully connected to the database!")
-        conn.close()
     except Exception as e:
         logger.error(f"Database connection failed: {e!s}")
         raise e
@@ -1,18 +1,31 @@
-from typing import Dict
+"""System endpoints: the models and frameworks tasks can use."""
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Response
 
 from app.core.enums import get_mas_framework_names
-from app.models.llm import get_models, get_model_ids
+from app.models.llm import model_registry
 
 router = APIRouter(prefix="/system", tags=["system"])
 
 
-@router.get("/maf-llm-models", response_model=Dict)
-def get_maf_models():
-    return get_model_ids()
+@router.get("/maf-llm-models", response_model=list[str])
+def get_maf_models(request: Request):
+    """Ids of the LLM models, answered with 304 when the client's copy is current."""
+    # The registry is immutable: the body is serialized once and clients revalidate
+    # with If-None-Match
+    etag = f'"{model_registry.etag}"'
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=model_registry.ids_json, media_type="application/json", headers=headers
+    )
 
-@router.get("/maf-frameworks", response_model=Dict)
+
+@router.get("/maf-frameworks", response_model=list[str])
 def get_maf_frameworks():
     return get_mas_framework_names()
 
@@ -1,8 +1,29 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, File, Query, UploadFile
+"""Task endpoints: create, upload inputs, start, and follow progress."""
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    File,
+    Query,
+    Request,
+    UploadFile,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.database import get_db
-from app.schemas.task import TaskRequest, TaskResponse
+from app.schemas.task import (
+    BulkTaskRequest,
+    BulkTaskResponse,
+    BulkTaskStartRequest,
+    TaskFileAttachResponse,
+    TaskFileReference,
+    TaskListFilters,
+    TaskPage,
+    TaskRequest,
+    TaskResponse,
+)
 from app.services import task_service
 
 router = APIRouter(prefix="/task", tags=["task"])
@@ -14,6 +35,25 @@ async def create_task(task_request: TaskRequest, db: AsyncSession = Depends(get_
     return await task_service.create_task(task_request, db)
 
 
+# Declared before the /{task_id}/... routes, "bulk" is not a task ID
+@router.post("/bulk", response_model=BulkTaskResponse, status_code=201)
+async def create_tasks_bulk(
+    bulk_request: BulkTaskRequest, db: AsyncSession = Depends(get_db)
+):
+    """Create many tasks at once, with a result per item."""
+    return await task_service.create_tasks_bulk(bulk_request, db)
+
+
+@router.post("/bulk/start", response_model=BulkTaskResponse)
+async def start_tasks_bulk(
+    bulk_request: BulkTaskStartRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+):
+    """Start many existing tasks at once, with a result per item."""
+    return await task_service.start_tasks_bulk(bulk_request, background_tasks, db)
+
+
 @router.post("/{task_id}/upload", response_model=TaskResponse)
 async def upload_file_to_task(
     task_id: str,
@@ -21,7 +61,27 @@ async def upload_file_to_task(
     db: AsyncSession = Depends(get_db),
 ):
     """Upload file to an existing task."""
-    return await task_service.upload_file_to_task(task_id, input_file)
+    return await task_service.upload_file_to_task(task_id, input_file, db)
+
+
+@router.post("/{task_id}/uploads", response_model=TaskResponse)
+async def upload_files_to_task(
+    task_id: str,
+    input_files: list[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """Upload several files to an existing task, streamed with SHA-256 digests."""
+    return await task_service.upload_files_to_task(task_id, input_files, db)
+
+
+@router.post("/{task_id}/files/by-hash", response_model=TaskFileAttachResponse)
+async def attach_files_by_hash(
+    task_id: str,
+    files: list[TaskFileReference],
+    db: AsyncSession = Depends(get_db),
+):
+    """Add files by SHA-256; contents already stored are attached without an upload."""
+    return await task_service.attach_files_by_hash(task_id, files, db)
 
 
 @router.post("/{task_id}/start", response_model=TaskResponse)
@@ -30,10 +90,31 @@ async def start_task(task_id: str, background_tasks: BackgroundTasks, db: AsyncS
     return await task_service.start_task(task_id, background_tasks, db)
 
 
+@router.get("/list", response_model=TaskPage)
+async def list_tasks(
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(20, ge=1, le=200),
+    filters: TaskListFilters = Depends(),
+    db: AsyncSession = Depends(get_db),
+):
+    """Retrieve task summaries newest first, paginated with a cursor."""
+    return await task_service.list_tasks(limit, cursor, filters, db)
+
+
 @router.get("/{task_id}", response_model=TaskResponse)
-async def read_task(task_id: str):
+async def read_task(task_id: str, db: AsyncSession = Depends(get_db)):
     """Retrieve details of a specific task."""
-    return await task_service.get_task_details(task_id)
+    return await task_service.get_task_details(task_id, db)
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """Stream status transitions, agent steps, live URL and final answer of a task."""
+    return StreamingResponse(
+        await task_service.stream_task_events(task_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/", response_model=list[TaskResponse])
@@ -8,11 +8,72 @@ class MultiAgentFrameworks(Enum):
     AM1 = "AM1"
 
 class TaskStatus(Enum):
+    QUEUED = "queued"  # Started, waiting for a scheduler slot or a worker
     IN_PROGRESS = "in_progress"
     SUCCESS = "success"
     CREATED = "created"
     FAILED = "failed"
     PARTIAL_SUCCESS = "partial_success"
 
+class TaskExecutionBackend(Enum):
+    """Where started tasks run, see TASK_EXECUTION_BACKEND."""
+
+    BACKGROUND = "background"  # FastAPI BackgroundTasks inside the API process
+    POSTGRES = "postgres"  # Durable task_jobs queue drained by app.worker
+    KAFKA = "kafka"  # KafkaTaskRequest published to a topic drained by app.worker
+
+class SyncExecutorMode(Enum):
+    """How the SyncTaskExecutor runs blocking jobs, see SYNC_EXECUTOR_MODE."""
+
+    PROCESS = "process"  # One spawned process per job, can be terminated
+    THREAD = "thread"  # Shared thread pool, cancellation only stops waiting
+
+class KafkaTaskType(Enum):
+    """Kind of job published on the Kafka task topic."""
+
+    EXECUTE_TASK = "execute_task"
+
+class EventHubBackend(Enum):
+    """Transport of task progress events, see EVENT_HUB_BACKEND."""
+
+    MEMORY = "memory"  # Events stay inside one process
+    POSTGRES = "postgres"  # LISTEN/NOTIFY, shared by API replicas and workers
+
+class RateLimiterBackend(Enum):
+    """Where LLM rate limit buckets live, see RATE_LIMITER_BACKEND."""
+
+    LOCAL = "local"  # Buckets in process memory
+    POSTGRES = "postgres"  # Buckets in rate_limit_buckets, shared by replicas
+
+class BlobStoreBackend(Enum):
+    """Where task input file contents live, see BLOB_STORE_BACKEND."""
+
+    LOCAL = "local"  # Blobs under BLOB_STORE_DIR
+    S3 = "s3"  # Blobs in an S3-compatible bucket (AWS, MinIO, ...)
+
+class TaskEventType(Enum):
+    """Kind of task progress event streamed to clients."""
+
+    STATUS = "status"
+    STEP = "step"
+    LIVE_URL = "live_url"
+    FINAL_ANSWER = "final_answer"
+
+class TaskDedupeMode(Enum):
+    """How a task got its result, recorded in task_metadata.dedupe.mode."""
+
+    LEADER = "leader"  # Ran the agents, identical tasks attach to it
+    WAITING = "waiting"  # Attached to a running leader, waiting for its result
+    COALESCED = "coalesced"  # Took the result of the leader it waited for
+    REUSED = "reused"  # Took a fresh result of an identical finished task
+
+class JobStatus(Enum):
+    """Status of a job in the Postgres queue."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
 def get_mas_framework_names():
     return [e.value for e in MultiAgentFrameworks]
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""Exceptions raised by the services and the database layer."""
+
+class TaskNotFoundError(ValueError):
+    """A job references a task that does not exist (anymore)."""
+
+    def __init__(self, task_id: str):
+        """Build the error for ``task_id``."""
+        super().__init__(f"Task {task_id} not found")
+        self.task_id = task_id
+
+
+class ProducerNotStartedError(RuntimeError):
+    """A Kafka message was sent before ``KafkaProducer.start``."""
+
+    def __init__(self):
+        """Build the error."""
+        super().__init__("Producer not started")
+
+
+class DatabaseNotInitializedError(Exception):
+    """The session manager was used before ``init`` or after ``close``."""
+
+    def __init__(self):
+        """Build the error."""
+        super().__init__("DatabaseSessionManager is not initialized")
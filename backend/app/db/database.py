@@ -1,6 +1,8 @@
 import contextlib
+import time
 from collections.abc import AsyncIterator
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
     AsyncEngine,
@@ -10,6 +12,7 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import declarative_base
 
+from app.core.exceptions import DatabaseNotInitializedError
 from app.core.settings import settings
 
 Base = declarative_base()
@@ -20,14 +23,67 @@ class DatabaseSessionManager:
         self._engine: AsyncEngine | None = None
         self._sessionmaker: async_sessionmaker | None = None
         self.host: str = host
+        self.pool_checkouts: int = 0
+        self._checkout_waits: int = 0
+        self._checkout_wait_total: float = 0.0
+        self._checkout_wait_max: float = 0.0
 
     def init(self):
-        self._engine = create_async_engine(self.host)
-        self._sessionmaker = async_sessionmaker(autocommit=False, bind=self._engine)
+        connect_args = {}
+        if "+asyncpg" in self.host:
+            connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        self._engine = create_async_engine(
+            self.host,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            echo=settings.DB_ECHO,
+            connect_args=connect_args,
+        )
+        # Objects stay readable after commit, sessions are shared across several
+        # repository calls (and commits) within one request.
+        self._sessionmaker = async_sessionmaker(
+            autocommit=False, expire_on_commit=False, bind=self._engine
+        )
+        self.pool_checkouts = 0
+        self._checkout_waits = 0
+        self._checkout_wait_total = 0.0
+        self._checkout_wait_max = 0.0
+        event.listen(self._engine.sync_engine, "checkout", self._on_checkout)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.pool_checkouts += 1
+
+    def _record_checkout_wait(self, started: float):
+        waited = time.perf_counter() - started
+        self._checkout_waits += 1
+        self._checkout_wait_total += waited
+        self._checkout_wait_max = max(self._checkout_wait_max, waited)
+
+    def pool_stats(self) -> dict:
+        """Runtime usage of the pool, to size DB_POOL_SIZE and DB_MAX_OVERFLOW."""
+        if self._engine is None:
+            raise DatabaseNotInitializedError
+        pool = self._engine.pool
+        waits = self._checkout_waits
+        return {
+            "size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.pool_checkouts,
+            "avg_wait_ms": (
+                round(self._checkout_wait_total / waits * 1000, 3) if waits else 0.0
+            ),
+            "max_wait_ms": round(self._checkout_wait_max * 1000, 3),
+        }
 
     async def close(self):
         if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
+            raise DatabaseNotInitializedError
         await self._engine.dispose()
         self._engine = None
         self._sessionmaker = None
@@ -35,9 +91,11 @@ class DatabaseSessionManager:
     @contextlib.asynccontextmanager
     async def connect(self) -> AsyncIterator[AsyncConnection]:
         if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
+            raise DatabaseNotInitializedError
 
+        started = time.perf_counter()
         async with self._engine.begin() as connection:
+            self._record_checkout_wait(started)
             try:
                 yield connection
             except Exception:
@@ -47,16 +105,21 @@ class DatabaseSessionManager:
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncIterator[AsyncSession]:
         if self._sessionmaker is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-
-        session = self._sessionmaker()
-        try:
-            yield session
-        except Exception:
-            await session.rollback()
-            raise
-        finally:
-            await session.close()
+            raise DatabaseNotInitializedError
+
+        # Bind the session to one connection for its whole lifetime, so that it
+        # checks out a single pooled connection however many times it commits.
+        started = time.perf_counter()
+        async with self._engine.connect() as connection:
+            self._record_checkout_wait(started)
+            session = self._sessionmaker(bind=connection)
+            try:
+                yield session
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
 
     # Used for testing
     async def create_all(self, connection: AsyncConnection):
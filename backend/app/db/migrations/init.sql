@@ -18,3 +18,55 @@ CREATE TABLE IF NOT EXISTS tasks (
 
 -- Optionally, create an index on task_id for faster queries
 CREATE INDEX IF NOT EXISTS idx_task_id ON tasks(task_id);
+
+-- Keyset pagination of the task list ordered by (created_at, task_id),
+-- with or without a status / framework / model filter
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at_task_id ON tasks(created_at, task_id);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at ON tasks(status, created_at, task_id);
+CREATE INDEX IF NOT EXISTS idx_tasks_framework_created_at ON tasks(multi_agent_framework, created_at, task_id);
+CREATE INDEX IF NOT EXISTS idx_tasks_llm_model_created_at ON tasks(llm_model, created_at, task_id);
+
+-- Identical task submissions looked up by fingerprint (see TaskDeduplicator)
+CREATE INDEX IF NOT EXISTS idx_tasks_dedupe_fingerprint
+    ON tasks((task_metadata #>> '{dedupe,fingerprint}'), status, updated_at);
+
+-- Durable execution queue for tasks. Workers claim rows with
+-- SELECT ... FOR UPDATE SKIP LOCKED and keep a lease alive via heartbeats;
+-- running jobs whose lease expired are re-claimed by another worker.
+CREATE TABLE IF NOT EXISTS task_jobs (
+    job_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    task_id UUID NOT NULL REFERENCES tasks(task_id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id TEXT,
+    available_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    lease_expires_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_jobs_task_id ON task_jobs(task_id);
+CREATE INDEX IF NOT EXISTS idx_task_jobs_claim ON task_jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS idx_task_jobs_lease ON task_jobs(status, lease_expires_at);
+
+-- Token buckets of the shared (postgres) LLM rate limiter, one row per
+-- "<model id>:requests" / "<model id>:tokens" key
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    bucket_key TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+-- Content-addressed store of uploaded files. Tasks reference blobs through
+-- task_metadata.input_files[<name>].sha256; ref_count counts those references
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs(updated_at) WHERE ref_count <= 0;
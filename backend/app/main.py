@@ -1,31 +1,24 @@
+"""FastAPI application: routers, middleware, startup and shutdown hooks."""
+
 import asyncio
 import logging
-import os
 
 from fastapi import FastAPI
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware.cors import CORSMiddleware
 
-from app.api.v1.endpoints import health, task
+from app.api.v1.endpoints import health, system, task
+from app.core.enums import TaskExecutionBackend
 from app.core.logging import get_logger
 from app.core.settings import settings
 from app.db.database import sessionmanager
-from app.services.kafka.consumer import KafkaConsumer
-from app.services.kafka.producer import KafkaProducer
-
-# from app.db.database import get_db
-
-# Get Kafka connection details from environment variables
-# KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
-# KAFKA_TOPIC = "background_jobs"
-
-# # Create Kafka producer and consumer
-# producer = KafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS)
-# consumer = KafkaConsumer(
-#     bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-#     topic=KAFKA_TOPIC,
-#     group_id="background_processor"
-# )
+from app.services.blob_store import blob_store
+from app.services.document_preprocessor import document_preprocessor
+from app.services.event_hub import event_hub
+from app.services.kafka.producer import producer
+from app.services.llm_cache import llm_response_cache
+from app.services.maf.impl.am1 import BrowserUse
+from app.services.maf.sync_executor import sync_task_executor
 
 # Get logger
 logger = get_logger()
@@ -47,18 +40,40 @@ async def startup_event():
         logger.info(f"Tables being created for {settings.DATABASE_URL}")
         print(f"Tables being created for {settings.DATABASE_URL}")
         await sessionmanager.create_all(connection)
-    # await producer.start()
-    # await consumer.start()
-    ## Start consuming messages in a background task
-    # asyncio.create_task(consumer.consume())
     print("Database and tables created")
+    await event_hub.start()
+    app.state.blob_store_gc = asyncio.create_task(blob_store.run_garbage_collector())
+    backend = settings.TASK_EXECUTION_BACKEND
+    if (
+        backend == TaskExecutionBackend.BACKGROUND.value
+        and settings.MAGENTIC_ONE_POOL_MIN_SIZE
+    ):
+        # Tasks run in this process, launch browsers without delaying startup
+        from app.services.maf.impl.magentic_one import warm_up_pool
+
+        app.state.magentic_one_warm_up = asyncio.create_task(warm_up_pool())
+    if backend == TaskExecutionBackend.KAFKA.value:
+        # Tasks are consumed by `python -m app.worker`, the API only publishes them
+        await producer.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    app.state.blob_store_gc.cancel()
+    await event_hub.stop()
     await sessionmanager.close()
-    # await producer.stop()
-    # await consumer.stop()
+    await producer.stop()
+    await BrowserUse.aclose()
+    sync_task_executor.shutdown()
+    backend = settings.TASK_EXECUTION_BACKEND
+    if backend == TaskExecutionBackend.BACKGROUND.value:
+        from app.services.llm_clients import llm_client_registry
+        from app.services.maf.impl.magentic_one import magentic_one_pool
+
+        await magentic_one_pool.close()
+        await llm_client_registry.close()
+    llm_response_cache.close()
+    document_preprocessor.shutdown()
 
 
 # Configure logging
@@ -92,6 +107,7 @@ app.add_middleware(
 # Include API routers
 app.include_router(task.router)
 app.include_router(health.router)
+app.include_router(system.router)
 
 
 @app.get("/")
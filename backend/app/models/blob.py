@@ -0,0 +1,29 @@
+"""Blob model: file contents shared by the tasks that uploaded them."""
+
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, func, text
+
+from app.models.task import Base
+
+
+class Blob(Base):
+    """Stored file content, keyed by SHA-256 and shared by the tasks uploading it."""
+
+    __tablename__ = "blobs"
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    # Entries of task_metadata.input_files pointing at this blob
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        Index(
+            "idx_blobs_unreferenced",
+            "updated_at",
+            postgresql_where=text("ref_count <= 0"),
+        ),
+    )
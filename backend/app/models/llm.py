@@ -1,8 +1,18 @@
+"""LLM models, their capabilities and the registry serving them."""
+
+import hashlib
+import json
+import os
+from collections.abc import Iterable, Mapping
 from dataclasses import dataclass
 from enum import Enum, auto
+from types import MappingProxyType
 from typing import Any
 
+import yaml
+
 from app.core.logging import get_logger
+from app.core.settings import settings
 
 logger = get_logger()
 
@@ -127,20 +137,23 @@ class ModelCity(Enum):
     OTHERS = auto()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class LLMModel:
-    """Comprehensive model representation"""
+    """Comprehensive model representation, immutable once built."""
+
     provider: LLMProvider  # Provider company
     family: LLMFamily  # Model family
-    input_capabilities: list[InputCapability] = None  # What inputs it can process
-    output_capabilities: list[OutputCapability] = None  # What outputs it can generate
-    capabilities: list[ModelCapability] = None  # Special capabilities
+    input_capabilities: tuple[InputCapability, ...] = ()  # What inputs it can process
+    output_capabilities: tuple[
+        OutputCapability, ...
+    ] = ()  # What outputs it can generate
+    capabilities: tuple[ModelCapability, ...] = ()  # Special capabilities
     parameters: str | None = None  # E.g., "7b", "70b"
     version: str | None = None  # E.g., "3", "4", "3.5"
     variant: str | None = None  # E.g., "mini", "pro", "turbo"
     variant_delimiter: str | None = None  # ':', '-', etc.
     deployment_id: str | None = None  # could be a date or number or string to identify the deployment in the same version + variant
-    tools: list[Tool] = None  # Supported tools
+    tools: tuple[Tool, ...] = ()  # Supported tools
     context_window: str | None = None  # Context window size
     output_tokens: str | None = None  # Number of output tokens
     hosted_cloud: str | None = None  # Hosted cloud
@@ -170,33 +183,48 @@ class LLMModel:
     display_name: str | None = None  # Human-readable name
 
     def __post_init__(self):
-        """Initialize default values for lists"""
-        if self.input_capabilities is None:
-            self.input_capabilities = []
-        if self.output_capabilities is None:
-            self.output_capabilities = []
-        if self.capabilities is None:
-            self.capabilities = []
-        if self.tools is None:
-            self.tools = []
+        """Freeze capability lists into tuples, derive the id and display name."""
+        for name in (
+            "input_capabilities",
+            "output_capabilities",
+            "capabilities",
+            "tools",
+        ):
+            object.__setattr__(self, name, tuple(getattr(self, name) or ()))
         if not self.id:
-            self.id = (((f"{self.hosted_cloud + '-' if self.hosted_cloud else ''}"
-                       f"{'-' + self.provider.value if self.provider.value else ''}"
-                       f"{'-' + self.family.value if self.family else ''}"
-                       f"{'-' + self.version if self.version else ''}"
-                       f"{'-' if self.variant_delimiter is None else self.variant_delimiter}"
-                       f"{self.variant if self.variant is not None else ''}"
-                       f"{'-' + self.deployment_id if self.deployment_id else ''}"
-                       f"{'-' + self.parameters if self.parameters else ''}"
-                       f"{'-' + self.context_window if self.context_window else ''}"
-                       f"{'-' + self.quantization if self.quantization else ''}"
-                       f"{'-base' if self.is_base_model else '-instructed'}"
-                       f"{'-lb' if self.is_load_balanced else ''}"
-                       f"{'-' + self.model_region if self.model_region else ''}").lower()
-                       .replace("hostedcloud.", "")).replace("--", "-")
-                       .replace(" ", "_"))
+            object.__setattr__(self, "id", self._build_id())
         if not self.display_name:
-            self.display_name = self.id.replace("_", " ").title()
+            object.__setattr__(self, "display_name", self.id.replace("_", " ").title())
+
+    def _build_id(self) -> str:
+        """Id such as azure-openai-gpt-4o-32k-instructed-lb."""
+        hosted_cloud = (self.hosted_cloud or "").lower().removeprefix("hostedcloud.")
+        base = "-".join(
+            part
+            for part in (
+                hosted_cloud,
+                self.provider.value,
+                self.family.value if self.family else None,
+                self.version,
+            )
+            if part
+        )
+        delimiter = "-" if self.variant_delimiter is None else self.variant_delimiter
+        variant = f"{delimiter}{self.variant}" if self.variant else ""
+        suffix = "".join(
+            f"-{part}"
+            for part in (
+                self.deployment_id,
+                self.parameters,
+                self.context_window,
+                self.quantization,
+                "base" if self.is_base_model else "instructed",
+                "lb" if self.is_load_balanced else None,
+                self.model_region,
+            )
+            if part
+        )
+        return f"{base}{variant}{suffix}".lower().replace(" ", "_")
 
 
 openai_gpt_4o_v1 = LLMModel(
@@ -234,6 +262,7 @@ openai_gpt_4o_v1 = LLMModel(
     context_window="128k",
     description="OpenAI's multimodal model capable of processing both text and images.",
     documentation_url="https://platform.openai.com/docs/models/gpt-4o",
+    llm_metadata={"model": "gpt-4o"},
 )
 
 azure_openai_gpt_4o_v1 = LLMModel(
@@ -271,6 +300,12 @@ azure_openai_gpt_4o_v1 = LLMModel(
     context_window="32k",
     description="OpenAI's multimodal model capable of processing both text and images.",
     documentation_url="https://platform.openai.com/docs/models/gpt-4o",
+    llm_metadata={
+        "model": "gpt-4o",
+        "endpoint": settings.AZURE_OPENAI_ENDPOINT,
+        "deployment": settings.AZURE_OPENAI_DEPLOYMENT,
+        "api_version": settings.OPENAI_API_VERSION,
+    },
 )
 azure_openai_gpt_4o_lb_v1 = LLMModel(
     # display_name="Azure OpenAI GPT-4o-lb",
@@ -308,6 +343,12 @@ azure_openai_gpt_4o_lb_v1 = LLMModel(
     is_load_balanced=True,
     description="OpenAI's multimodal model capable of processing both text and images.",
     documentation_url="https://platform.openai.com/docs/models/gpt-4o",
+    llm_metadata={
+        "model": "gpt-4o",
+        "endpoint": settings.AZURE_OPENAI_LB_ENDPOINT,
+        "deployment": settings.AZURE_OPENAI_LB_DEPLOYMENT,
+        "api_version": settings.OPENAI_API_VERSION,
+    },
 )
 # "claude-3-opus": LLMModel(
 #     id="claude-3-opus",
@@ -401,33 +442,261 @@ llama3_2_vision_11b_instruct_q4_K_M_v1 = LLMModel(
     is_base_model=False,
     description="LLama 3.2 Vision model with 11 billion parameters for image processing.",
     documentation_url="https://www.llama.com/docs/get-started/",
+    llm_metadata={"model": "llama3.2-vision:11b-instruct-q4_K_M"},
+)
+
+BUILTIN_MODELS = (
+    openai_gpt_4o_v1,
+    azure_openai_gpt_4o_lb_v1,
+    azure_openai_gpt_4o_v1,
+    llama3_2_vision_11b_instruct_q4_K_M_v1,
+    llama3_2_vision_90b_instruct_v1,
 )
 
-MODELS = {
-    openai_gpt_4o_v1.id: openai_gpt_4o_v1,
-    azure_openai_gpt_4o_lb_v1.id: azure_openai_gpt_4o_lb_v1,
-    azure_openai_gpt_4o_v1.id: azure_openai_gpt_4o_v1,
-    llama3_2_vision_11b_instruct_q4_K_M_v1.id: llama3_2_vision_11b_instruct_q4_K_M_v1,
-    llama3_2_vision_90b_instruct_v1.id: llama3_2_vision_90b_instruct_v1
+# Enum fields of LLMModel, given in config files by value or by name
+_ENUM_FIELDS = {"provider": LLMProvider, "family": LLMFamily}
+_ENUM_LIST_FIELDS = {
+    "input_capabilities": InputCapability,
+    "output_capabilities": OutputCapability,
+    "capabilities": ModelCapability,
+    "tools": Tool,
 }
-logger.info(f"Models: {MODELS}")
+_STRING_FIELDS = (
+    "parameters",
+    "version",
+    "variant",
+    "deployment_id",
+    "context_window",
+    "output_tokens",
+)
+# One bit per feature a model can have, for multi-criteria queries
+_FEATURE_BITS = {
+    member: 1 << bit
+    for bit, member in enumerate(
+        member for enum in _ENUM_LIST_FIELDS.values() for member in enum
+    )
+}
+
+
+def _enum_member(enum: type[Enum], value: Any) -> Enum:
+    if isinstance(value, enum):
+        return value
+    try:
+        return enum(value)
+    except ValueError:
+        return enum[str(value).upper()]
+
+
+def model_from_config(data: dict[str, Any]) -> LLMModel:
+    """Build a model from a config entry.
+
+    Enums are given by value or by name (e.g. ``TOOL_USE``).
+    """
+    data = dict(data)
+    try:
+        for name, enum in _ENUM_FIELDS.items():
+            if data.get(name) is not None:
+                data[name] = _enum_member(enum, data[name])
+        for name, enum in _ENUM_LIST_FIELDS.items():
+            data[name] = tuple(
+                _enum_member(enum, value) for value in data.get(name) or ()
+            )
+        for name in _STRING_FIELDS:
+            if data.get(name) is not None:
+                data[name] = str(data[name])
+        return LLMModel(**data)
+    except (KeyError, TypeError, ValueError) as e:
+        error = f"Invalid LLM model config {data.get('id') or data}: {e!s}"
+        raise ValueError(error) from e
+
+
+def _equivalence_key(model: LLMModel) -> tuple:
+    # A prompt that fits one deployment has to fit the others (gpt-4o is 128k on
+    # OpenAI, 32k on the Azure deployments)
+    return (
+        model.provider,
+        model.family,
+        model.version,
+        model.variant,
+        model.parameters,
+        model.context_window,
+        model.quantization,
+        model.is_base_model,
+        frozenset(model.input_capabilities),
+        frozenset(model.output_capabilities),
+        frozenset(model.capabilities),
+        frozenset(model.tools),
+    )
+
+
+def _deployment_key(model: LLMModel) -> tuple:
+    # Ids configured on the same endpoint and deployment (an Azure load-balanced id
+    # pointing at the direct endpoint, say) are one deployment with one capacity
+    metadata = model.llm_metadata or {}
+    deployment = metadata.get("deployment") or metadata.get("model")
+    if not deployment:
+        return (model.id,)
+    return (model.hosted_cloud, metadata.get("endpoint"), deployment)
+
+
+class ModelRegistry:
+    """Immutable registry of LLM models with precomputed lookups.
+
+    Built once: ids in registration order, an inverted index from every
+    capability/tool enum member to the frozenset of model ids having it, a bitset
+    of features per model for multi-criteria queries, groups of equivalent
+    deployments, the id of the first model of every endpoint and deployment, and
+    the serialized id list with its ETag for the system endpoints.
+    """
+
+    __slots__ = (
+        "_deployments",
+        "_equivalents",
+        "_ids",
+        "_index",
+        "_masks",
+        "_position",
+        "_summaries",
+        "etag",
+        "ids_json",
+        "models",
+    )
+
+    def __init__(self, models: Iterable[LLMModel]):
+        """Index ``models``, later ones replace earlier ones with the same id."""
+        by_id: dict[str, LLMModel] = {}
+        for model in models:
+            # Later definitions (config files) replace earlier ones (built-ins)
+            by_id[model.id] = model
+        self.models: Mapping[str, LLMModel] = MappingProxyType(by_id)
+        self._ids = tuple(by_id)
+        self._position = {
+            model_id: position for position, model_id in enumerate(self._ids)
+        }
+
+        index: dict[Enum, set[str]] = {}
+        masks: dict[str, int] = {}
+        groups: dict[tuple, list[str]] = {}
+        deployments: dict[tuple, str] = {}
+        for model in by_id.values():
+            mask = 0
+            for feature in self._features(model):
+                index.setdefault(feature, set()).add(model.id)
+                mask |= _FEATURE_BITS[feature]
+            masks[model.id] = mask
+            groups.setdefault(_equivalence_key(model), []).append(model.id)
+            deployments.setdefault(_deployment_key(model), model.id)
+        self._index: Mapping[Enum, frozenset[str]] = MappingProxyType(
+            {feature: frozenset(model_ids) for feature, model_ids in index.items()}
+        )
+        self._masks = MappingProxyType(masks)
+        self._equivalents = MappingProxyType(
+            {model_id: tuple(group) for group in groups.values() for model_id in group}
+        )
+        self._deployments = MappingProxyType(
+            {
+                model.id: deployments[_deployment_key(model)]
+                for model in by_id.values()
+            }
+        )
+        self._summaries = tuple(
+            MappingProxyType({model.id: model.display_name}) for model in by_id.values()
+        )
+        self.ids_json = json.dumps(self._ids).encode()
+        self.etag = hashlib.sha256(
+            json.dumps(
+                [[model.id, model.display_name] for model in by_id.values()]
+            ).encode()
+        ).hexdigest()[:32]
+
+    @classmethod
+    def load(
+        cls, path: str | None, builtin: Iterable[LLMModel] = BUILTIN_MODELS
+    ) -> "ModelRegistry":
+        """Built-in models plus the ``models`` list of a YAML or JSON file, if any."""
+        models = list(builtin)
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+            entries = (
+                (data or {}).get("models", []) if isinstance(data, dict) else data or []
+            )
+            models.extend(model_from_config(entry) for entry in entries)
+            logger.info(f"Loaded {len(entries)} LLM models from {path}")
+        return cls(models)
+
+    @staticmethod
+    def _features(model: LLMModel) -> Iterable[Enum]:
+        yield from model.input_capabilities
+        yield from model.output_capabilities
+        yield from model.capabilities
+        yield from model.tools
+
+    def ids(self) -> tuple[str, ...]:
+        """Model ids in registration order."""
+        return self._ids
+
+    def get(self, model_id: str) -> LLMModel | None:
+        """Model of ``model_id``, None if unknown."""
+        return self.models.get(model_id)
+
+    def summaries(self) -> tuple[Mapping[str, str], ...]:
+        """``{id: display name}`` of every model, in registration order."""
+        return self._summaries
+
+    def with_feature(self, feature: Enum) -> list[LLMModel]:
+        """Models having one capability, input/output type or tool, in order."""
+        model_ids = self._index.get(feature, frozenset())
+        return [
+            self.models[model_id]
+            for model_id in sorted(model_ids, key=self._position.__getitem__)
+        ]
+
+    def query(self, *features: Enum) -> list[LLMModel]:
+        """Models having all the given capabilities, input/output types and tools."""
+        required = 0
+        for feature in features:
+            required |= _FEATURE_BITS[feature]
+        return [
+            self.models[model_id]
+            for model_id in self._ids
+            if self._masks[model_id] & required == required
+        ]
+
+    def equivalents(self, model_id: str) -> list[LLMModel]:
+        """Deployments equivalent to ``model_id``, the model itself first."""
+        model = self.models.get(model_id)
+        if model is None:
+            return []
+        return [model] + [
+            self.models[other]
+            for other in self._equivalents[model_id]
+            if other != model_id
+        ]
+
+    def deployment_id(self, model_id: str) -> str:
+        """Id of the first model on the endpoint and deployment of ``model_id``."""
+        return self._deployments.get(model_id, model_id)
+
+
+model_registry = ModelRegistry.load(settings.LLM_MODELS_FILE)
+MODELS = model_registry.models
+logger.info(f"Models: {list(MODELS)}")
 
 
 def get_model_ids() -> list[str]:
     """Get all model IDs"""
-    return list(MODELS.keys())
+    return list(model_registry.ids())
 
 
 def get_models() -> list[dict]:
     """Get all models"""
-    return [
-        {model.id: model.display_name} for model in MODELS.values()
-    ]
+    return [dict(summary) for summary in model_registry.summaries()]
 
 
 def get_model(model_id: str) -> LLMModel | None:
     """Get model by its ID"""
-    return MODELS.get(model_id)
+    return model_registry.get(model_id)
 
 
 def get_default_model() -> LLMModel:
@@ -437,19 +706,40 @@ def get_default_model() -> LLMModel:
 
 def filter_models_by_capability(capability: ModelCapability) -> list[LLMModel]:
     """Get all models with a specific capability"""
-    return [model for model in MODELS.values() if capability in model.capabilities]
+    return model_registry.with_feature(capability)
 
 
 def filter_models_by_input(input_type: InputCapability) -> list[LLMModel]:
     """Get all models that support a specific input type"""
-    return [model for model in MODELS.values() if input_type in model.input_capabilities]
+    return model_registry.with_feature(input_type)
 
 
 def filter_models_by_output(output_type: OutputCapability) -> list[LLMModel]:
     """Get all models that support a specific output type"""
-    return [model for model in MODELS.values() if output_type in model.output_capabilities]
+    return model_registry.with_feature(output_type)
 
 
 def filter_models_by_tool(tool: Tool) -> list[LLMModel]:
     """Get all models that support a specific tool"""
-    return [model for model in MODELS.values() if tool in model.tools]
+    return model_registry.with_feature(tool)
+
+
+def filter_models(*features: Enum) -> list[LLMModel]:
+    """Get all models having every given capability, input/output type and tool."""
+    return model_registry.query(*features)
+
+
+def get_equivalent_models(model_id: str) -> list[LLMModel]:
+    """Get the deployments of a model with its capabilities and context window.
+
+    The model itself comes first.
+    """
+    return model_registry.equivalents(model_id)
+
+
+def get_deployment_id(model_id: str) -> str:
+    """Get the id standing for the endpoint and deployment serving a model.
+
+    Ids sharing an endpoint and deployment share its health and rate limits.
+    """
+    return model_registry.deployment_id(model_id)
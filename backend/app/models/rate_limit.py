@@ -0,0 +1,16 @@
+"""Table of the shared rate limiter buckets."""
+
+from sqlalchemy import Column, DateTime, Float, String, func
+
+from app.models.task import Base
+
+
+class RateLimitBucket(Base):
+    """Token bucket shared by every replica, see ``RateLimitRepository.reserve``."""
+
+    __tablename__ = "rate_limit_buckets"
+    bucket_key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
@@ -1,9 +1,21 @@
 from uuid import uuid4
 
-from sqlalchemy import Boolean, Column, DateTime, String, func
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    func,
+    text,
+)
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.declarative import declarative_base
 
+from app.core.enums import JobStatus
+
 # Base class for SQLAlchemy models
 Base = declarative_base()
 
@@ -23,3 +35,60 @@ class Task(Base):
     updated_at = Column(
         DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
     )
+
+    # Keyset pagination of the task list, newest first, optionally filtered
+    __table_args__ = (
+        Index("idx_tasks_created_at_task_id", "created_at", "task_id"),
+        Index("idx_tasks_status_created_at", "status", "created_at", "task_id"),
+        Index(
+            "idx_tasks_framework_created_at",
+            "multi_agent_framework",
+            "created_at",
+            "task_id",
+        ),
+        Index("idx_tasks_llm_model_created_at", "llm_model", "created_at", "task_id"),
+        # Identical submissions, see TaskRepository.find_dedupe_leader
+        Index(
+            "idx_tasks_dedupe_fingerprint",
+            text("(task_metadata #>> '{dedupe,fingerprint}')"),
+            "status",
+            "updated_at",
+        ),
+    )
+
+
+class TaskJob(Base):
+    """Durable execution job for a task, claimed by workers with a lease."""
+
+    __tablename__ = "task_jobs"
+    job_id = Column(UUID, primary_key=True, default=uuid4, nullable=False)
+    task_id = Column(
+        UUID,
+        ForeignKey("tasks.task_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    status = Column(String, nullable=False, default=JobStatus.QUEUED.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    worker_id = Column(String, nullable=True)
+    available_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("idx_task_jobs_claim", "status", "available_at"),
+        Index("idx_task_jobs_lease", "status", "lease_expires_at"),
+    )
@@ -0,0 +1,34 @@
+"""Base class of the repositories."""
+
+import contextlib
+from collections.abc import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import get_logger
+from app.db.database import sessionmanager
+
+
+class BaseRepository:
+    """Logger and session handling shared by the repositories."""
+
+    def __init__(self):
+        """Repositories are stateless, a module-level instance is shared."""
+        self.logger = get_logger()
+
+    @contextlib.asynccontextmanager
+    async def _session(
+        self, db: AsyncSession | None = None
+    ) -> AsyncIterator[AsyncSession]:
+        """Use the caller's unit-of-work session, or open a short-lived one.
+
+        Request handlers pass their ``Depends(get_db)`` session so that every
+        repository call of a request shares one pooled connection. Long running
+        callers (agent executions, workers) pass nothing and hold a connection only for
+        the duration of each call.
+        """
+        if db is not None:
+            yield db
+        else:
+            async with sessionmanager.session() as session:
+                yield session
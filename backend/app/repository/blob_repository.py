@@ -0,0 +1,135 @@
+"""Reference counts of the stored file contents."""
+
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.blob import Blob
+from app.repository.base import BaseRepository
+
+
+class BlobRepository(BaseRepository):
+    """Reference counts of the content-addressed file store.
+
+    Counts are changed in SHA-256 order so concurrent uploads lock blob rows in the
+    same order.
+    """
+
+    async def acquire(
+        self, blobs: dict[str, tuple[int, int]], db: AsyncSession | None = None
+    ) -> None:
+        """Add references to blobs, creating their rows if needed.
+
+        Args:
+            blobs (Dict): SHA-256 -> (size, number of references to add).
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        """
+        rows = [
+            {"sha256": sha256, "size": size, "ref_count": count}
+            for sha256, (size, count) in sorted(blobs.items())
+        ]
+        stmt = insert(Blob).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Blob.sha256],
+            set_={
+                "ref_count": Blob.ref_count + stmt.excluded.ref_count,
+                "updated_at": func.now(),
+            },
+        )
+        async with self._session(db) as session:
+            await session.execute(stmt)
+            await session.commit()
+
+    async def acquire_existing(
+        self, counts: dict[str, int], db: AsyncSession | None = None
+    ) -> dict[str, int]:
+        """Add references to the blobs that are already stored, skipping the others.
+
+        A blob being garbage collected is locked, and counts as missing once the
+        collection commits.
+
+        Args:
+            counts (Dict): SHA-256 -> number of references to add.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            Dict: SHA-256 -> size of the blobs that were found.
+
+        """
+        found = {}
+        async with self._session(db) as session:
+            for sha256, count in sorted(counts.items()):
+                result = await session.execute(
+                    update(Blob)
+                    .where(Blob.sha256 == sha256)
+                    .values(ref_count=Blob.ref_count + count, updated_at=func.now())
+                    .returning(Blob.size)
+                )
+                size = result.scalar_one_or_none()
+                if size is not None:
+                    found[sha256] = size
+            await session.commit()
+        return found
+
+    async def release(
+        self, counts: dict[str, int], db: AsyncSession | None = None
+    ) -> None:
+        """Drop references to blobs, collected after a grace period once unreferenced.
+
+        Args:
+            counts (Dict): SHA-256 -> number of references to drop.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        """
+        async with self._session(db) as session:
+            for sha256, count in sorted(counts.items()):
+                await session.execute(
+                    update(Blob)
+                    .where(Blob.sha256 == sha256)
+                    .values(ref_count=Blob.ref_count - count, updated_at=func.now())
+                )
+            await session.commit()
+
+    async def collect_garbage(
+        self,
+        grace_seconds: int,
+        delete_content: Callable[[str], Awaitable[None]],
+        limit: int = 100,
+    ) -> list[str]:
+        """Delete blobs unreferenced for ``grace_seconds``, content first, then rows.
+
+        The rows stay locked (``FOR UPDATE SKIP LOCKED``) while their content is
+        deleted, so an upload of the same content waits and then stores it again.
+        Replicas collecting at the same time skip each other's rows.
+
+        Returns:
+            list[str]: SHA-256 of the deleted blobs.
+
+        """
+        async with self._session() as session:
+            result = await session.execute(
+                select(Blob.sha256)
+                .where(
+                    Blob.ref_count <= 0,
+                    Blob.updated_at < func.now() - timedelta(seconds=grace_seconds),
+                )
+                .order_by(Blob.updated_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            deleted = []
+            for sha256 in result.scalars().all():
+                try:
+                    await delete_content(sha256)
+                except Exception:
+                    self.logger.exception(f"Could not delete blob {sha256}")
+                    continue
+                deleted.append(sha256)
+            if deleted:
+                await session.execute(delete(Blob).where(Blob.sha256.in_(deleted)))
+            await session.commit()
+            return deleted
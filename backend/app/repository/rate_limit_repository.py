@@ -0,0 +1,45 @@
+"""Token buckets of the shared rate limiter (RATE_LIMITER_BACKEND=postgres)."""
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.rate_limit import RateLimitBucket
+from app.repository.base import BaseRepository
+
+
+class RateLimitRepository(BaseRepository):
+    """Postgres-backed token buckets for rate limits shared across replicas."""
+
+    async def reserve(
+        self, bucket_key: str, amount: float, capacity: float, rate: float
+    ) -> float:
+        """Take ``amount`` from a bucket refilled at ``rate``/s up to ``capacity``.
+
+        The bucket may go negative: the caller then owes the deficit and must wait
+        ``-tokens / rate`` seconds. Refill and take happen in one upsert, using the
+        database clock, so concurrent replicas queue up behind each other.
+
+        Returns:
+            float: Tokens left in the bucket after the reservation.
+
+        """
+        refilled = func.least(
+            capacity,
+            RateLimitBucket.tokens
+            + func.extract("epoch", func.now() - RateLimitBucket.updated_at) * rate,
+        )
+        stmt = (
+            insert(RateLimitBucket)
+            .values(
+                bucket_key=bucket_key, tokens=capacity - amount, updated_at=func.now()
+            )
+            .on_conflict_do_update(
+                index_elements=[RateLimitBucket.bucket_key],
+                set_={"tokens": refilled - amount, "updated_at": func.now()},
+            )
+            .returning(RateLimitBucket.tokens)
+        )
+        async with self._session() as session:
+            result = await session.execute(stmt)
+            await session.commit()
+            return result.scalar_one()
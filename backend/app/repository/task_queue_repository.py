@@ -0,0 +1,271 @@
+"""Postgres job queue behind TASK_EXECUTION_BACKEND=postgres."""
+
+from datetime import timedelta
+
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.enums import JobStatus
+from app.core.settings import settings
+from app.models.task import TaskJob
+from app.repository.base import BaseRepository
+
+
+class TaskQueueRepository(BaseRepository):
+    """Postgres-backed work queue for task execution.
+
+    Jobs live in the ``task_jobs`` table. Workers claim them with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` so that concurrent workers never pick the
+    same row, and hold a lease that is extended by heartbeats. A running job whose
+    lease has expired (its worker died) becomes claimable again.
+    """
+
+    async def enqueue(
+        self,
+        task_id: str,
+        max_attempts: int | None = None,
+        db: AsyncSession | None = None,
+    ) -> TaskJob:
+        """Add a task to the execution queue.
+
+        Args:
+            task_id (str): The ID of the task to execute.
+            max_attempts (int | None): Claims allowed before the job is failed.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            TaskJob: The queued job.
+
+        """
+        job = TaskJob(
+            task_id=task_id,
+            status=JobStatus.QUEUED.value,
+            attempts=0,
+            max_attempts=max_attempts or settings.TASK_QUEUE_MAX_ATTEMPTS,
+        )
+        async with self._session(db) as session:
+            session.add(job)
+            await session.commit()
+            await session.refresh(job)
+            self.logger.info(f"Task {task_id} enqueued as job {job.job_id}.")
+            return job
+
+    async def enqueue_many(
+        self,
+        task_ids: list[str],
+        max_attempts: int | None = None,
+        db: AsyncSession | None = None,
+    ) -> int:
+        """Add tasks to the execution queue with multi-row INSERTs.
+
+        Args:
+            task_ids (list[str]): IDs of the tasks to execute, queued in this order.
+            max_attempts (int | None): Claims allowed before a job is failed.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            int: Number of jobs queued.
+
+        """
+        rows = [
+            {
+                "task_id": task_id,
+                "status": JobStatus.QUEUED.value,
+                "attempts": 0,
+                "max_attempts": max_attempts or settings.TASK_QUEUE_MAX_ATTEMPTS,
+            }
+            for task_id in task_ids
+        ]
+        if not rows:
+            return 0
+        async with self._session(db) as session:
+            await session.execute(insert(TaskJob), rows)
+            await session.commit()
+            self.logger.info(f"{len(rows)} tasks enqueued.")
+            return len(rows)
+
+    async def claim(self, worker_id: str, lease_seconds: int) -> TaskJob | None:
+        """Claim the oldest available job, or a running job whose lease expired.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+            lease_seconds (int): How long the claim is valid without a heartbeat.
+
+        Returns:
+            TaskJob | None: The claimed job, or None if the queue is empty.
+
+        """
+        now = func.now()
+        claimable = (
+            select(TaskJob.job_id)
+            .where(
+                or_(
+                    and_(
+                        TaskJob.status == JobStatus.QUEUED.value,
+                        TaskJob.available_at <= now,
+                    ),
+                    and_(
+                        TaskJob.status == JobStatus.RUNNING.value,
+                        TaskJob.lease_expires_at < now,
+                    ),
+                ),
+                TaskJob.attempts < TaskJob.max_attempts,
+            )
+            .order_by(TaskJob.available_at, TaskJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(TaskJob)
+            .where(TaskJob.job_id == claimable)
+            .values(
+                status=JobStatus.RUNNING.value,
+                worker_id=worker_id,
+                attempts=TaskJob.attempts + 1,
+                heartbeat_at=now,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                updated_at=now,
+            )
+            .returning(TaskJob)
+            .execution_options(synchronize_session=False)
+        )
+        async with self._session() as session:
+            result = await session.execute(stmt)
+            job = result.scalars().first()
+            if job:
+                # Detach so the returned row is not expired by the commit
+                session.expunge(job)
+            await session.commit()
+            if job:
+                self.logger.info(
+                    f"Worker {worker_id} claimed job {job.job_id} for task "
+                    f"{job.task_id} (attempt {job.attempts}/{job.max_attempts})."
+                )
+            return job
+
+    async def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extend the lease of a running job.
+
+        Returns:
+            bool: False if the worker no longer owns the job (lease was re-claimed).
+
+        """
+        now = func.now()
+        stmt = (
+            update(TaskJob)
+            .where(
+                TaskJob.job_id == job_id,
+                TaskJob.worker_id == worker_id,
+                TaskJob.status == JobStatus.RUNNING.value,
+            )
+            .values(
+                heartbeat_at=now,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        async with self._session() as session:
+            result = await session.execute(stmt)
+            await session.commit()
+            return result.rowcount == 1
+
+    async def complete(self, job_id: str, worker_id: str) -> bool:
+        """Mark a job owned by ``worker_id`` as done."""
+        stmt = (
+            update(TaskJob)
+            .where(TaskJob.job_id == job_id, TaskJob.worker_id == worker_id)
+            .values(
+                status=JobStatus.DONE.value,
+                lease_expires_at=None,
+                updated_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        async with self._session() as session:
+            result = await session.execute(stmt)
+            await session.commit()
+            return result.rowcount == 1
+
+    async def fail(self, job_id: str, worker_id: str, error: str) -> TaskJob | None:
+        """Record a failed attempt.
+
+        The job goes back to the queue after ``TASK_QUEUE_RETRY_DELAY_SECONDS`` while it
+        has attempts left, otherwise it is marked as failed.
+
+        Returns:
+            TaskJob | None: The updated job, or None if the worker no longer owns it.
+
+        """
+        now = func.now()
+        exhausted = TaskJob.attempts >= TaskJob.max_attempts
+        stmt = (
+            update(TaskJob)
+            .where(TaskJob.job_id == job_id, TaskJob.worker_id == worker_id)
+            .values(
+                status=case(
+                    (exhausted, JobStatus.FAILED.value),
+                    else_=JobStatus.QUEUED.value,
+                ),
+                available_at=case(
+                    (exhausted, TaskJob.available_at),
+                    else_=now
+                    + timedelta(seconds=settings.TASK_QUEUE_RETRY_DELAY_SECONDS),
+                ),
+                last_error=error,
+                lease_expires_at=None,
+                updated_at=now,
+            )
+            .returning(TaskJob)
+            .execution_options(synchronize_session=False)
+        )
+        async with self._session() as session:
+            result = await session.execute(stmt)
+            job = result.scalars().first()
+            if job:
+                # Detach so the returned row is not expired by the commit
+                session.expunge(job)
+            await session.commit()
+            if job:
+                self.logger.warning(
+                    f"Job {job_id} attempt {job.attempts}/{job.max_attempts} failed, "
+                    f"now {job.status}: {error}"
+                )
+            return job
+
+    async def reap_expired(self) -> list[TaskJob]:
+        """Fail running jobs whose lease expired and that have no attempts left.
+
+        Returns:
+            list[TaskJob]: The jobs that were marked as failed.
+
+        """
+        now = func.now()
+        stmt = (
+            update(TaskJob)
+            .where(
+                TaskJob.status == JobStatus.RUNNING.value,
+                TaskJob.lease_expires_at < now,
+                TaskJob.attempts >= TaskJob.max_attempts,
+            )
+            .values(
+                status=JobStatus.FAILED.value,
+                last_error="Lease expired after the last attempt",
+                lease_expires_at=None,
+                updated_at=now,
+            )
+            .returning(TaskJob)
+            .execution_options(synchronize_session=False)
+        )
+        async with self._session() as session:
+            result = await session.execute(stmt)
+            jobs = list(result.scalars().all())
+            session.expunge_all()
+            await session.commit()
+            for job in jobs:
+                self.logger.error(
+                    f"Job {job.job_id} for task {job.task_id} lost its worker on the "
+                    f"final attempt; marked as failed."
+                )
+            return jobs
@@ -1,42 +1,93 @@
-from datetime import datetime
+"""Data access for tasks."""
 
-from fastapi import HTTPException
-from sqlalchemy import select
+from collections import Counter
+from datetime import timedelta
+from typing import Any
 
-from app.core.logging import get_logger
-from app.db.database import get_db
+from fastapi import HTTPException
+from sqlalchemy import (
+    Row,
+    Text,
+    any_,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.enums import TaskDedupeMode
+from app.models.blob import Blob
 from app.models.task import Task
+from app.repository.base import BaseRepository
+
 
+class TaskRepository(BaseRepository):
+    """Data access for tasks.
 
-class TaskRepository:
-    def __init__(self):
-        # self.db: AsyncSession = get_db()
-        self.logger = get_logger()
+    Every method takes an optional ``db`` session; see ``BaseRepository._session``.
+    """
 
-    async def create(self, task: Task) -> type[Task] | None:
-        # self.db.add(task)
-        # await self.db.commit()
-        # await self.db.refresh(task)
-        # return await self.get(task.task_id)
+    async def create(
+        self, task: Task, db: AsyncSession | None = None
+    ) -> type[Task] | None:
+        """Insert a task, None if that failed."""
         try:
-            async for session in get_db():
+            async with self._session(db) as session:
                 session.add(task)
                 await session.commit()
+                # Loads server defaults (created_at, updated_at) on the same connection
                 await session.refresh(task)
                 self.logger.info(f"Task {task.task_id} created successfully.")
-                return await self.get(task.task_id)
+                return task
         except Exception as e:
             self.logger.error(f"Error creating task: {e}")
             return None
 
-    async def get(self, task_id: str) -> type[Task] | None:
+    # Columns returned by create_many
+    CREATED_COLUMNS = (Task.task_id, Task.status, Task.created_at, Task.updated_at)
+
+    async def create_many(
+        self, rows: list[dict], db: AsyncSession | None = None
+    ) -> list[Row]:
+        """Insert tasks with multi-row ``INSERT ... VALUES (...), (...) RETURNING``.
+
+        SQLAlchemy's insertmanyvalues batches the rows into as few statements as the
+        driver's parameter limit allows, instead of one round trip per task.
+
+        Args:
+            rows (list[Dict]): Column values of each task.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            list[Row]: ``CREATED_COLUMNS`` of the tasks, in the order of ``rows``.
+
+        """
+        stmt = insert(Task).returning(
+            *self.CREATED_COLUMNS, sort_by_parameter_order=True
+        )
+        async with self._session(db) as session:
+            result = await session.execute(stmt, rows)
+            created = list(result.all())
+            await session.commit()
+            self.logger.info(f"{len(created)} tasks created.")
+            return created
+
+    async def get(
+        self, task_id: str, db: AsyncSession | None = None
+    ) -> type[Task] | None:
+        """Task by ID, None if there is none."""
         # result = await self.db.execute(select(Task).filter(Task.task_id == task_id))
         # return result.scalars().first()
         # async for session in get_db():
         #     task = session.query(Task).filter(Task.task_id == task_id).first()
         #     self.logger.info(f"get task {task_id} from db {task}")
         #     return task
-        async for session in get_db():
+        async with self._session(db) as session:
             # For SQLAlchemy 1.4+ with async sessions, use select instead of query
 
             # Using select and execute for async sessions
@@ -44,44 +95,68 @@ class TaskRepository:
             task = result.scalars().first()
             return task
 
-    async def update(self, task_id: str, update_data: dict) -> type[Task] | None:
+    async def update(
+        self,
+        task_id: str,
+        update_data: dict,
+        metadata_patch: dict | None = None,
+        db: AsyncSession | None = None,
+    ) -> type[Task] | None:
         """Generic function to update any field(s) in a task.
 
+        Issues a single ``UPDATE tasks ... RETURNING *`` instead of reading the row,
+        mutating it in Python and reading it back.
+
         Args:
             task_id (str): The ID of the task to update.
             update_data (Dict): Dictionary of fields to update.
+            metadata_patch (Dict | None): Keys merged server-side into task_metadata
+                (``task_metadata || :patch``) without a read-modify-write.
+            db (AsyncSession | None): Session of the calling request, if any.
 
         Returns:
             TaskResponse: The updated task response.
 
         """
         try:
-            self.logger.info(f"Updating task {task_id}. Update Data: {update_data}")
-            async for session in get_db():
-                # Import select if not already imported
-                from sqlalchemy import select
-
-                # Fetch the task from the database
-                result = await session.execute(select(Task).filter(Task.task_id == task_id))
-                task = result.scalars().first()
+            self.logger.info(
+                f"Updating task {task_id}. Update Data: {update_data}, "
+                f"Metadata patch: {metadata_patch}"
+            )
+            values = {
+                field: value
+                for field, value in update_data.items()
+                if hasattr(Task, field)
+                and field not in ("task_id", "created_at", "updated_at")
+            }
+            if metadata_patch:
+                base_metadata = (
+                    literal(values.pop("task_metadata") or {}, JSONB)
+                    if "task_metadata" in values
+                    else func.coalesce(Task.task_metadata, literal({}, JSONB))
+                )
+                values["task_metadata"] = base_metadata.op("||")(
+                    literal(metadata_patch, JSONB)
+                )
+            values["updated_at"] = func.now()
+
+            stmt = (
+                update(Task)
+                .where(Task.task_id == task_id)
+                .values(**values)
+                .returning(Task)
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )
+            async with self._session(db) as session:
+                result = await session.execute(stmt)
+                updated_task = result.scalars().first()
 
-                if not task:
+                if not updated_task:
                     raise HTTPException(status_code=404, detail=f"Task with ID {task_id} not found")
 
-                # Update fields
-                for field, value in update_data.items():
-                    if hasattr(task, field):
-                        setattr(task, field, value)
-
-                task.updated_at = datetime.utcnow()
-
-                # Commit changes
+                # Detach so the returned row is not expired by the commit
+                session.expunge(updated_task)
                 await session.commit()
-                await session.refresh(task)
-
-                # Fetch the updated task
-                result = await session.execute(select(Task).filter(Task.task_id == task_id))
-                updated_task = result.scalars().first()
 
                 self.logger.info(f"Task {task_id} updated successfully.")
                 return updated_task
@@ -92,18 +167,178 @@ class TaskRepository:
             self.logger.error(f"Error updating task {task_id}: {e}")
             raise HTTPException(status_code=500, detail="Failed to update task")
 
-    async def delete(self, task_id: str) -> bool | None:
+    async def update_many(
+        self, task_ids: list[str], update_data: dict, db: AsyncSession | None = None
+    ) -> list[type[Task]]:
+        """Set the same fields on many tasks with one ``UPDATE ... RETURNING``.
+
+        Args:
+            task_ids (list[str]): IDs of the tasks, passed as a single array parameter.
+            update_data (Dict): Fields to update.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            list[Task]: The updated tasks; IDs that do not exist are left out.
+
+        """
+        stmt = (
+            update(Task)
+            .where(Task.task_id == any_(literal(task_ids, ARRAY(UUID))))
+            .values(**update_data, updated_at=func.now())
+            .returning(Task)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        async with self._session(db) as session:
+            result = await session.execute(stmt)
+            updated_tasks = list(result.scalars().all())
+            for task in updated_tasks:
+                session.expunge(task)
+            await session.commit()
+            self.logger.info(f"{len(updated_tasks)} tasks updated: {update_data}")
+            return updated_tasks
+
+    async def patch_metadata(
+        self,
+        task_id: str,
+        path: str | list[str],
+        value: Any,
+        db: AsyncSession | None = None,
+    ) -> type[Task] | None:
+        """Atomically set one key of task_metadata, server-side.
+
+        Uses ``jsonb_set`` in a single UPDATE, so concurrent writers (BrowserUse
+        poller, status updates, live URL resolution) never overwrite each other's keys
+        and no read of the row is needed first.
+
+        Args:
+            task_id (str): The ID of the task to update.
+            path (str | list[str]): Key to set, nested keys as a list or dotted string.
+            value (Any): JSON-serializable value to store at ``path``.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            Task: The updated task.
+
+        """
+        keys = path.split(".") if isinstance(path, str) else [str(key) for key in path]
+        try:
+            metadata = func.coalesce(Task.task_metadata, literal({}, JSONB))
+            # jsonb_set only creates the last key of a path, add missing parents first
+            for depth in range(1, len(keys)):
+                parent = literal(keys[:depth], ARRAY(Text))
+                metadata = func.jsonb_set(
+                    metadata,
+                    parent,
+                    func.coalesce(metadata.op("#>")(parent), literal({}, JSONB)),
+                    True,
+                    type_=JSONB,
+                )
+            metadata = func.jsonb_set(
+                metadata,
+                literal(keys, ARRAY(Text)),
+                literal(value, JSONB),
+                True,
+                type_=JSONB,
+            )
+            stmt = (
+                update(Task)
+                .where(Task.task_id == task_id)
+                .values(task_metadata=metadata, updated_at=func.now())
+                .returning(Task)
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )
+            async with self._session(db) as session:
+                result = await session.execute(stmt)
+                updated_task = result.scalars().first()
+                if updated_task:
+                    session.expunge(updated_task)
+                    await session.commit()
+        except Exception as e:
+            self.logger.exception(f"Error patching metadata of task {task_id}")
+            raise HTTPException(
+                status_code=500, detail="Failed to update task metadata"
+            ) from e
+
+        if not updated_task:
+            raise HTTPException(
+                status_code=404, detail=f"Task with ID {task_id} not found"
+            )
+        self.logger.info(f"Task {task_id} metadata {'.'.join(keys)} patched.")
+        return updated_task
+
+    async def append_input_files(
+        self, task_id: str, files: dict[str, dict], db: AsyncSession | None = None
+    ) -> type[Task] | None:
+        """Atomically add file names to input_file_names, unless one is already there.
+
+        A single UPDATE appends the names (``input_file_names || :names``) and merges
+        their details into ``task_metadata.input_files``. Concurrent uploads to a
+        task queue on the row lock and re-check the names, so none is lost or
+        recorded twice.
+
+        Args:
+            task_id (str): The ID of the task.
+            files (Dict): File name -> details (size, sha256) of the files to add.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            Task: The updated task, None if one of the names was already recorded.
+
+        """
+        names = list(files)
+        current_names = func.coalesce(Task.input_file_names, literal([], JSONB))
+        metadata = func.coalesce(Task.task_metadata, literal({}, JSONB))
+        input_files = func.coalesce(
+            metadata.op("->")("input_files"), literal({}, JSONB)
+        )
+        stmt = (
+            update(Task)
+            .where(
+                Task.task_id == task_id,
+                ~current_names.op("?|")(literal(names, ARRAY(Text))),
+            )
+            .values(
+                input_file_names=current_names.op("||")(literal(names, JSONB)),
+                task_metadata=func.jsonb_set(
+                    metadata,
+                    literal(["input_files"], ARRAY(Text)),
+                    input_files.op("||")(literal(files, JSONB)),
+                    True,
+                    type_=JSONB,
+                ),
+                updated_at=func.now(),
+            )
+            .returning(Task)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        async with self._session(db) as session:
+            result = await session.execute(stmt)
+            updated_task = result.scalars().first()
+            if updated_task is None:
+                await session.rollback()
+                if await self.get(task_id, session) is None:
+                    raise HTTPException(
+                        status_code=404, detail=f"Task with ID {task_id} not found"
+                    )
+                return None
+            session.expunge(updated_task)
+            await session.commit()
+            self.logger.info(f"Task {task_id} input files added: {names}")
+            return updated_task
+
+    async def delete(self, task_id: str, db: AsyncSession | None = None) -> bool | None:
         """Delete a task from the database.
 
         Args:
             task_id (str): The ID of the task to delete.
+            db (AsyncSession | None): Session of the calling request, if any.
 
         Returns:
             bool: True if task was deleted successfully.
 
         """
         try:
-            async for session in get_db():
+            async with self._session(db) as session:
                 from sqlalchemy import select
 
                 # Fetch the task from the database
@@ -113,6 +348,22 @@ class TaskRepository:
                 if not task:
                     raise HTTPException(status_code=404, detail=f"Task with ID {task_id} not found")
 
+                # Drop the task's references to its stored files, unreferenced blobs
+                # are deleted by the blob store's garbage collection
+                sha256s = Counter(
+                    details.get("sha256")
+                    for details in (
+                        (task.task_metadata or {}).get("input_files") or {}
+                    ).values()
+                    if details.get("sha256")
+                )
+                for sha256, count in sorted(sha256s.items()):
+                    await session.execute(
+                        update(Blob)
+                        .where(Blob.sha256 == sha256)
+                        .values(ref_count=Blob.ref_count - count, updated_at=func.now())
+                    )
+
                 # Delete the task
                 await session.delete(task)
                 await session.commit()
@@ -126,25 +377,144 @@ class TaskRepository:
             self.logger.error(f"Error deleting task {task_id}: {e}")
             raise HTTPException(status_code=500, detail="Failed to delete task")
 
-    async def get_all(self, offset: int = 0, limit: int = 10) -> list[type[Task]]:
+    async def get_all(
+        self, offset: int = 0, limit: int = 10, db: AsyncSession | None = None
+    ) -> list[type[Task]]:
         """Get all tasks with pagination.
 
         Args:
             offset (int): Number of records to skip.
             limit (int): Maximum number of records to return.
+            db (AsyncSession | None): Session of the calling request, if any.
 
         Returns:
             list[Type[Task]]: List of task objects.
 
         """
         try:
-            async for session in get_db():
-                from sqlalchemy import select
-
-                # Execute the query with pagination
-                result = await session.execute(select(Task).offset(offset).limit(limit))
+            async with self._session(db) as session:
+                # Execute the query with pagination, ordered so pages are stable
+                result = await session.execute(
+                    select(Task)
+                    .order_by(Task.created_at.desc(), Task.task_id.desc())
+                    .offset(offset)
+                    .limit(limit)
+                )
                 return result.scalars().all()
 
         except Exception as e:
             self.logger.error(f"Error retrieving tasks: {e}")
-            raise HTTPException(status_code=500, detail="Failed to retrieve tasks")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="Failed to retrieve tasks")
+
+    # Columns of the list projection, heavy text/JSONB columns are left out
+    SUMMARY_COLUMNS = (
+        Task.task_id,
+        Task.status,
+        Task.query,
+        Task.multi_agent_framework,
+        Task.llm_model,
+        Task.enable_internet,
+        Task.created_at,
+        Task.updated_at,
+    )
+
+    async def list_summaries(
+        self,
+        limit: int,
+        after: tuple[Any, str] | None = None,
+        filters: dict[str, Any] | None = None,
+        db: AsyncSession | None = None,
+    ) -> list[Row]:
+        """Get one page of task summaries, newest first, with keyset pagination.
+
+        Args:
+            limit (int): Maximum number of rows to return.
+            after (tuple | None): ``(created_at, task_id)`` of the last row of the
+                previous page; rows strictly older than it are returned.
+            filters (dict | None): Column values the tasks must have, e.g.
+                ``{"status": "failed"}``; each one has an index on
+                ``(column, created_at, task_id)``.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            list[Row]: Rows with the ``SUMMARY_COLUMNS`` attributes.
+
+        """
+        stmt = select(*self.SUMMARY_COLUMNS)
+        for field, value in (filters or {}).items():
+            stmt = stmt.where(getattr(Task, field) == value)
+        if after is not None:
+            # Row comparison walks the (created_at, task_id) index, whatever the depth
+            stmt = stmt.where(tuple_(Task.created_at, Task.task_id) < after)
+        stmt = stmt.order_by(Task.created_at.desc(), Task.task_id.desc()).limit(limit)
+        try:
+            async with self._session(db) as session:
+                result = await session.execute(stmt)
+                return list(result.all())
+        except Exception as e:
+            self.logger.exception("Error listing tasks")
+            raise HTTPException(status_code=500, detail="Failed to list tasks") from e
+
+    # task_metadata.dedupe keys, the fingerprint as in the expression of
+    # idx_tasks_dedupe_fingerprint
+    DEDUPE_FINGERPRINT = literal_column(
+        "tasks.task_metadata #>> '{dedupe,fingerprint}'"
+    )
+    DEDUPE_MODE = literal_column("tasks.task_metadata #>> '{dedupe,mode}'")
+
+    async def touch(self, task_id: str, db: AsyncSession | None = None) -> bool:
+        """Set a task's updated_at to now, the heartbeat of a task leading a dedupe.
+
+        Args:
+            task_id (str): The ID of the task.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            bool: False if the task does not exist.
+
+        """
+        stmt = (
+            update(Task).where(Task.task_id == task_id).values(updated_at=func.now())
+        )
+        async with self._session(db) as session:
+            result = await session.execute(stmt)
+            await session.commit()
+        return result.rowcount > 0
+
+    async def find_dedupe_leader(
+        self,
+        fingerprint: str,
+        statuses: tuple[str, ...],
+        exclude_task_id: str,
+        updated_within_seconds: int | None = None,
+        db: AsyncSession | None = None,
+    ) -> type[Task] | None:
+        """Most recently updated other task leading the same dedupe fingerprint.
+
+        Args:
+            fingerprint (str): ``task_metadata.dedupe.fingerprint`` to match.
+            statuses (tuple[str, ...]): Statuses the task may have.
+            exclude_task_id (str): The task looking, never returned.
+            updated_within_seconds (int | None): Only tasks updated this recently.
+            db (AsyncSession | None): Session of the calling request, if any.
+
+        Returns:
+            Task | None: The task, None if there is none.
+
+        """
+        dedupe_fingerprint = self.DEDUPE_FINGERPRINT
+        dedupe_mode = self.DEDUPE_MODE
+        stmt = select(Task).where(
+            dedupe_fingerprint == fingerprint,
+            dedupe_mode == TaskDedupeMode.LEADER.value,
+            Task.status.in_(statuses),
+            Task.task_id != exclude_task_id,
+        )
+        if updated_within_seconds is not None:
+            stmt = stmt.where(
+                Task.updated_at > func.now() - timedelta(seconds=updated_within_seconds)
+            )
+        stmt = stmt.order_by(Task.updated_at.desc()).limit(1)
+        async with self._session(db) as session:
+            result = await session.execute(stmt)
+            return result.scalars().first()
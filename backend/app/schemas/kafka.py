@@ -1,7 +1,6 @@
 from datetime import datetime
-from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.core.enums import TaskStatus
 
@@ -9,9 +8,12 @@ from app.core.enums import TaskStatus
 class KafkaTaskRequest(BaseModel):
     task_id: str
     task_type: str
-    payload: Optional[dict] = None
-    created_at: datetime = datetime.now()
+    payload: dict | None = None
+    created_at: datetime = Field(default_factory=datetime.now)
     status: str = TaskStatus.IN_PROGRESS.value
+    attempts: int = 0  # failed runs so far
+    not_before: datetime | None = None  # retries wait until then
+    last_error: str | None = None
 
 
 class KafkaTaskResponse(BaseModel):
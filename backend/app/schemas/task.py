@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 
 from app.core.enums import MultiAgentFrameworks
 from app.models.llm import get_default_model
@@ -20,6 +20,11 @@ class TaskRequest(BaseModel):
     enable_internet: bool | None = True
     maf_instructions: MafInstructions | None = None
     email_output: bool = False
+    # Scheduling: higher priority runs first, tasks of different users are interleaved
+    priority: int = 0
+    user_id: str | None = None
+    # Serve repeated LLM prompts (ledger, planning, fact checks) from the response cache
+    enable_llm_cache: bool = False
 
 
 class LiveStreamResponse(BaseModel):
@@ -44,9 +49,41 @@ class TaskResponse(BaseModel):
     task_output: TaskOutput | None = None
     live_stream_response: LiveStreamResponse | None = None
     task_metadata: dict | None = None
+    # Position in the scheduler queue while the task is queued in this process
+    queue_position: int | None = None
     created_at: datetime | None = None
     updated_at: datetime | None = None
 
+
+class TaskSummary(BaseModel):
+    """Light projection of a task for list pages (no final response or metadata)."""
+
+    task_id: str
+    status: str | None = None
+    query: str | None = None
+    multi_agent_framework: str | None = None
+    llm_model: str | None = None
+    enable_internet: bool | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+
+
+class TaskListFilters(BaseModel):
+    """Optional filters of the task list, each one an exact match."""
+
+    status: str | None = None
+    multi_agent_framework: str | None = None
+    llm_model: str | None = None
+
+
+class TaskPage(BaseModel):
+    """One page of task summaries, newest first."""
+
+    items: list[TaskSummary] = []
+    # Opaque cursor of the next (older) page, None on the last page
+    next_cursor: str | None = None
+
+
 class ChatRequest(BaseModel):
     query: str
     file_hashes: list[str]
@@ -72,6 +109,58 @@ class LLMFileInput(BaseModel):
     file_size: int | None = None
     file_local_path: str | None = None
     file_cloud_url: str | None = None
+    # Artifacts of the upload-time document preprocessing, if any
+    file_text_path: str | None = None
+    file_page_image_paths: list[str] = Field(default_factory=list)
+
+
+class TaskFileReference(BaseModel):
+    """A file to add to a task by content hash, see POST /task/{id}/files/by-hash."""
+
+    file_name: str
+    sha256: str = Field(pattern=r"^[0-9a-fA-F]{64}$")
+
+
+class TaskFileAttachResponse(BaseModel):
+    """Outcome of attaching files by content hash."""
+
+    task_id: str
+    # Recorded on the task, their contents were already stored
+    attached: list[str] = []
+    # Unknown contents, to upload with POST /task/{task_id}/uploads
+    missing: list[str] = []
+    input_file_names: list[str] = []
+
+
+class BulkTaskRequest(BaseModel):
+    """Tasks to create in one request, see POST /task/bulk."""
+
+    tasks: list[TaskRequest] = Field(min_length=1)
+
+
+class BulkTaskStartRequest(BaseModel):
+    """Tasks to start in one request, see POST /task/bulk/start."""
+
+    task_ids: list[str] = Field(min_length=1)
+
+
+class BulkTaskItemResult(BaseModel):
+    """Outcome of one item of a bulk request."""
+
+    # Position of the item in the request
+    index: int
+    task_id: str | None = None
+    status: str | None = None
+    # Why the item was rejected, the other items are processed regardless
+    error: str | None = None
+
+
+class BulkTaskResponse(BaseModel):
+    """Outcome of a bulk request, item by item."""
+
+    succeeded: int = 0
+    failed: int = 0
+    results: list[BulkTaskItemResult] = []
 
 
 class AgenticTaskRequest(BaseModel):
@@ -84,3 +173,12 @@ class AgenticTaskRequest(BaseModel):
     dialogue_id: str | None = None
     stream: bool | None = False
     metadata: dict | None = None
+
+
+class TaskEvent(BaseModel):
+    """Progress event of a task, as published and streamed over SSE."""
+
+    task_id: str
+    event: str
+    data: dict = {}
+    created_at: datetime = Field(default_factory=datetime.now)
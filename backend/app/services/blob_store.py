@@ -0,0 +1,283 @@
+"""Content-addressed storage of task input files."""
+
+import asyncio
+import contextlib
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from app.core.enums import BlobStoreBackend
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.repository.blob_repository import BlobRepository
+from app.schemas.task import LLMFileInput
+from app.services.document_preprocessor import document_preprocessor
+
+logger = get_logger()
+
+
+def _blob_path(root: str, sha256: str) -> str:
+    return os.path.join(root, sha256[:2], sha256)
+
+
+def _link(target: str, link_path: str):
+    """Point ``link_path`` at ``target``, replacing a stale link."""
+    os.makedirs(os.path.dirname(link_path), exist_ok=True)
+    if os.path.islink(link_path):
+        if os.readlink(link_path) == target:
+            return
+        os.remove(link_path)
+    elif os.path.exists(link_path):
+        # A file uploaded before the blob store existed
+        return
+    os.symlink(target, link_path)
+
+
+class BlobBackend(ABC):
+    """Where blob contents live, addressed by their SHA-256."""
+
+    @abstractmethod
+    async def put(self, sha256: str, source_path: str):
+        """Store the file at ``source_path`` (consumed), unless already stored."""
+
+    @abstractmethod
+    async def local_path(self, sha256: str) -> str:
+        """Path of a local copy of the content, fetched if needed."""
+
+    @abstractmethod
+    async def delete(self, sha256: str):
+        """Delete the content; missing content is not an error."""
+
+    def url(self, sha256: str) -> str | None:
+        """URL of the content for clients, None if it has none."""
+        return None
+
+
+class LocalBlobBackend(BlobBackend):
+    """Blobs as files under ``root/<2 first hex digits>/<sha256>``."""
+
+    def __init__(self, root: str):
+        """Store blobs under ``root``."""
+        self.root = os.path.abspath(root)
+
+    async def put(self, sha256: str, source_path: str):
+        """Move the file into place, or drop it if the content is already there."""
+        await asyncio.to_thread(self._put, sha256, source_path)
+
+    def _put(self, sha256: str, source_path: str):
+        path = _blob_path(self.root, sha256)
+        if os.path.exists(path):
+            os.remove(source_path)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(source_path, path)
+
+    async def local_path(self, sha256: str) -> str:
+        """Path of the blob itself."""
+        return _blob_path(self.root, sha256)
+
+    async def delete(self, sha256: str):
+        """Remove the blob file, if still there."""
+        with contextlib.suppress(FileNotFoundError):
+            await asyncio.to_thread(os.remove, _blob_path(self.root, sha256))
+
+
+class S3BlobBackend(BlobBackend):
+    """Blobs as objects ``<prefix><sha256>`` of an S3-compatible bucket.
+
+    Agents need files on disk, so contents are downloaded once into a local cache
+    (``cache_dir``) shared by every task of this host. Needs ``boto3``.
+    """
+
+    def __init__(
+        self, bucket: str, prefix: str, endpoint_url: str | None, cache_dir: str
+    ):
+        """Store blobs in ``bucket``, a custom ``endpoint_url`` for MinIO and others."""
+        try:
+            import boto3
+        except ImportError as e:
+            error = "BLOB_STORE_BACKEND=s3 requires boto3 (pip install boto3)"
+            raise RuntimeError(error) from e
+        if not bucket:
+            error = "BLOB_STORE_BACKEND=s3 requires BLOB_STORE_S3_BUCKET"
+            raise RuntimeError(error)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self.cache_dir = os.path.abspath(cache_dir)
+        self._client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _key(self, sha256: str) -> str:
+        return f"{self.prefix}{sha256}"
+
+    async def put(self, sha256: str, source_path: str):
+        """Upload the file unless the object exists, then remove it."""
+        await asyncio.to_thread(self._put, sha256, source_path)
+
+    def _put(self, sha256: str, source_path: str):
+        from botocore.exceptions import ClientError
+
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._key(sha256))
+        except ClientError:
+            self._client.upload_file(source_path, self.bucket, self._key(sha256))
+        os.remove(source_path)
+
+    async def local_path(self, sha256: str) -> str:
+        """Path of the cached copy, downloaded on first use."""
+        path = _blob_path(self.cache_dir, sha256)
+        if not os.path.exists(path):
+            await asyncio.to_thread(self._download, sha256, path)
+        return path
+
+    def _download(self, sha256: str, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            self._client.download_file(self.bucket, self._key(sha256), part_path)
+            os.replace(part_path, path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    async def delete(self, sha256: str):
+        """Delete the object and its cached copy."""
+        await asyncio.to_thread(
+            self._client.delete_object, Bucket=self.bucket, Key=self._key(sha256)
+        )
+        with contextlib.suppress(FileNotFoundError):
+            await asyncio.to_thread(os.remove, _blob_path(self.cache_dir, sha256))
+
+    def url(self, sha256: str) -> str | None:
+        """URL of the object, through ``endpoint_url`` when one is set."""
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{self._key(sha256)}"
+        return f"s3://{self.bucket}/{self._key(sha256)}"
+
+
+class BlobStore:
+    """Content-addressed, deduplicated store of task input files.
+
+    A file is stored once per SHA-256, whatever the number of tasks it was uploaded
+    to. A task refers to a blob through ``task_metadata.input_files[name].sha256``.
+    Each such entry holds one reference in the ``blobs`` table. Blobs without
+    references are deleted by ``collect_garbage`` after a grace period. Tasks see
+    their files as ``<UPLOAD_DIR>/<task_id>/<name>`` symlinks to local copies of the
+    blobs.
+    """
+
+    def __init__(self, backend: BlobBackend, staging_dir: str):
+        """Store contents in ``backend``, uploads are staged in ``staging_dir``."""
+        self.backend = backend
+        self.staging_dir = staging_dir
+        self.repository = BlobRepository()
+
+    async def store(self, files: dict[str, tuple[str, int]], db=None):
+        """Add references to staged files and store them: path -> (sha256, size).
+
+        References are added before the contents are put, so a concurrent garbage
+        collection cannot delete a blob this upload relies on.
+        """
+        counts = Counter(sha256 for sha256, _ in files.values())
+        sizes = {sha256: size for sha256, size in files.values()}
+        await self.repository.acquire(
+            {sha256: (sizes[sha256], count) for sha256, count in counts.items()}, db
+        )
+        try:
+            for path, (sha256, _) in files.items():
+                await self.backend.put(sha256, path)
+        except BaseException:
+            await self.repository.release(dict(counts), db)
+            raise
+
+    async def reference(self, sha256s: list[str], db=None) -> dict[str, int]:
+        """Add references to contents already stored.
+
+        Returns sha256 -> size of the contents found.
+        """
+        return await self.repository.acquire_existing(Counter(sha256s), db)
+
+    async def release(self, sha256s: list[str], db=None):
+        """Drop one reference per listed content."""
+        if sha256s:
+            await self.repository.release(Counter(sha256s), db)
+
+    async def preprocess(self, files: dict[str, str]):
+        """Schedule the document preprocessing of stored files: file name -> sha256."""
+        for file_name, sha256 in files.items():
+            if not document_preprocessor.supports(file_name):
+                continue
+            try:
+                source_path = await self.backend.local_path(sha256)
+            except Exception:
+                # Best effort, the task converts the file when it starts
+                logger.exception(f"Could not schedule preprocessing of {file_name}")
+                continue
+            document_preprocessor.schedule(sha256, file_name, source_path)
+
+    async def resolve(
+        self, task_id: str, file_name: str, details: dict | None
+    ) -> LLMFileInput:
+        """File input of a task, with ``file_local_path`` linked to the stored blob.
+
+        Preprocessed artifacts of documents are attached, see
+        ``DocumentPreprocessor``.
+        """
+        link_path = os.path.join(settings.UPLOAD_DIR, str(task_id), file_name)
+        file_input = LLMFileInput(
+            file_name=file_name,
+            file_extension=os.path.splitext(file_name)[1].lstrip(".") or None,
+            file_local_path=link_path,
+        )
+        sha256 = (details or {}).get("sha256")
+        if not sha256:
+            # Uploaded before the blob store, the file is in the task folder itself
+            return file_input
+        blob_path = await self.backend.local_path(sha256)
+        await asyncio.to_thread(_link, blob_path, link_path)
+        file_input.file_hash = sha256
+        file_input.file_size = details.get("size")
+        file_input.file_cloud_url = self.backend.url(sha256)
+        return await document_preprocessor.attach(file_input, blob_path)
+
+    async def _delete(self, sha256: str):
+        await self.backend.delete(sha256)
+        await document_preprocessor.discard(sha256)
+
+    async def collect_garbage(self) -> list[str]:
+        """Delete the blobs unreferenced for the grace period, return their hashes."""
+        deleted = await self.repository.collect_garbage(
+            settings.BLOB_STORE_GC_GRACE_SECONDS, self._delete
+        )
+        if deleted:
+            logger.info(f"Blob store garbage collection deleted {len(deleted)} blobs")
+        return deleted
+
+    async def run_garbage_collector(self):
+        """Collect garbage every BLOB_STORE_GC_INTERVAL_SECONDS until cancelled."""
+        while True:
+            try:
+                await self.collect_garbage()
+            except Exception:
+                logger.exception("Blob store garbage collection failed")
+            await asyncio.sleep(settings.BLOB_STORE_GC_INTERVAL_SECONDS)
+
+
+def create_blob_backend(backend: str) -> BlobBackend:
+    """Backend configured by BLOB_STORE_BACKEND."""
+    if backend == BlobStoreBackend.S3.value:
+        return S3BlobBackend(
+            settings.BLOB_STORE_S3_BUCKET,
+            settings.BLOB_STORE_S3_PREFIX,
+            settings.BLOB_STORE_S3_ENDPOINT_URL,
+            cache_dir=os.path.join(settings.BLOB_STORE_DIR, "cache"),
+        )
+    return LocalBlobBackend(settings.BLOB_STORE_DIR)
+
+
+blob_store = BlobStore(
+    create_blob_backend(settings.BLOB_STORE_BACKEND),
+    staging_dir=os.path.join(settings.BLOB_STORE_DIR, "staging"),
+)
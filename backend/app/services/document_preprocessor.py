@@ -0,0 +1,272 @@
+"""Conversion of uploaded documents to text, once per content."""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.schemas.task import LLMFileInput
+
+logger = get_logger()
+
+MANIFEST_FILE = "manifest.json"
+TEXT_FILE = "text.md"
+PAGES_DIR = "pages"
+
+
+def _render_pages(source_path: str, pages_dir: str, max_pages: int) -> list[str]:
+    """PNG images of the first ``max_pages`` pages of a PDF; needs ``pypdfium2``."""
+    try:
+        import pypdfium2
+    except ImportError:
+        return []
+    os.makedirs(pages_dir, exist_ok=True)
+    pdf = pypdfium2.PdfDocument(source_path)
+    try:
+        names = []
+        for index in range(min(len(pdf), max_pages)):
+            name = f"page-{index + 1:04d}.png"
+            pdf[index].render(scale=1.5).to_pil().save(os.path.join(pages_dir, name))
+            names.append(name)
+        return names
+    finally:
+        pdf.close()
+
+
+def _convert(source_path: str, extension: str, target_dir: str, max_pages: int) -> dict:
+    """Convert a document to markdown (and PDF page images) into ``target_dir``.
+
+    Runs in a pool process. The artifacts are written to a scratch folder renamed to
+    ``target_dir`` once complete, so readers never see a partial conversion and
+    concurrent conversions of the same content (other replicas) keep the first one.
+    Conversion errors are recorded in the manifest, the document is not retried.
+    """
+    from markitdown import MarkItDown
+
+    part_dir = f"{target_dir}.{uuid.uuid4().hex}.part"
+    os.makedirs(part_dir)
+    manifest = {"extension": extension, "text": None, "pages": [], "error": None}
+    try:
+        try:
+            result = MarkItDown().convert_local(
+                source_path, file_extension=f".{extension}"
+            )
+            with open(os.path.join(part_dir, TEXT_FILE), "w", encoding="utf-8") as f:
+                f.write(result.text_content or "")
+            manifest["text"] = TEXT_FILE
+            if extension == "pdf" and max_pages > 0:
+                manifest["pages"] = _render_pages(
+                    source_path, os.path.join(part_dir, PAGES_DIR), max_pages
+                )
+        except Exception as e:
+            manifest["error"] = f"{type(e).__name__}: {e!s}"
+        with open(os.path.join(part_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(part_dir, target_dir)
+        except OSError:
+            # Converted meanwhile by another process
+            if not os.path.exists(os.path.join(target_dir, MANIFEST_FILE)):
+                raise
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return manifest
+
+
+class DocumentPreprocessor:
+    """Converts uploaded documents to text once per content, ahead of the agents.
+
+    Uploads schedule a conversion of each PDF/office/HTML file with markitdown in a
+    pool of spawned processes. The artifacts (``text.md``, PDF page images) are kept
+    under ``<root>/<2 first hex digits>/<sha256>.<extension>/``, so a content uploaded
+    again, to any task, is not converted again. ``execute_task`` attaches the
+    artifacts to the file inputs and agents read the text instead of parsing the
+    original at run time.
+    """
+
+    def __init__(
+        self,
+        root: str = settings.DOCUMENT_PREPROCESS_DIR,
+        extensions: str = settings.DOCUMENT_PREPROCESS_EXTENSIONS,
+        max_workers: int = settings.DOCUMENT_PREPROCESS_MAX_WORKERS,
+        max_page_images: int = settings.DOCUMENT_PREPROCESS_MAX_PAGE_IMAGES,
+        enabled: bool = settings.DOCUMENT_PREPROCESS_ENABLED,
+    ):
+        """Convert files of ``extensions`` (comma separated) into ``root``."""
+        self.root = os.path.abspath(root)
+        self.extensions = frozenset(
+            extension.strip().lstrip(".").lower()
+            for extension in extensions.split(",")
+            if extension.strip()
+        )
+        self.max_workers = max_workers
+        self.max_page_images = max_page_images
+        self.enabled = enabled
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending: dict[str, asyncio.Future] = {}
+        self._stats = {"scheduled": 0, "converted": 0, "failed": 0, "cached": 0}
+
+    def _target_dir(self, sha256: str, extension: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.{extension}")
+
+    @staticmethod
+    def _extension(file_name: str) -> str:
+        return os.path.splitext(file_name)[1].lstrip(".").lower()
+
+    def supports(self, file_name: str) -> bool:
+        """Whether files with the extension of ``file_name`` are preprocessed."""
+        return self.enabled and self._extension(file_name) in self.extensions
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _read_manifest(self, target_dir: str) -> dict | None:
+        try:
+            with open(os.path.join(target_dir, MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def schedule(
+        self, sha256: str, file_name: str, source_path: str
+    ) -> asyncio.Future | None:
+        """Convert a stored file in the background, unless done or in progress.
+
+        Returns:
+            asyncio.Future | None: The conversion, None if the file type is not
+            preprocessed or its artifacts already exist.
+
+        """
+        if not self.supports(file_name):
+            return None
+        extension = self._extension(file_name)
+        key = f"{sha256}.{extension}"
+        if key in self._pending:
+            return self._pending[key]
+        target_dir = self._target_dir(sha256, extension)
+        if os.path.exists(os.path.join(target_dir, MANIFEST_FILE)):
+            return None
+        future = asyncio.ensure_future(
+            self._run(key, source_path, extension, target_dir)
+        )
+        self._pending[key] = future
+        self._stats["scheduled"] += 1
+        return future
+
+    async def _run(
+        self, key: str, source_path: str, extension: str, target_dir: str
+    ) -> dict | None:
+        try:
+            os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+            loop = asyncio.get_running_loop()
+            try:
+                manifest = await loop.run_in_executor(
+                    self._get_pool(),
+                    _convert,
+                    source_path,
+                    extension,
+                    target_dir,
+                    self.max_page_images,
+                )
+            except BrokenProcessPool:
+                # A worker died (out of memory on a huge document), start a fresh pool
+                self._pool = None
+                raise
+            if manifest.get("error"):
+                self._stats["failed"] += 1
+                logger.warning(
+                    f"Could not preprocess document {key}: {manifest['error']}"
+                )
+            else:
+                self._stats["converted"] += 1
+                logger.info(f"Preprocessed document {key}")
+        except Exception:
+            self._stats["failed"] += 1
+            logger.exception(f"Document preprocessing of {key} failed")
+            return None
+        else:
+            return manifest
+        finally:
+            self._pending.pop(key, None)
+
+    async def attach(
+        self, file_input: LLMFileInput, source_path: str | None = None
+    ) -> LLMFileInput:
+        """Fill ``file_text_path``/``file_page_image_paths`` from the artifacts.
+
+        A conversion still running (or never scheduled, e.g. files uploaded before this
+        stage existed) is awaited up to DOCUMENT_PREPROCESS_WAIT_SECONDS; past that the
+        agents get the original file only.
+        """
+        if not file_input.file_hash or not self.supports(file_input.file_name or ""):
+            return file_input
+        extension = self._extension(file_input.file_name)
+        target_dir = self._target_dir(file_input.file_hash, extension)
+        manifest = await asyncio.to_thread(self._read_manifest, target_dir)
+        if manifest is None:
+            future = self.schedule(
+                file_input.file_hash,
+                file_input.file_name,
+                source_path or file_input.file_local_path,
+            )
+            if future is not None:
+                try:
+                    manifest = await asyncio.wait_for(
+                        asyncio.shield(future),
+                        settings.DOCUMENT_PREPROCESS_WAIT_SECONDS,
+                    )
+                except TimeoutError:
+                    logger.info(
+                        f"Document {file_input.file_name} not preprocessed yet, "
+                        "using the original"
+                    )
+        else:
+            self._stats["cached"] += 1
+        if not manifest or manifest.get("error"):
+            return file_input
+        if manifest.get("text"):
+            file_input.file_text_path = os.path.join(target_dir, manifest["text"])
+        file_input.file_page_image_paths = [
+            os.path.join(target_dir, PAGES_DIR, name)
+            for name in manifest.get("pages", [])
+        ]
+        return file_input
+
+    async def discard(self, sha256: str):
+        """Delete every artifact of a content, when its blob is deleted."""
+        folder = os.path.join(self.root, sha256[:2])
+
+        def _discard():
+            try:
+                names = os.listdir(folder)
+            except FileNotFoundError:
+                return
+            for name in names:
+                if name.startswith(f"{sha256}."):
+                    shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+        await asyncio.to_thread(_discard)
+
+    def stats(self) -> dict:
+        """Conversion counters since startup and conversions in progress."""
+        return {"pending": len(self._pending), **self._stats}
+
+    def shutdown(self):
+        """Stop the pool, cancelling the queued conversions."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+document_preprocessor = DocumentPreprocessor()
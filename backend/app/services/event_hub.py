@@ -0,0 +1,245 @@
+"""Task progress events, fanned out to SSE subscribers of every API replica."""
+
+import asyncio
+import contextlib
+import json
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
+
+import asyncpg
+
+from app.core.enums import EventHubBackend
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.schemas.task import TaskEvent
+
+logger = get_logger()
+
+
+class EventBackend(ABC):
+    """Transport that carries published events to every hub sharing it."""
+
+    @abstractmethod
+    async def start(self, deliver: Callable[[TaskEvent], None]):
+        """Start carrying events, each one is handed to ``deliver``."""
+
+    @abstractmethod
+    async def publish(self, event: TaskEvent):
+        """Send an event to every hub sharing the transport."""
+
+    @abstractmethod
+    async def stop(self):
+        """Stop carrying events and release the transport."""
+
+
+class InMemoryEventBackend(EventBackend):
+    """Delivers events to subscribers of the same process only."""
+
+    def __init__(self):
+        """Deliver nothing until started."""
+        self._deliver: Callable[[TaskEvent], None] | None = None
+
+    async def start(self, deliver: Callable[[TaskEvent], None]):
+        """Hand published events to ``deliver``."""
+        self._deliver = deliver
+
+    async def publish(self, event: TaskEvent):
+        """Deliver the event right away."""
+        if self._deliver:
+            self._deliver(event)
+
+    async def stop(self):
+        """Drop events published from now on."""
+        self._deliver = None
+
+
+class PostgresEventBackend(EventBackend):
+    """Shares events across API replicas and workers through LISTEN/NOTIFY.
+
+    A lost connection (e.g. a Postgres restart) is reopened in the background, with
+    a growing delay between attempts, and the channel is listened to again. Events
+    published meanwhile are lost, like events of a full subscriber queue.
+    """
+
+    # NOTIFY payloads are limited to 8000 bytes
+    MAX_PAYLOAD_BYTES = 7900
+    RECONNECT_MIN_SECONDS = 0.5
+    RECONNECT_MAX_SECONDS = 30.0
+
+    def __init__(self, dsn: str, channel: str):
+        """Use ``channel`` of the Postgres at ``dsn`` (asyncpg format)."""
+        self.dsn = dsn
+        self.channel = channel
+        self._listener: asyncpg.Connection | None = None
+        self._publisher: asyncpg.Connection | None = None
+        self._publish_lock = asyncio.Lock()
+        self._deliver: Callable[[TaskEvent], None] | None = None
+        self._reconnecting: asyncio.Task | None = None
+
+    async def start(self, deliver: Callable[[TaskEvent], None]):
+        """Open the listening and the publishing connections."""
+        self._deliver = deliver
+        await self._connect()
+        logger.info(f"Listening for task events on Postgres channel {self.channel}")
+
+    async def _connect(self):
+        """Open whichever of the two connections is missing or closed."""
+        if self._listener is None or self._listener.is_closed():
+            listener = await asyncpg.connect(self.dsn)
+            listener.add_termination_listener(self._on_terminated)
+            await listener.add_listener(self.channel, self._on_notify)
+            self._listener = listener
+        if self._publisher is None or self._publisher.is_closed():
+            publisher = await asyncpg.connect(self.dsn)
+            publisher.add_termination_listener(self._on_terminated)
+            self._publisher = publisher
+
+    def _on_terminated(self, connection):
+        if self._deliver is None:
+            # Closed by stop
+            return
+        logger.warning(f"Lost a connection of task event channel {self.channel}")
+        self._reconnect()
+
+    def _reconnect(self):
+        if self._reconnecting is None or self._reconnecting.done():
+            self._reconnecting = asyncio.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        delay = self.RECONNECT_MIN_SECONDS
+        while self._deliver is not None:
+            try:
+                await self._connect()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError):
+                logger.exception(
+                    f"Could not reconnect to task event channel {self.channel}, "
+                    f"retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+            else:
+                logger.info(f"Reconnected to task event channel {self.channel}")
+                return
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        try:
+            event = TaskEvent.model_validate_json(payload)
+        except ValueError:
+            logger.exception(f"Dropping malformed task event on {channel}")
+            return
+        if self._deliver:
+            self._deliver(event)
+
+    async def publish(self, event: TaskEvent):
+        """NOTIFY the channel, oversized events only announce the update."""
+        payload = event.model_dump_json()
+        if len(payload.encode("utf-8")) > self.MAX_PAYLOAD_BYTES:
+            # Large payloads (e.g. final answers) are announced, readers fetch the task
+            event = event.model_copy(update={"data": {"truncated": True}})
+            payload = event.model_dump_json()
+        async with self._publish_lock:
+            if self._publisher is None or self._publisher.is_closed():
+                self._reconnect()
+                error = f"Task event channel {self.channel} is reconnecting"
+                raise ConnectionError(error)
+            await self._publisher.execute(
+                "SELECT pg_notify($1, $2)", self.channel, payload
+            )
+
+    async def stop(self):
+        """Stop listening and close both connections."""
+        self._deliver = None
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reconnecting
+            self._reconnecting = None
+        if self._listener and not self._listener.is_closed():
+            await self._listener.remove_listener(self.channel, self._on_notify)
+            await self._listener.close()
+        self._listener = None
+        if self._publisher and not self._publisher.is_closed():
+            await self._publisher.close()
+        self._publisher = None
+
+
+class EventHub:
+    """In-process pub/sub of task progress events.
+
+    Publishers (task service, agent frameworks, workers) call ``publish``. The backend
+    fans the event out to every hub sharing it. Each hub then hands it to the local
+    subscriber queues of that task. A slow subscriber drops its oldest events instead
+    of blocking publishers.
+    """
+
+    def __init__(self, backend: EventBackend, queue_size: int = 100):
+        """Buffer up to ``queue_size`` events per subscriber."""
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._started = False
+
+    async def start(self):
+        """Start the backend, events are not published before."""
+        await self.backend.start(self._deliver)
+        self._started = True
+
+    async def stop(self):
+        """Stop the backend."""
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+    async def publish(self, task_id: str, event: str, data: dict | None = None):
+        """Publish an event of a task, best effort."""
+        if not self._started:
+            return
+        task_event = TaskEvent(task_id=str(task_id), event=event, data=data or {})
+        try:
+            await self.backend.publish(task_event)
+        except Exception:
+            # Progress events are best effort, never fail the task because of them
+            logger.exception(f"Failed to publish {event} event for task {task_id}")
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, task_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Queue receiving the events of the task while the context is open."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[str(task_id)].add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(str(task_id))
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[str(task_id)]
+
+    def _deliver(self, event: TaskEvent):
+        for queue in self._subscribers.get(event.task_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+def create_event_backend(backend: str) -> EventBackend:
+    """Backend for an EVENT_HUB_BACKEND value."""
+    if backend == EventHubBackend.POSTGRES.value:
+        return PostgresEventBackend(
+            dsn=settings.DATABASE_URL.replace("+asyncpg", ""),
+            channel=settings.EVENT_HUB_CHANNEL,
+        )
+    return InMemoryEventBackend()
+
+
+event_hub = EventHub(
+    create_event_backend(settings.EVENT_HUB_BACKEND),
+    queue_size=settings.EVENT_SUBSCRIBER_QUEUE_SIZE,
+)
+
+
+def format_sse(event: TaskEvent) -> str:
+    """Serialize an event in the text/event-stream wire format."""
+    data = json.dumps(event.model_dump(mode="json"))
+    return f"event: {event.event}\ndata: {data}\n\n"
@@ -1,80 +1,227 @@
 import json
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
+
 import aiokafka
+from aiokafka import ConsumerRebalanceListener, TopicPartition
+
+from app.core.enums import KafkaTaskType, TaskStatus
+from app.core.exceptions import TaskNotFoundError
+from app.core.settings import settings
 from app.schemas.kafka import KafkaTaskRequest
+from app.services import task_service
+from app.services.kafka.producer import KafkaProducer
 
 logger = logging.getLogger(__name__)
 
 
+class _PartitionState:
+    """Offsets dispatched from one partition and which of them have finished."""
+
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending: dict[int, bool] = {}  # offset -> done, in dispatch order
+        self.committed: int | None = None
+        self.paused = False
+
+    def outstanding(self) -> int:
+        return sum(1 for done in self.pending.values() if not done)
+
+    def committable_offset(self) -> int | None:
+        """Next offset to commit: everything before the oldest unfinished message."""
+        offset = None
+        for message_offset, done in self.pending.items():
+            if not done:
+                break
+            offset = message_offset + 1
+        return offset
+
+    def forget_until(self, offset: int):
+        for message_offset in [o for o in self.pending if o < offset]:
+            del self.pending[message_offset]
+
+
+class _RebalanceListener(ConsumerRebalanceListener):
+    def __init__(self, consumer: "KafkaConsumer"):
+        self.consumer = consumer
+
+    async def on_partitions_revoked(self, revoked):
+        # Commit what has finished before another consumer takes the partitions over.
+        # Messages still running there will be redelivered (at-least-once).
+        await self.consumer.commit(force=True)
+        for tp in revoked:
+            self.consumer.partitions.pop(tp, None)
+
+    async def on_partitions_assigned(self, assigned):
+        partitions = sorted(tp.partition for tp in assigned)
+        logger.info(f"Kafka consumer assigned partitions: {partitions}")
+
+
 class KafkaConsumer:
-    def __init__(self, bootstrap_servers, topic, group_id="background_processor"):
+    """Consumer-group member that runs task executions in parallel per partition.
+
+    Each assigned partition runs up to ``partition_concurrency`` messages at once and
+    is paused while it is saturated; fetches are capped to the free slots. Offsets are
+    committed in batches, and only up to the oldest message that has not finished
+    yet, so a crash never skips a task.
+
+    A failed job is published to ``retry_topic`` (consumed here as well) and runs
+    again ``retry_delay`` seconds later, up to ``max_attempts`` runs. Then it is
+    parked on ``dead_letter_topic`` and its task marked as failed. The offset of a
+    failed message only counts as finished once it has been published there.
+
+    Commit batching and retries are configured by the KAFKA_* settings.
+    """
+
+    def __init__(
+        self,
+        bootstrap_servers,
+        topic,
+        group_id="background_processor",
+        partition_concurrency: int = 1,
+    ):
+        """Consume ``topic`` with up to ``partition_concurrency`` jobs per partition."""
         self.bootstrap_servers = bootstrap_servers
         self.topic = topic
         self.group_id = group_id
+        self.partition_concurrency = partition_concurrency
+        self.commit_batch_size = settings.KAFKA_COMMIT_BATCH_SIZE
+        self.commit_interval = settings.KAFKA_COMMIT_INTERVAL_SECONDS
+        self.retry_topic = settings.KAFKA_RETRY_TOPIC
+        self.dead_letter_topic = settings.KAFKA_DEAD_LETTER_TOPIC
+        self.max_attempts = settings.KAFKA_MAX_ATTEMPTS
+        self.retry_delay = settings.KAFKA_RETRY_DELAY_SECONDS
         self.consumer = None
+        self.producer = KafkaProducer(bootstrap_servers)
         self.running = False
+        self.partitions: dict[TopicPartition, _PartitionState] = {}
+        self._in_flight: set[asyncio.Task] = set()
+        self._restarted: asyncio.Task | None = None
+        self._completed_since_commit = 0
+        self._last_commit = 0.0
 
     async def start(self):
         self.consumer = aiokafka.AIOKafkaConsumer(
-            self.topic,
             bootstrap_servers=self.bootstrap_servers,
             group_id=self.group_id,
             auto_offset_reset="earliest",
             enable_auto_commit=False,
             value_deserializer=lambda m: json.loads(m.decode("utf-8"))
         )
+        topics = [self.topic] + ([self.retry_topic] if self.retry_topic else [])
+        self.consumer.subscribe(topics, listener=_RebalanceListener(self))
         await self.consumer.start()
+        await self.producer.start()
         logger.info(f"Kafka consumer started for topic {self.topic}")
         self.running = True
+        self.partitions = {}
+        self._completed_since_commit = 0
+        self._last_commit = asyncio.get_running_loop().time()
 
     async def stop(self):
         if self.consumer:
             self.running = False
+            if self._in_flight:
+                logger.info(f"Waiting for {len(self._in_flight)} in-flight Kafka jobs")
+                await asyncio.gather(*self._in_flight, return_exceptions=True)
+            await self.commit(force=True)
             await self.consumer.stop()
+            await self.producer.stop()
             logger.info(f"Kafka consumer stopped for topic {self.topic}")
 
-    async def process_job(self, job_data):
-        """Process a job from the Kafka topic."""
+    @staticmethod
+    def parse_job(job_data) -> KafkaTaskRequest:
+        """Build the job from a deserialized message, raises if it is invalid."""
         # Convert ISO datetime string back to datetime object
         job_data["created_at"] = datetime.fromisoformat(job_data["created_at"])
-        job = KafkaTaskRequest(**job_data)
+        return KafkaTaskRequest(**job_data)
 
-        logger.info(f"Processing job {job.id} of type {job.task_type}")
+    async def process_job(self, job: KafkaTaskRequest):
+        """Process a job from the Kafka topic, its outcome is set on ``job.status``."""
+        logger.info(
+            f"Processing job {job.task_id} of type {job.task_type}, "
+            f"attempt {job.attempts + 1}"
+        )
 
         try:
-            # Implement your actual job processing logic here
-            if job.task_type == "email":
-                await self._process_email_job(job)
-            elif job.task_type == "report":
-                await self._process_report_job(job)
+            if job.task_type == KafkaTaskType.EXECUTE_TASK.value:
+                await self._process_execute_task_job(job)
             else:
                 logger.warning(f"Unknown job type: {job.task_type}")
 
             # Update job status to completed
             job.status = "completed"
-            logger.info(f"KafkaTaskRequest {job.id} processed successfully")
+            logger.info(f"KafkaTaskRequest {job.task_id} processed successfully")
 
         except Exception as e:
             # Update job status to failed
             job.status = "failed"
-            logger.error(f"Error processing job {job.id}: {str(e)}")
+            job.last_error = str(e)
+            logger.exception(f"Error processing job {job.task_id}")
 
-        # In a real system, you might want to update a database with the job status
         return job
 
-    async def _process_email_job(self, job):
-        """Process an email job."""
-        logger.info(f"Sending email: {job.payload.get('subject', 'No subject')}")
-        # Simulate processing time
-        await asyncio.sleep(2)
+    async def _process_execute_task_job(self, job: KafkaTaskRequest):
+        """Run the agent task referenced by the job."""
+        task = await task_service.task_repository.get(job.task_id)
+        if task is None:
+            raise TaskNotFoundError(job.task_id)
+        await task_service.execute_task(task)
 
-    async def _process_report_job(self, job):
-        """Process a report generation job."""
-        logger.info(f"Generating report: {job.payload.get('report_type', 'Unknown')}")
-        # Simulate processing time
-        await asyncio.sleep(5)
+    async def _retry_or_dead_letter(self, job: KafkaTaskRequest) -> bool:
+        """Publish a failed job for another run, or park it; False if not published."""
+        job.attempts += 1
+        retrying = bool(self.retry_topic) and job.attempts < self.max_attempts
+        if retrying:
+            job.not_before = datetime.now() + timedelta(seconds=self.retry_delay)
+            logger.warning(
+                f"Job {job.task_id} attempt {job.attempts}/{self.max_attempts} failed, "
+                f"retrying after {job.not_before.isoformat()}"
+            )
+        else:
+            logger.error(
+                f"Job {job.task_id} failed after {job.attempts} attempts: "
+                f"{job.last_error}"
+            )
+        topic = self.retry_topic if retrying else self.dead_letter_topic
+        if topic and not await self._publish(
+            lambda: self.producer.send_job(job, topic)
+        ):
+            return False
+        if not retrying:
+            try:
+                await task_service.update_task(
+                    job.task_id, {"status": TaskStatus.FAILED.value}
+                )
+            except Exception:
+                logger.exception(f"Could not mark task {job.task_id} as failed")
+        return True
+
+    async def _publish(self, send) -> bool:
+        """Retry a send until it succeeds; False if the consumer stops first."""
+        delay = 1.0
+        while True:
+            try:
+                await send()
+            except Exception:
+                if not self.running:
+                    logger.exception("Kafka publish failed, left for redelivery")
+                    return False
+                logger.exception(f"Kafka publish failed, retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            else:
+                return True
+
+    async def _wait_until(self, not_before: datetime | None) -> bool:
+        """Sleep until a retry is due; False if the consumer stops first."""
+        while not_before is not None and self.running:
+            remaining = (not_before - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return True
+            await asyncio.sleep(min(remaining, 1.0))
+        return self.running
 
     async def consume(self):
         """Consume messages from the Kafka topic and process them."""
@@ -82,22 +229,24 @@ class KafkaConsumer:
             raise RuntimeError("Consumer not started")
 
         try:
-            async for message in self.consumer:
-                if not self.running:
-                    break
-
-                logger.info(f"Received message from partition {message.partition} at offset {message.offset}")
-
-                try:
-                    # Process the job
-                    job_data = message.value
-                    await self.process_job(job_data)
-
-                    # Commit the offset
-                    await self.consumer.commit()
-
-                except Exception as e:
-                    logger.error(f"Error processing message: {str(e)}")
+            while self.running:
+                self._apply_backpressure()
+                # Saturated partitions are paused, the others get their free slots
+                batches = await self.consumer.getmany(
+                    timeout_ms=1000, max_records=max(self._free_slots(), 1)
+                )
+                for tp, messages in batches.items():
+                    state = self.partitions.setdefault(
+                        tp, _PartitionState(self.partition_concurrency)
+                    )
+                    for message in messages:
+                        logger.info(
+                            f"Received message from {message.topic} partition "
+                            f"{message.partition} at offset {message.offset}"
+                        )
+                        state.pending[message.offset] = False
+                        self._dispatch(tp, state, message)
+                await self.commit()
 
         except Exception as e:
             logger.error(f"Consumer error: {str(e)}")
@@ -106,4 +255,95 @@ class KafkaConsumer:
                 await self.stop()
                 await asyncio.sleep(5)
                 await self.start()
-                asyncio.create_task(self.consume())
\ No newline at end of file
+                self._restarted = asyncio.create_task(self.consume())
+
+    def _dispatch(self, tp: TopicPartition, state: _PartitionState, message):
+        async def run():
+            try:
+                job = self.parse_job(message.value)
+            except Exception as e:
+                # Can never succeed, park it as it is
+                error = str(e)
+                logger.exception(f"Invalid job at offset {message.offset} of {tp}")
+                dead_letter = {"message": message.value, "last_error": error}
+                handled = not self.dead_letter_topic or await self._publish(
+                    lambda: self.producer.send_message(
+                        dead_letter, self.dead_letter_topic
+                    )
+                )
+            else:
+                if not await self._wait_until(job.not_before):
+                    # Stopping, the retry is redelivered to the next consumer
+                    return
+                async with state.semaphore:
+                    job = await self.process_job(job)
+                handled = job.status != "failed" or await self._retry_or_dead_letter(
+                    job
+                )
+            if handled:
+                state.pending[message.offset] = True
+                self._completed_since_commit += 1
+
+        task = asyncio.create_task(run())
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    def _free_slots(self) -> int:
+        """Messages the assigned partitions can start without waiting."""
+        free = 0
+        for tp in self.consumer.assignment():
+            state = self.partitions.get(tp)
+            outstanding = state.outstanding() if state else 0
+            free += max(self.partition_concurrency - outstanding, 0)
+        return free
+
+    def _apply_backpressure(self):
+        """Pause saturated partitions so fetched-but-unstarted messages stay bounded."""
+        for tp, state in self.partitions.items():
+            outstanding = state.outstanding()
+            if outstanding >= self.partition_concurrency and not state.paused:
+                self.consumer.pause(tp)
+                state.paused = True
+            elif outstanding < self.partition_concurrency and state.paused:
+                self.consumer.resume(tp)
+                state.paused = False
+
+    async def commit(self, force: bool = False):
+        """Commit finished offsets once a batch filled up or the interval elapsed."""
+        now = asyncio.get_running_loop().time()
+        if not force and (
+            self._completed_since_commit < self.commit_batch_size
+            and now - self._last_commit < self.commit_interval
+        ):
+            return
+
+        offsets = {}
+        for tp, state in self.partitions.items():
+            offset = state.committable_offset()
+            if offset is not None and offset != state.committed:
+                offsets[tp] = offset
+        if offsets:
+            try:
+                await self.consumer.commit(offsets)
+            except Exception:
+                logger.exception("Kafka offset commit failed")
+                return
+            for tp, offset in offsets.items():
+                state = self.partitions[tp]
+                state.committed = offset
+                state.forget_until(offset)
+            logger.info(
+                f"Committed offsets: { {tp.partition: o for tp, o in offsets.items()} }"
+            )
+        self._completed_since_commit = 0
+        self._last_commit = now
+
+
+def create_task_consumer() -> KafkaConsumer:
+    """Consumer for the agent task topic, configured from settings."""
+    return KafkaConsumer(
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        topic=settings.KAFKA_TASK_TOPIC,
+        group_id=settings.KAFKA_CONSUMER_GROUP,
+        partition_concurrency=settings.KAFKA_PARTITION_CONCURRENCY,
+    )
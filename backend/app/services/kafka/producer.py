@@ -1,8 +1,13 @@
+"""Kafka producer publishing task jobs."""
+
+import asyncio
 import json
-import uuid
 import logging
-from datetime import datetime
+
 import aiokafka
+
+from app.core.exceptions import ProducerNotStartedError
+from app.core.settings import settings
 from app.schemas.kafka import KafkaTaskRequest
 
 logger = logging.getLogger(__name__)
@@ -27,19 +32,49 @@ class KafkaProducer:
 
     async def send_job(self, job: KafkaTaskRequest, topic: str):
         if not self.producer:
-            raise RuntimeError("Producer not started")
+            raise ProducerNotStartedError
 
-        # Convert the job to a JSON string
-        job_data = job.model_dump()
-        job_data["created_at"] = job_data["created_at"].isoformat()
-        job_str = json.dumps(job_data)
+        # Convert the job to a JSON string (datetimes as ISO strings)
+        job_str = json.dumps(job.model_dump(mode="json"))
 
-        # Send the job to Kafka topic
+        # Send the job to Kafka topic. Keying by task_id keeps every message of a
+        # task on the same partition.
         await self.producer.send_and_wait(
             topic=topic,
             value=job_str.encode("utf-8"),
-            key=job.id.encode("utf-8")
+            key=job.task_id.encode("utf-8")
         )
 
         logger.info(f"Job {job.task_id} sent to topic {topic}")
-        return job
\ No newline at end of file
+        return job
+
+    async def send_jobs(self, jobs: list[KafkaTaskRequest], topic: str):
+        """Send many jobs, letting the producer batch them, and wait for every ack."""
+        if not self.producer:
+            raise ProducerNotStartedError
+
+        deliveries = []
+        for job in jobs:
+            deliveries.append(
+                await self.producer.send(
+                    topic=topic,
+                    value=json.dumps(job.model_dump(mode="json")).encode("utf-8"),
+                    key=job.task_id.encode("utf-8"),
+                )
+            )
+        await asyncio.gather(*deliveries)
+
+        logger.info(f"{len(jobs)} jobs sent to topic {topic}")
+        return jobs
+
+    async def send_message(self, value, topic: str):
+        """Send any JSON value, e.g. a message that is not a valid job."""
+        if not self.producer:
+            raise ProducerNotStartedError
+
+        await self.producer.send_and_wait(
+            topic=topic, value=json.dumps(value).encode("utf-8")
+        )
+
+
+producer = KafkaProducer(bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS)
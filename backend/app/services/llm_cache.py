@@ -0,0 +1,241 @@
+"""Cache of LLM completions shared by the tasks that enable it."""
+
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from typing import Any
+
+from app.core.logging import get_logger
+from app.core.settings import settings
+
+logger = get_logger()
+
+# Set for the duration of a task started with enable_llm_cache. Agent runtimes
+# started inside the task inherit it.
+_cache_enabled: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "llm_cache_enabled", default=False
+)
+
+
+@contextlib.contextmanager
+def use_llm_cache(enabled: bool = True) -> Iterator[None]:
+    """Let completions made inside the block be served from the response cache."""
+    token = _cache_enabled.set(enabled)
+    try:
+        yield
+    finally:
+        _cache_enabled.reset(token)
+
+
+def llm_cache_enabled() -> bool:
+    """Whether completions of the current task may come from the cache."""
+    return _cache_enabled.get()
+
+
+def _normalize(value: Any) -> Any:
+    """JSON-able form of messages and tools.
+
+    Text is trimmed and its line endings unified, inner whitespace (code
+    indentation, tables) is kept since the model sees it.
+    """
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n").replace("\r", "\n").strip()
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, list | tuple):
+        return [_normalize(item) for item in value]
+    if value is None or isinstance(value, bool | int | float):
+        return value
+    return _normalize_object(value)
+
+
+def _normalize_object(value: Any) -> Any:
+    """JSON-able form of images, tools and pydantic models, ``repr`` of the rest."""
+    if hasattr(value, "to_base64"):
+        # Images are keyed by a digest of their content
+        return {"image": hashlib.sha256(value.to_base64().encode()).hexdigest()}
+    if hasattr(value, "schema") and not callable(value.schema):
+        # Tool objects are keyed by their schema
+        return _normalize(value.schema)
+    if hasattr(value, "model_dump"):
+        return {"type": type(value).__name__, **_normalize(dict(value))}
+    return repr(value)
+
+
+def cache_key(model_id: str, messages: Any, tools: Any = (), **options: Any) -> str:
+    """Digest of a completion request.
+
+    Covers the model, messages, tool schemas and options (temperature, ...).
+    """
+    payload = json.dumps(
+        {
+            "model": model_id,
+            "messages": _normalize(messages),
+            "tools": _normalize(tools),
+            "options": _normalize(options),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMResponseCache:
+    """Serialized completions by request digest, in two tiers.
+
+    Lookups go to an in-memory LRU first, then to a SQLite file shared by the
+    processes of a host. Disk hits are promoted to memory. Entries expire
+    ``ttl_seconds`` after they were stored. Each tier is capped in entries and
+    evicts the least recently used entries first. SQLite calls run in a worker
+    thread so they never block the event loop.
+    """
+
+    def __init__(
+        self,
+        memory_size: int = settings.LLM_CACHE_MEMORY_SIZE,
+        path: str | None = settings.LLM_CACHE_PATH,
+        disk_size: int = settings.LLM_CACHE_DISK_SIZE,
+        ttl_seconds: int = settings.LLM_CACHE_TTL_SECONDS,
+    ):
+        """Size the tiers, an empty ``path`` disables the disk tier."""
+        self.memory_size = memory_size
+        self.path = path
+        self.disk_size = disk_size
+        self.ttl_seconds = ttl_seconds
+        self._memory: OrderedDict[str, tuple[str, float]] = (
+            OrderedDict()
+        )  # key -> (value, stored at)
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    async def get(self, key: str) -> str | None:
+        """Return the cached value of ``key``, None on a miss or once it expired."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if time.time() - stored_at < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self._hits_memory += 1
+                return value
+            del self._memory[key]
+        entry = await self._disk(self._disk_get, key) if self.path else None
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits_disk += 1
+        self._remember(key, *entry)
+        return entry[0]
+
+    async def set(self, key: str, value: str):
+        """Store ``value`` under ``key`` in both tiers."""
+        stored_at = time.time()
+        self._stores += 1
+        self._remember(key, value, stored_at)
+        if self.path:
+            await self._disk(self._disk_set, key, value, stored_at)
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters since startup."""
+        lookups = self._hits_memory + self._hits_disk + self._misses
+        return {
+            "hits_memory": self._hits_memory,
+            "hits_disk": self._hits_disk,
+            "misses": self._misses,
+            "hit_rate": round((self._hits_memory + self._hits_disk) / lookups, 3)
+            if lookups
+            else 0.0,
+            "stores": self._stores,
+            "evictions": self._evictions,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self):
+        """Close the SQLite connection, it is reopened on the next disk lookup."""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, value: str, stored_at: float):
+        self._memory[key] = (value, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    async def _disk(self, fn, *args):
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except sqlite3.Error:
+            # The disk tier is an optimization, a broken file only costs cache misses
+            logger.exception("LLM response cache disk tier failed")
+            return None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_responses_used_at "
+                "ON llm_responses(used_at)"
+            )
+        return self._db
+
+    def _disk_get(self, key: str) -> tuple[str, float] | None:
+        now = time.time()
+        with self._db_lock:
+            db = self._connection()
+            row = db.execute(
+                "SELECT value, stored_at FROM llm_responses "
+                "WHERE key = ? AND stored_at > ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is not None:
+                db.execute(
+                    "UPDATE llm_responses SET used_at = ? WHERE key = ?", (now, key)
+                )
+                db.commit()
+            return row
+
+    def _disk_set(self, key: str, value: str, stored_at: float):
+        with self._db_lock:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_responses "
+                "(key, value, stored_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, value, stored_at, stored_at),
+            )
+            expired = db.execute(
+                "DELETE FROM llm_responses WHERE stored_at <= ?",
+                (stored_at - self.ttl_seconds,),
+            ).rowcount
+            # Keep the disk_size most recently used entries
+            overflow = db.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses "
+                "ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_size,),
+            ).rowcount
+            db.commit()
+            self._evictions += expired + overflow
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,457 @@
+"""Chat completion clients of the registered models, with their wrappers."""
+
+import threading
+import time
+from collections.abc import AsyncGenerator, Mapping, Sequence
+from typing import Any, ClassVar
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from fastapi import HTTPException
+
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.models.llm import LLMFamily, LLMModel, get_deployment_id, get_model
+from app.services.llm_cache import cache_key, llm_cache_enabled, llm_response_cache
+from app.services.model_router import model_router
+from app.services.rate_limiter import rate_limiter
+
+logger = get_logger()
+
+
+class WrappedChatCompletionClient(ChatCompletionClient):
+    """Delegates everything to ``client``.
+
+    Subclasses wrap ``create`` and ``create_stream``.
+    """
+
+    def __init__(self, model_id: str, client: ChatCompletionClient):
+        """Wrap ``client``, the client of ``model_id``."""
+        self.model_id = model_id
+        self.client = client
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: bool | None = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: CancellationToken | None = None,
+    ) -> CreateResult:
+        """Delegate to the wrapped client."""
+        return await self.client.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: bool | None = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: CancellationToken | None = None,
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        """Delegate to the wrapped client."""
+        return self.client.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    async def close(self):
+        """Close the wrapped client."""
+        await self.client.close()
+
+    def actual_usage(self) -> RequestUsage:
+        """Delegate to the wrapped client."""
+        return self.client.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        """Delegate to the wrapped client."""
+        return self.client.total_usage()
+
+    def count_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        """Delegate to the wrapped client."""
+        return self.client.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        """Delegate to the wrapped client."""
+        return self.client.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:
+        """Capabilities of the wrapped client."""
+        return self.client.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        """Model info of the wrapped client."""
+        return self.client.model_info
+
+    def __getattr__(self, name: str) -> Any:
+        """Fall back to the wrapped client for anything not overridden."""
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+
+class RateLimitedChatCompletionClient(WrappedChatCompletionClient):
+    """Sends every completion of a client through the model's rate limiter.
+
+    A call first reserves one request and its prompt tokens (``count_tokens``), and
+    waits while the model's buckets are empty. The completion tokens reported in
+    ``CreateResult.usage`` are charged afterwards.
+    """
+
+    async def create(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> CreateResult:
+        """Complete once the model's buckets allow it, then charge the output."""
+        await self._acquire(messages, kwargs.get("tools", []))
+        result = await self.client.create(messages, **kwargs)
+        await rate_limiter.charge(self.model_id, result.usage.completion_tokens)
+        return result
+
+    async def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        """Stream once the model's buckets allow it, then charge the output."""
+        await self._acquire(messages, kwargs.get("tools", []))
+        async for chunk in self.client.create_stream(messages, **kwargs):
+            if isinstance(chunk, CreateResult):
+                await rate_limiter.charge(self.model_id, chunk.usage.completion_tokens)
+            yield chunk
+
+    async def _acquire(
+        self, messages: Sequence[LLMMessage], tools: Sequence[Tool | ToolSchema]
+    ):
+        try:
+            tokens = self.client.count_tokens(messages, tools=tools)
+        except Exception:
+            # Models unknown to the tokenizer are limited on requests only
+            tokens = 0
+        delay = await rate_limiter.acquire(self.model_id, tokens)
+        if delay > 0:
+            logger.info(f"Rate limit for {self.model_id}: call delayed by {delay:.2f}s")
+
+
+class CachingChatCompletionClient(WrappedChatCompletionClient):
+    """Serves repeated completions from ``llm_response_cache`` in tasks that opted in.
+
+    Requests are keyed by model id, normalized messages, tool schemas, JSON mode and
+    create args (temperature, ...). Outside ``use_llm_cache`` blocks calls go
+    straight to the wrapped client. Hits come back with ``cached=True`` and never
+    reach the rate limiter.
+    """
+
+    async def create(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> CreateResult:
+        """Return the cached completion, or the wrapped client's on a miss."""
+        if not llm_cache_enabled():
+            return await self.client.create(messages, **kwargs)
+        key = self._key(messages, kwargs)
+        cached = await llm_response_cache.get(key)
+        if cached is not None:
+            return self._restore(cached)
+        result = await self.client.create(messages, **kwargs)
+        await self._store(key, result)
+        return result
+
+    async def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        """Replay a cached completion as a stream, or stream and store it."""
+        if not llm_cache_enabled():
+            async for chunk in self.client.create_stream(messages, **kwargs):
+                yield chunk
+            return
+        key = self._key(messages, kwargs)
+        cached = await llm_response_cache.get(key)
+        if cached is not None:
+            result = self._restore(cached)
+            if isinstance(result.content, str):
+                yield result.content
+            yield result
+            return
+        async for chunk in self.client.create_stream(messages, **kwargs):
+            if isinstance(chunk, CreateResult):
+                await self._store(key, chunk)
+            yield chunk
+
+    def _key(self, messages: Sequence[LLMMessage], kwargs: dict[str, Any]) -> str:
+        return cache_key(
+            self.model_id,
+            messages,
+            kwargs.get("tools", []),
+            json_output=kwargs.get("json_output"),
+            **dict(kwargs.get("extra_create_args") or {}),
+        )
+
+    @staticmethod
+    def _restore(cached: str) -> CreateResult:
+        result = CreateResult.model_validate_json(cached)
+        result.cached = True
+        return result
+
+    @staticmethod
+    async def _store(key: str, result: CreateResult):
+        if result.finish_reason == "content_filter":
+            return
+        await llm_response_cache.set(key, result.model_dump_json())
+
+
+class RoutedChatCompletionClient(WrappedChatCompletionClient):
+    """Sends each completion to the best deployment ``model_router`` ranks.
+
+    A call answered with 429/5xx, or one that cannot reach the deployment, is retried
+    on the next candidate. Because of this, a task fails over mid-run and does not
+    wait out a bad deployment. Streams fail over only until their first chunk.
+    Everything except completions is served by the requested model's deployment.
+    """
+
+    def __init__(self, model_id: str, registry: "LLMClientRegistry"):
+        """Route completions of ``model_id`` to the deployments of ``registry``."""
+        super().__init__(model_id, registry.deployment(model_id))
+        self.registry = registry
+
+    async def create(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> CreateResult:
+        """Complete on the best candidate, failing over to the next ones."""
+        candidates = model_router.candidates(self.model_id)
+        error: Exception | None = None
+        for index, candidate in enumerate(candidates):
+            client = self._deployment(candidate)
+            if client is None:
+                continue
+            start = time.monotonic()
+            try:
+                result = await client.create(messages, **kwargs)
+            except Exception as e:
+                if not model_router.fail_over(e, candidates, index):
+                    raise
+                error = e
+                continue
+            model_router.record_success(candidate, time.monotonic() - start)
+            return result
+        # The deployments left after a failover could not be created
+        raise error
+
+    async def create_stream(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> AsyncGenerator[str | CreateResult, None]:
+        """Stream from the best candidate, failing over until the first chunk."""
+        candidates = model_router.candidates(self.model_id)
+        error: Exception | None = None
+        for index, candidate in enumerate(candidates):
+            client = self._deployment(candidate)
+            if client is None:
+                continue
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in client.create_stream(messages, **kwargs):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not model_router.fail_over(e, candidates, index):
+                    raise
+                error = e
+                continue
+            model_router.record_success(candidate, time.monotonic() - start)
+            return
+        raise error
+
+    def _deployment(self, model_id: str) -> ChatCompletionClient | None:
+        if model_id == get_deployment_id(self.model_id):
+            return self.client
+        try:
+            return self.registry.deployment(model_id)
+        except Exception:
+            # E.g. a provider without credentials here; skipped until its cooldown ends
+            logger.exception(f"Could not create a client for fallback model {model_id}")
+            model_router.record_failure(model_id)
+            return None
+
+
+class LLMClientRegistry:
+    """One chat completion client per ``LLMModel.id``, shared by every task.
+
+    Clients are built from explicit settings, never from ``os.environ``, so concurrent
+    tasks on different providers cannot race on process-global variables. Each model
+    names its endpoint, deployment and API version in ``llm_metadata``. Each
+    deployment client keeps its own HTTP connection pool, reused across tasks and safe
+    for concurrent requests. Creation is guarded by a lock because sync executor
+    threads may ask for clients too.
+
+    ``get`` returns the response cache in front of the router, which picks one of the
+    rate-limited deployment clients (``deployment``) of equivalent models.
+    """
+
+    # Provider of ids that are not in the registry (e.g. the "openai-gpt-4o-mini"
+    # default), by a keyword of the id
+    PROVIDER_KEYWORDS = (("azure", "azure"), ("openai", "openai"), ("llama3", "ollama"))
+    # ``LLMModel.llm_metadata`` keys a client of each provider is built from
+    REQUIRED_METADATA: ClassVar[dict[str, tuple[str, ...]]] = {
+        "azure": ("model", "endpoint", "deployment", "api_version"),
+        "openai": ("model",),
+        "ollama": ("model",),
+    }
+
+    def __init__(self):
+        """Clients are created on first use."""
+        self._clients: dict[str, ChatCompletionClient] = {}
+        self._deployments: dict[str, ChatCompletionClient] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_id: str) -> ChatCompletionClient:
+        """Client for tasks of ``model_id``: cached, routed and rate limited."""
+        client = self._clients.get(model_id)
+        if client is None:
+            client = CachingChatCompletionClient(
+                model_id, RoutedChatCompletionClient(model_id, self)
+            )
+            client = self._clients.setdefault(model_id, client)
+        return client
+
+    def deployment(self, model_id: str) -> ChatCompletionClient:
+        """Rate-limited client of the deployment of ``model_id``, used by the router.
+
+        Ids on the same endpoint and deployment share one client and rate buckets.
+        """
+        model_id = get_deployment_id(model_id)
+        client = self._deployments.get(model_id)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._deployments.get(model_id)
+            if client is None:
+                client = self._deployments[model_id] = RateLimitedChatCompletionClient(
+                    model_id, self._create(model_id)
+                )
+                logger.info(f"Chat completion client created for {model_id}")
+        return client
+
+    async def close(self):
+        """Close every deployment client, later calls create new ones."""
+        with self._lock:
+            clients = list(self._deployments.values())
+            self._deployments, self._clients = {}, {}
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Error closing chat completion client: {e!s}")
+
+    def _create(self, model_id: str) -> ChatCompletionClient:
+        model = get_model(model_id)
+        provider = self._provider(model_id, model)
+        if provider is None:
+            raise HTTPException(status_code=400, detail="Invalid LLM model.")
+        config = self._config(model_id, model, provider)
+        if provider == "azure":
+            return self._create_azure(config)
+        if provider == "openai":
+            from autogen_ext.models.openai import OpenAIChatCompletionClient
+
+            return OpenAIChatCompletionClient(
+                model=config["model"],
+                api_key=settings.OPENAI_API_KEY,
+                base_url=config.get("endpoint"),
+            )
+        from autogen_magentic_one.utils import create_completion_client_from_env
+
+        # Explicit env mapping, the process environment is left untouched
+        return create_completion_client_from_env(
+            env={"CHAT_COMPLETION_PROVIDER": "ollama"}, model=config["model"]
+        )
+
+    @classmethod
+    def _config(
+        cls, model_id: str, model: LLMModel | None, provider: str
+    ) -> dict[str, Any]:
+        if model is not None:
+            config = dict(model.llm_metadata or {})
+        elif provider == "openai":
+            # Unregistered ids name an OpenAI model, e.g. "openai-gpt-4o-mini"
+            config = {"model": model_id.removeprefix("openai-")}
+        else:
+            config = {}
+        missing = [
+            key for key in cls.REQUIRED_METADATA[provider] if not config.get(key)
+        ]
+        if missing:
+            error = (
+                f"LLM model {model_id} ({provider}) has no {', '.join(missing)} in "
+                "its llm_metadata; configure them in LLM_MODELS_FILE"
+            )
+            raise ValueError(error)
+        return config
+
+    @staticmethod
+    def _provider(model_id: str, model: LLMModel | None) -> str | None:
+        if model is not None:
+            if model.family == LLMFamily.LLAMA:
+                return "ollama"
+            if (model.hosted_cloud or "").lower() == "azure":
+                return "azure"
+            return "openai"
+        model_id = model_id.lower()
+        return next(
+            (
+                provider
+                for keyword, provider in LLMClientRegistry.PROVIDER_KEYWORDS
+                if keyword in model_id
+            ),
+            None,
+        )
+
+    @staticmethod
+    def _create_azure(config: Mapping[str, Any]) -> ChatCompletionClient:
+        from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+
+        credentials: dict[str, Any] = {}
+        if settings.AZURE_OPENAI_API_KEY:
+            credentials["api_key"] = settings.AZURE_OPENAI_API_KEY
+        else:
+            from azure.identity import ClientSecretCredential, get_bearer_token_provider
+
+            credentials["azure_ad_token_provider"] = get_bearer_token_provider(
+                ClientSecretCredential(
+                    tenant_id=settings.AZURE_TENANT_ID,
+                    client_id=settings.AZURE_CLIENT_ID,
+                    client_secret=settings.AZURE_CLIENT_SECRET,
+                ),
+                "https://cognitiveservices.azure.com/.default",
+            )
+        return AzureOpenAIChatCompletionClient(
+            model=config["model"],
+            azure_endpoint=config["endpoint"],
+            azure_deployment=config["deployment"],
+            api_version=config["api_version"],
+            **credentials,
+        )
+
+
+llm_client_registry = LLMClientRegistry()
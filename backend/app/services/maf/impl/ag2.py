@@ -1,13 +1,25 @@
+"""AG2 framework: the blocking agent chat runs in the SyncTaskExecutor."""
+
+import functools
+import json
 import os
+from typing import Any
 
 from autogen import AssistantAgent, ChatResult, LLMConfig, UserProxyAgent
 from autogen.agents.experimental import DeepResearchAgent
 from dotenv import load_dotenv
 
-from app.core.enums import TaskStatus
+from app.core.enums import MultiAgentFrameworks, TaskEventType, TaskStatus
 from app.core.logging import get_logger
-from app.schemas.task import AgenticTaskRequest, TaskResponse
+from app.repository.task_repository import TaskRepository
+from app.schemas.task import AgenticTaskRequest, TaskOutput, TaskRequest, TaskResponse
+from app.services.event_hub import event_hub
 from app.services.maf.maf import MultiAgentFramework
+from app.services.maf.sync_executor import (
+    ProgressReporter,
+    SyncTaskError,
+    sync_task_executor,
+)
 
 load_dotenv()
 
@@ -19,85 +31,163 @@ OAI_CONFIG_LIST = [
   }
 ]
 
+# Message contents sent back as progress are cut to this many characters
+MAX_PROGRESS_CONTENT = 2000
+
+
 class AG2(MultiAgentFramework):
     def __init__(self):
         self.name = "AG2"
         self.logger = get_logger()
-        # self.llm_config = LLMConfig.from_json(path="OAI_CONFIG_LIST")
-        self.llm_config = LLMConfig(config_list=OAI_CONFIG_LIST)
+        self.task_repository = TaskRepository()
 
     async def start_task(self, agentic_task_request: AgenticTaskRequest) -> TaskResponse:
         self.logger.info(
             f"Starting AG2 multi-agent system | task: {agentic_task_request.task_id} with query: {agentic_task_request.query[:100]}"
         )
-        response = await self._execute(agentic_task_request.task_id, agentic_task_request.query)
+        try:
+            response = await self._execute(
+                agentic_task_request.task_id, agentic_task_request.query
+            )
+        except (TimeoutError, SyncTaskError):
+            self.logger.exception(f"AG2 task {agentic_task_request.task_id} failed")
+            response = None
         if response:
             status = TaskStatus.SUCCESS.value
         else:
             status = TaskStatus.FAILED.value
-        return response, status
+        return TaskResponse(
+            task_id=agentic_task_request.task_id,
+            status=status,
+            task_request=TaskRequest(
+                task_id=agentic_task_request.task_id,
+                query=agentic_task_request.query,
+                multi_agent_framework=MultiAgentFrameworks.AG2.value,
+                llm_model=agentic_task_request.llm_model,
+                enable_internet=agentic_task_request.enable_internet,
+            ),
+            task_output=TaskOutput(final_response=response),
+        )
 
     async def _execute(self, task_id: str, user_query: str) -> str:
-        return await self._func3(task_id, user_query)
-
-    async def _func1(self, task_id: str, user_query: str):
-        with self.llm_config:
-                assistant = AssistantAgent("assistant")
-        user_proxy = UserProxyAgent("user_proxy", code_execution_config={"work_dir": "coding", "use_docker": False})
-        chat_result: ChatResult = user_proxy.initiate_chat(assistant, message="Plot a chart of NVDA and TESLA stock price change YTD.")
-        # This initiates an automated chat between the two agents to solve the task
-        self.logger.info(f"TaskID: {task_id}, Chat result: {chat_result}")
-        return chat_result.summary
-
-    async def _func2(self, task_id: str, user_query: str):
-        from autogen import ConversableAgent
-
-        with self.llm_config:
-            # Create an AI agent
-            assistant = ConversableAgent(
-                name="assistant",
-                system_message="You are an assistant that responds concisely.",
-                human_input_mode="NEVER"
-            )
-
-            # Create another AI agent
-            fact_checker = ConversableAgent(
-                name="fact_checker",
-                system_message="You are a fact-checking assistant.",
-                human_input_mode="NEVER"
-            )
+        # The agent loops are blocking, they run in the sync executor's workers
+        return await sync_task_executor.run(
+            task_id,
+            _func3,
+            task_id,
+            user_query,
+            OAI_CONFIG_LIST,
+            on_progress=functools.partial(self._on_progress, task_id),
+        )
 
-        # Start the conversation
-        chat_result: ChatResult = assistant.initiate_chat(
-            recipient=fact_checker,
-            message=user_query,
-            max_turns=2
+    async def _on_progress(self, task_id: str, progress: dict[str, Any]):
+        await self.task_repository.patch_metadata(
+            task_id, ["ag2_progress", "last_message"], progress
         )
-        self.logger.info(f"TaskID: {task_id}, Chat result: {chat_result}")
-        return chat_result.summary
-
-    async def _func3(self, task_id: str, user_query: str):
-        # from autogen import LLMConfig
-
-        # llm_config = LLMConfig(
-        #     config_list=[{"api_type": "openai", "model": "gpt-4o", "api_key": os.environ["OPENAI_API_KEY"]}],
-        # )
-        import json
-        agent = DeepResearchAgent(
-            name="DeepResearchAgent",
-            llm_config=json.loads(self.llm_config.model_dump_json()),
-            # is_termination_msg=f"When you think you have either found answer for query or are in a loop/not making progress: {user_query}, end it!"
+        await event_hub.publish(task_id, TaskEventType.STEP.value, progress)
+
+
+def _report_messages(report: ProgressReporter, *agents):
+    """Send every message the agents exchange back to the event loop as progress."""
+
+    def hook(sender, message, recipient, silent):
+        content = message.get("content") if isinstance(message, dict) else message
+        report({
+            "sender": sender.name,
+            "recipient": recipient.name,
+            "content": str(content)[:MAX_PROGRESS_CONTENT] if content else None,
+        })
+        return message
+
+    for agent in agents:
+        agent.register_hook("process_message_before_send", hook)
+
+
+def _func1(
+    task_id: str, user_query: str, config_list: list[dict], report: ProgressReporter
+):
+    logger = get_logger()
+    with LLMConfig(config_list=config_list):
+            assistant = AssistantAgent("assistant")
+    user_proxy = UserProxyAgent(
+        "user_proxy", code_execution_config={"work_dir": "coding", "use_docker": False}
+    )
+    _report_messages(report, assistant, user_proxy)
+    chat_result: ChatResult = user_proxy.initiate_chat(
+        assistant, message="Plot a chart of NVDA and TESLA stock price change YTD."
+    )
+    # This initiates an automated chat between the two agents to solve the task
+    logger.info(f"TaskID: {task_id}, Chat result: {chat_result}")
+    return chat_result.summary
+
+
+def _func2(
+    task_id: str, user_query: str, config_list: list[dict], report: ProgressReporter
+):
+    from autogen import ConversableAgent
+
+    logger = get_logger()
+    with LLMConfig(config_list=config_list):
+        # Create an AI agent
+        assistant = ConversableAgent(
+            name="assistant",
+            system_message="You are an assistant that responds concisely.",
+            human_input_mode="NEVER"
         )
 
-        # message = "What was the impact of DeepSeek on stock prices and why?"
-
-        result = agent.run(
-            message=user_query,
-            tools=agent.tools,
-            max_turns=2,
-            user_input=False,
-            summary_method="reflection_with_llm",
+        # Create another AI agent
+        fact_checker = ConversableAgent(
+            name="fact_checker",
+            system_message="You are a fact-checking assistant.",
+            human_input_mode="NEVER"
         )
-
-        self.logger.info(f"TaskID: {task_id}, Chat result: {result}")
-        return result.summary
\ No newline at end of file
+    _report_messages(report, assistant, fact_checker)
+
+    # Start the conversation
+    chat_result: ChatResult = assistant.initiate_chat(
+        recipient=fact_checker,
+        message=user_query,
+        max_turns=2
+    )
+    logger.info(f"TaskID: {task_id}, Chat result: {chat_result}")
+    return chat_result.summary
+
+
+def _func3(
+    task_id: str, user_query: str, config_list: list[dict], report: ProgressReporter
+):
+    # from autogen import LLMConfig
+
+    # llm_config = LLMConfig(
+    #     config_list=[
+    #         {
+    #             "api_type": "openai",
+    #             "model": "gpt-4o",
+    #             "api_key": os.environ["OPENAI_API_KEY"],
+    #         }
+    #     ],
+    # )
+    logger = get_logger()
+    llm_config = LLMConfig(config_list=config_list)
+    agent = DeepResearchAgent(
+        name="DeepResearchAgent",
+        llm_config=json.loads(llm_config.model_dump_json()),
+        # is_termination_msg=(
+        #     "When you think you have either found answer for query or are in a "
+        #     f"loop/not making progress: {user_query}, end it!"
+        # ),
+    )
+    _report_messages(report, agent)
+
+    # message = "What was the impact of DeepSeek on stock prices and why?"
+
+    result = agent.run(
+        message=user_query,
+        tools=agent.tools,
+        max_turns=2,
+        user_input=False,
+        summary_method="reflection_with_llm",
+    )
+
+    logger.info(f"TaskID: {task_id}, Chat result: {result}")
+    return result.summary
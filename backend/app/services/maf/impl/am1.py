@@ -1,12 +1,20 @@
+"""AM1 framework: the task runs as a BrowserUse cloud task, polled until done."""
+
+import asyncio
+import contextlib
+import functools
+import inspect
 import json
-import os
 import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
 from typing import Any
 
-import requests
+import httpx
 
-from app.core.enums import TaskStatus
+from app.core.enums import TaskEventType, TaskStatus
 from app.core.logging import get_logger
+from app.core.settings import settings
 from app.repository.task_repository import TaskRepository
 from app.schemas.task import (
     AgenticTaskRequest,
@@ -15,6 +23,7 @@ from app.schemas.task import (
     TaskRequest,
     TaskResponse,
 )
+from app.services.event_hub import event_hub
 from app.services.maf.maf import MultiAgentFramework
 
 
@@ -35,25 +44,32 @@ class AM1(MultiAgentFramework):
     async def _setup_architecture(self, task_id, query):
         pass
 
+    async def _on_browser_step(
+        self, task_id: str, browser_task_id: str, step: dict[str, Any]
+    ):
+        self.logger.info(f"BrowserUse step for {browser_task_id}: {json.dumps(step)}")
+        await self.task_repository.patch_metadata(
+            task_id, ["browser_use_progress", "last_step"], step
+        )
+        await event_hub.publish(
+            task_id,
+            TaskEventType.STEP.value,
+            {"browser_task_id": browser_task_id, "step": step},
+        )
+
     async def _execute(self, task_id, query) -> TaskResponse:
         self.logger.info(f"Executing task: {task_id} in AM1 for {query[:100]}")
-        response = ""
         browser_use = BrowserUse()
-        browser_task_id = browser_use.create_task(instructions=query)
+        browser_task_id = await browser_use.create_task(instructions=query)
         self.logger.info(f"BrowserUse response: {browser_task_id}")
-        task = await self.task_repository.get(task_id)
-        await self.task_repository.update(task_id, {
-            "task_metadata": task.task_metadata.update({"browser_task_id": browser_task_id})
-        })
-        browser_use_task_response: dict = browser_use.get_task_details(browser_task_id)
-        # yield str(task_response)
-        self.logger.info(f"Task response: {browser_use_task_response}")
-        if not task.task_metadata:
-            task.task_metadata = {}
-        updated_task = await self.task_repository.update(task_id, {
-            "task_metadata": task.task_metadata.update({"web_surfer_url": browser_use_task_response.get("live_url")})
-        })
-        browser_use_task_response = browser_use.wait_for_completion(browser_task_id)
+        updated_task = await self.task_repository.patch_metadata(
+            task_id, "browser_use_task_id", browser_task_id
+        )
+        # Resolved in the background: cached, persisted and published as LIVE_URL
+        browser_use_live_urls.refresh(task_id, browser_task_id)
+        browser_use_task_response = await browser_use.wait_for_completion(
+            browser_task_id, on_step=functools.partial(self._on_browser_step, task_id)
+        )
         # yield str(task_response)
         status = TaskStatus.SUCCESS.value if browser_use_task_response.get("status") == "finished" \
             else TaskStatus.FAILED.value if browser_use_task_response.get("status") == "failed" \
@@ -68,25 +84,32 @@ class AM1(MultiAgentFramework):
                 llm_model=updated_task.llm_model,
                 enable_internet=updated_task.enable_internet
             ),
-            input_file_names=task.input_file_names,
+            input_file_names=updated_task.input_file_names,
             task_output=TaskOutput(
                 final_response=browser_use_task_response.get("output"),
                 output_file_urls=browser_use_task_response.get("output_files")
             ),
             live_stream_response=LiveStreamResponse(
-                web_surfer_url=task.task_metadata.update({"web_surfer_url": browser_use_task_response.get("live_url")}),
+                web_surfer_url=browser_use_live_urls.get(task_id)
+                or browser_use_task_response.get("live_url"),
             ),
-            task_metadata=updated_task.task_metadata,
-            created_at=task.created_at,
-            updated_at=task.updated_at
+            # Metadata was patched in place, the snapshot would undo later patches
+            task_metadata=None,
+            created_at=updated_task.created_at,
+            updated_at=updated_task.updated_at
         )
         self.logger.info(f"Task response: {task_response}")
         return task_response
 
 class BrowserUse:
-    API_KEY = os.getenv("BROWSER_API_KEY")
-    BASE_URL = 'https://api.browser-use.com/api/v1'
+    API_KEY = settings.BROWSER_API_KEY
+    BASE_URL = settings.BROWSER_USE_BASE_URL
     HEADERS = {'Authorization': f'Bearer {API_KEY}'}
+    TERMINAL_STATUSES = ('finished', 'failed', 'stopped')
+
+    # One keep-alive connection pool shared by every BrowserUse instance
+    _client: httpx.AsyncClient | None = None
+
     def __init__(self):
         pass
 
@@ -97,37 +120,338 @@ class BrowserUse:
     # def _get_controller(self, llm_config):
     #     pass
 
-    def create_task(self, instructions: str):
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        """Shared client, (re)created on first use and after ``aclose``."""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                base_url=cls.BASE_URL,
+                headers=cls.HEADERS,
+                timeout=settings.BROWSER_USE_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.BROWSER_USE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.BROWSER_USE_MAX_CONNECTIONS,
+                ),
+            )
+        return cls._client
+
+    @classmethod
+    async def aclose(cls):
+        """Close the shared client and its connections."""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
+    async def create_task(self, instructions: str):
         """Create a new browser automation task"""
-        response = requests.post(f'{self.BASE_URL}/run-task', headers=self.HEADERS, json={'task': instructions})
+        response = await self.client().post('/run-task', json={'task': instructions})
+        response.raise_for_status()
         return response.json()['id']
 
-    def get_task_status(self, task_id: str):
+    async def get_task_status(self, task_id: str):
         """Get current task status"""
-        response = requests.get(f'{self.BASE_URL}/task/{task_id}/status', headers=self.HEADERS)
+        response = await self.client().get(f'/task/{task_id}/status')
+        response.raise_for_status()
         return response.json()
 
-    def get_task_details(self, task_id: str) -> dict[str, Any]:
+    async def get_task_details(self, task_id: str) -> dict[str, Any]:
         """Get full task details including output"""
-        response = requests.get(f'{self.BASE_URL}/task/{task_id}', headers=self.HEADERS)
+        response = await self.client().get(f'/task/{task_id}')
+        response.raise_for_status()
         return response.json()
 
-    def wait_for_completion(self, task_id: str, poll_interval: int = 2):
-        """Poll task status until completion"""
-        count = 0
-        unique_steps = []
-        while True:
-            details = self.get_task_details(task_id)
-            new_steps = details['steps']
-            # use only the new steps that are not in unique_steps.
-            if new_steps != unique_steps:
-                for step in new_steps:
-                    if step not in unique_steps:
-                        print(json.dumps(step, indent=4))
-                unique_steps = new_steps
-            count += 1
-            status = details['status']
-
-            if status in ['finished', 'failed', 'stopped']:
-                return details
-            time.sleep(poll_interval)
\ No newline at end of file
+    async def wait_for_completion(
+        self, task_id: str, on_step: "StepCallback | None" = None
+    ) -> dict[str, Any]:
+        """Wait until the task reaches a terminal status and return its details.
+
+        ``on_step(task_id, step)`` is called once for every new step as it shows up.
+        """
+        return await browser_use_poller.wait(task_id, on_step=on_step)
+
+
+StepCallback = Callable[[str, dict[str, Any]], Awaitable[None] | None]
+
+
+class _PolledTask:
+    def __init__(self, task_id: str, interval: float, max_wait: float):
+        self.task_id = task_id
+        loop = asyncio.get_running_loop()
+        self.future: asyncio.Future = loop.create_future()
+        self.interval = interval
+        self.next_poll_at = 0.0
+        self.deadline = loop.time() + max_wait
+        self.consecutive_errors = 0
+        self.details_fetched_at = float("-inf")
+        self.last_status = None
+        self.steps_seen = 0  # cursor into the task's append-only steps list
+        self.step_callbacks: list[StepCallback] = []
+
+
+class BrowserUsePoller:
+    """Single polling loop serving every in-flight BrowserUse task of the process.
+
+    Callers await a future that is resolved when their task reaches a terminal status,
+    so 100+ concurrent AM1 tasks share one loop and the client's connection pool
+    instead of each running its own sleep loop. A task that shows no progress is
+    polled less and less often (up to BROWSER_USE_POLL_MAX_SECONDS). Any new status
+    or step resets its interval to BROWSER_USE_POLL_MIN_SECONDS.
+
+    Polls hit the small status endpoint. The full payload with steps is only fetched
+    every BROWSER_USE_STEPS_REFRESH_SECONDS and on completion. Steps are append-only,
+    so a per-task cursor finds the new ones in O(new steps). Each new step is handed
+    to the ``on_step`` callbacks of the waiters.
+
+    A waiter gets an error instead of waiting forever: on a 4xx answer (other than
+    429), after BROWSER_USE_MAX_POLL_ERRORS failed polls in a row, or with a
+    TimeoutError once the task ran for BROWSER_USE_MAX_WAIT_SECONDS.
+    """
+
+    BACKOFF_FACTOR = 1.5  # interval growth per poll without progress
+
+    def __init__(
+        self,
+        min_interval: float = settings.BROWSER_USE_POLL_MIN_SECONDS,
+        max_interval: float = settings.BROWSER_USE_POLL_MAX_SECONDS,
+        steps_refresh_interval: float = settings.BROWSER_USE_STEPS_REFRESH_SECONDS,
+        max_wait: float = settings.BROWSER_USE_MAX_WAIT_SECONDS,
+        max_consecutive_errors: int = settings.BROWSER_USE_MAX_POLL_ERRORS,
+    ):
+        """Defaults come from the BROWSER_USE_* settings."""
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.steps_refresh_interval = steps_refresh_interval
+        self.max_wait = max_wait
+        self.max_consecutive_errors = max_consecutive_errors
+        self.browser_use = BrowserUse()
+        self.logger = get_logger()
+        self._tasks: dict[str, _PolledTask] = {}
+        self._callbacks_running: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._loop_task: asyncio.Task | None = None
+
+    async def wait(
+        self, task_id: str, on_step: StepCallback | None = None
+    ) -> dict[str, Any]:
+        """Wait until the task is terminal and return its details.
+
+        ``on_step`` is called with every step the task takes from now on.
+        """
+        polled = self._tasks.get(task_id)
+        if polled is None:
+            polled = _PolledTask(task_id, self.min_interval, self.max_wait)
+            self._tasks[task_id] = polled
+            self._wakeup.set()
+        if on_step is not None:
+            polled.step_callbacks.append(on_step)
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+        return await asyncio.shield(polled.future)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._tasks:
+            now = loop.time()
+            due = [
+                polled for polled in self._tasks.values() if polled.next_poll_at <= now
+            ]
+            if due:
+                await asyncio.gather(*(self._poll(polled) for polled in due))
+            if not self._tasks:
+                break
+            delay = max(
+                0.0, min(p.next_poll_at for p in self._tasks.values()) - loop.time()
+            )
+            self._wakeup.clear()
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+
+    async def _poll(self, polled: _PolledTask):
+        loop = asyncio.get_running_loop()
+        if loop.time() >= polled.deadline:
+            error = TimeoutError(
+                f"BrowserUse task {polled.task_id} did not finish within "
+                f"{self.max_wait}s"
+            )
+            self._finish(polled, error=error)
+            return
+        details = None
+        try:
+            if loop.time() - polled.details_fetched_at >= self.steps_refresh_interval:
+                details = await self._fetch_details(polled)
+                status = details['status']
+            else:
+                status = await self.browser_use.get_task_status(polled.task_id)
+                if isinstance(status, dict):
+                    status = status['status']
+                if status in BrowserUse.TERMINAL_STATUSES:
+                    # Pick up the output and the last steps
+                    details = await self._fetch_details(polled)
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            polled.consecutive_errors += 1
+            give_up = polled.consecutive_errors >= self.max_consecutive_errors
+            if give_up or self._is_client_error(e):
+                self.logger.exception(
+                    f"BrowserUse poll failed for {polled.task_id}, giving up after "
+                    f"{polled.consecutive_errors} error(s)"
+                )
+                self._finish(polled, error=e)
+                return
+            self.logger.warning(f"BrowserUse poll failed for {polled.task_id}: {e!s}")
+            self._backoff(polled)
+            self._schedule(polled, loop.time())
+            return
+        polled.consecutive_errors = 0
+
+        try:
+            progressed = status != polled.last_status
+            if details is not None:
+                progressed = self._emit_new_steps(polled, details) or progressed
+            polled.last_status = status
+        except Exception as e:
+            self._finish(polled, error=e)
+            return
+
+        if status in BrowserUse.TERMINAL_STATUSES:
+            self._finish(polled, details=details)
+            return
+
+        if progressed:
+            polled.interval = self.min_interval
+        else:
+            self._backoff(polled)
+        self._schedule(polled, loop.time())
+
+    @staticmethod
+    def _is_client_error(error: Exception) -> bool:
+        """Tell whether a poll error is a 4xx, which won't change on retry (but 429)."""
+        if not isinstance(error, httpx.HTTPStatusError):
+            return False
+        status_code = error.response.status_code
+        return (
+            httpx.codes.is_client_error(status_code)
+            and status_code != httpx.codes.TOO_MANY_REQUESTS
+        )
+
+    @staticmethod
+    def _schedule(polled: _PolledTask, now: float):
+        # Poll again at the deadline at the latest, to fail the waiters on time
+        polled.next_poll_at = min(now + polled.interval, polled.deadline)
+
+    async def _fetch_details(self, polled: _PolledTask) -> dict[str, Any]:
+        details = await self.browser_use.get_task_details(polled.task_id)
+        polled.details_fetched_at = asyncio.get_running_loop().time()
+        return details
+
+    def _emit_new_steps(self, polled: _PolledTask, details: dict[str, Any]) -> bool:
+        steps = details.get('steps') or []
+        new_steps = steps[polled.steps_seen:]
+        polled.steps_seen = len(steps)
+        for step in new_steps:
+            for callback in polled.step_callbacks:
+                try:
+                    result = callback(polled.task_id, step)
+                except Exception:
+                    self.logger.exception(
+                        f"BrowserUse step callback failed for {polled.task_id}"
+                    )
+                    continue
+                if inspect.isawaitable(result):
+                    running = asyncio.ensure_future(result)
+                    self._callbacks_running.add(running)
+                    running.add_done_callback(self._callbacks_running.discard)
+        return bool(new_steps)
+
+    def _finish(
+        self,
+        polled: _PolledTask,
+        details: dict | None = None,
+        error: Exception | None = None,
+    ):
+        self._tasks.pop(polled.task_id, None)
+        if polled.future.done():
+            return
+        if error is not None:
+            polled.future.set_exception(error)
+        else:
+            polled.future.set_result(details)
+
+    def _backoff(self, polled: _PolledTask):
+        polled.interval = min(polled.interval * self.BACKOFF_FACTOR, self.max_interval)
+
+
+browser_use_poller = BrowserUsePoller()
+
+
+class LiveUrlCache:
+    """TTL cache of BrowserUse live URLs, keyed by our task id.
+
+    Read paths (task details, task lists) only call ``get`` and never wait on
+    BrowserUse. ``refresh`` resolves a URL in the background, once per task at a time.
+    The result is cached, persisted to ``task_metadata.web_surfer_url`` and published
+    as a LIVE_URL event. AM1 triggers it when it starts a BrowserUse task.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.BROWSER_USE_LIVE_URL_TTL_SECONDS,
+        max_entries: int = settings.BROWSER_USE_LIVE_URL_CACHE_SIZE,
+    ):
+        """Defaults come from the BROWSER_USE_LIVE_URL_* settings."""
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.logger = get_logger()
+        self.task_repository = TaskRepository()
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    def get(self, task_id: str) -> str | None:
+        """Return the cached live URL of the task, None if unknown or expired."""
+        entry = self._entries.get(str(task_id))
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[str(task_id)]
+            return None
+        return url
+
+    def set(self, task_id: str, url: str):
+        """Cache a live URL, evicting the least recently set ones past the limit."""
+        self._entries[str(task_id)] = (url, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(str(task_id))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def refresh(self, task_id: str, browser_task_id: str) -> asyncio.Task:
+        """Schedule a lookup of the live URL, joining one already in flight."""
+        task_id = str(task_id)
+        refreshing = self._refreshing.get(task_id)
+        if refreshing is None:
+            refreshing = asyncio.create_task(self._refresh(task_id, browser_task_id))
+            self._refreshing[task_id] = refreshing
+            refreshing.add_done_callback(lambda _: self._refreshing.pop(task_id, None))
+        return refreshing
+
+    async def _refresh(self, task_id: str, browser_task_id: str):
+        try:
+            details = await BrowserUse().get_task_details(browser_task_id)
+            web_surfer_url = details.get("live_url")
+            if not web_surfer_url:
+                return
+            self.set(task_id, web_surfer_url)
+            await self.task_repository.patch_metadata(
+                task_id, "web_surfer_url", web_surfer_url
+            )
+            await event_hub.publish(
+                task_id,
+                TaskEventType.LIVE_URL.value,
+                {"web_surfer_url": web_surfer_url},
+            )
+        except Exception:
+            self.logger.exception(
+                f"Could not resolve BrowserUse live URL for {task_id}"
+            )
+
+
+browser_use_live_urls = LiveUrlCache()
@@ -1,15 +1,23 @@
+"""MagenticOne framework, run on pre-warmed runtimes of ``magentic_one_pool``."""
+
+import asyncio
+import contextlib
 import json
 import logging
 import os
 import re
+from collections import deque
+from collections.abc import Awaitable, Callable
 from datetime import datetime as dt
 from typing import Any
+from urllib.parse import urlsplit
 
 import pytz
 from autogen_core import (
     EVENT_LOGGER_NAME,
     AgentId,
     AgentProxy,
+    CancellationToken,
     SingleThreadedAgentRuntime,
     TopicId,
 )
@@ -18,15 +26,17 @@ from autogen_magentic_one.agents.file_surfer import FileSurfer
 from autogen_magentic_one.agents.multimodal_web_surfer import MultimodalWebSurfer
 from autogen_magentic_one.agents.orchestrator import LedgerOrchestrator
 from autogen_magentic_one.agents.user_proxy import UserProxy
-from autogen_magentic_one.messages import BroadcastMessage
-from autogen_magentic_one.utils import LogHandler, create_completion_client_from_env
-from fastapi import HTTPException
+from autogen_magentic_one.messages import BroadcastMessage, ResetMessage
+from autogen_magentic_one.utils import LogHandler
 
-from app.core.enums import TaskStatus
+from app.core.enums import MultiAgentFrameworks, TaskStatus
 from app.core.logging import get_logger
 from app.core.settings import settings
-from app.schemas.task import AgenticTaskRequest, TaskResponse
+from app.models.llm import get_default_model
+from app.schemas.task import AgenticTaskRequest, TaskOutput, TaskRequest, TaskResponse
+from app.services.llm_clients import llm_client_registry
 from app.services.maf.maf import MultiAgentFramework
+from app.utils.helpers import read_lines_backwards
 
 
 class MagenticOne(MultiAgentFramework):
@@ -82,13 +92,49 @@ class MagenticOne(MultiAgentFramework):
         event_logger.handlers = [log_handler]
         self.logger.info(f"Event logs will be written to: {log_file}")
 
+        # Take a pre-built runtime (agents registered, browser launched) from the pool
+        warm_runtime: WarmRuntime = kwargs["warm_runtime"]
+        runtime = warm_runtime.runtime
+        if warm_runtime.web_surfer is not None:
+            # Per-task folders of the shared browser
+            warm_runtime.web_surfer.downloads_folder = logs_dir
+            warm_runtime.web_surfer.debug_dir = logs_dir
+            warm_runtime.web_surfer.to_save_screenshots = save_screenshots
+
+        # Set max_time, max_rounds, etc.
+        max_time = MAX_TIME
+        max_rounds = MAX_ROUNDS
+
+        # Start the runtime
+        runtime.start()
+        self.logger.info(
+            f"Agent runtime started | pooled runtime used {warm_runtime.uses} times "
+            "before."
+        )
+
+        # Log completion and timing
+        _end_time = dt.now(self.ist_timezone)
+        setup_time = (_end_time - _start_time).total_seconds()
+        self.logger.info(f"Multi-Agent Architecture Setup time: {setup_time} s")
+
+        # Return useful context
+        return runtime, logs_dir, log_file, max_time, max_rounds, now
+    async def _build_runtime(self, key: "RuntimeKey") -> "WarmRuntime":
+        """Create a runtime with every agent registered and the browser launched.
+
+        The runtime is left stopped; tasks start it, reset messages clear it.
+        """
+        llm_model, enable_internet, with_files = key
+        _start_time = dt.now(self.ist_timezone)
+        os.makedirs(WARM_LOGS_DIR, exist_ok=True)
+
         # Create the runtime
         runtime = SingleThreadedAgentRuntime()
         self.logger.info("SingleThreadedAgentRuntime created.")
 
-        # Create the LLM client
-        client = self.__create_client(llm_model=llm_model)
-        self.logger.info("Model client created.")
+        # The LLM client is shared by every runtime and task of that model
+        client = llm_client_registry.get(llm_model)
+        self.logger.info("Model client ready.")
 
         # Register FileSurfer
         await FileSurfer.register(
@@ -103,15 +149,12 @@ class MagenticOne(MultiAgentFramework):
             "UserProxy",
             lambda: UserProxy(description="The current user interacting with you."),
         )
-        user_proxy = AgentProxy(AgentId("UserProxy", "default"), runtime)
         self.logger.info("UserProxy agent registered.")
 
         # Build the agent list
         agent_list = []
-        if input_files:
+        if with_files:
             agent_list.append(file_surfer)
-        if hil_mode:
-            agent_list.append(user_proxy)
 
         if enable_internet:
             await MultimodalWebSurfer.register(runtime, "WebSurfer", MultimodalWebSurfer)
@@ -119,19 +162,15 @@ class MagenticOne(MultiAgentFramework):
             agent_list.append(web_surfer)
             self.logger.info("MultimodalWebSurfer agent registered.")
 
-        # Set max_time, max_rounds, etc.
-        max_time = 25 * 60
-        max_rounds = 120
-
         # Register LedgerOrchestrator
-        await LedgerOrchestrator.register(
+        await PooledLedgerOrchestrator.register(
             runtime,
             "Orchestrator",
-            lambda: LedgerOrchestrator(
+            lambda: PooledLedgerOrchestrator(
                 agents=agent_list,
                 model_client=client,
-                max_rounds=max_rounds,
-                max_time=max_time,
+                max_rounds=MAX_ROUNDS,
+                max_time=MAX_TIME,
                 max_replans=1,
                 max_stalls_before_replan=0,
                 return_final_answer=True,
@@ -139,65 +178,30 @@ class MagenticOne(MultiAgentFramework):
         )
         self.logger.info("LedgerOrchestrator registered.")
 
-        # Start the runtime
-        runtime.start()
-        self.logger.info("Agent runtime started.")
-
-        # Initialize WebSurfer if enabled
+        actual_surfer = None
         if enable_internet:
+            # The agent instance only exists once the runtime has run
+            runtime.start()
             actual_surfer = await runtime.try_get_underlying_agent_instance(
                 web_surfer.id, type=MultimodalWebSurfer
             )
             self.logger.info("Initializing MultimodalWebSurfer with headless browser.")
             await actual_surfer.init(
                 model_client=client,
-                downloads_folder=logs_dir,
+                downloads_folder=WARM_LOGS_DIR,
                 start_page="https://www.bing.com",
                 browser_channel="chromium",
                 headless=True,
-                debug_dir=logs_dir,
-                to_save_screenshots=save_screenshots,
+                debug_dir=WARM_LOGS_DIR,
+                to_save_screenshots=False,
             )
+            await runtime.stop_when_idle()
 
-        # Log completion and timing
-        _end_time = dt.now(self.ist_timezone)
-        setup_time = (_end_time - _start_time).total_seconds()
-        self.logger.info(f"Multi-Agent Architecture Setup time: {setup_time} s")
-
-        # Return useful context
-        return runtime, logs_dir, log_file, max_time, max_rounds, now
-    def __create_client(self, llm_model):
-        try:
-            # Create an appropriate client
-            print(llm_model)
-            if llm_model.lower().__contains__("azure"):
-                os.environ["CHAT_COMPLETION_PROVIDER"] = settings.CHAT_COMPLETION_PROVIDER
-                os.environ["AZURE_OPENAI_API_KEY"] = settings.AZURE_OPENAI_API_KEY
-                os.environ["AZURE_OPENAI_ENDPOINT"] = settings.AZURE_OPENAI_ENDPOINT
-                os.environ["OPENAI_API_VERSION"] = settings.OPENAI_API_VERSION
-                os.environ["AZURE_CLIENT_ID"] = settings.AZURE_CLIENT_ID
-                os.environ["AZURE_TENANT_ID"] = settings.AZURE_TENANT_ID
-                os.environ["AZURE_CLIENT_SECRET"] = settings.AZURE_CLIENT_SECRET
-                client = create_completion_client_from_env(model="gpt-4o")
-            if llm_model.lower().__contains__("openai"):
-                os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
-                # os.environ["OPENAI_API_KEY"] = (
-                #     ""
-                # )
-                self.logger.info("Using OpenAI API key in environment")
-                client = create_completion_client_from_env(model="gpt-4o")
-            # elif llm_model in LLAMA_LLM_MODELS:
-            elif llm_model.lower().__contains__("llama3"):
-                os.environ["CHAT_COMPLETION_PROVIDER"] = "ollama"
-                client = create_completion_client_from_env(
-                    model="llama3.2-vision:11b-instruct-q4_K_M"
-                )
-            else:
-                raise HTTPException(status_code=400, detail="Invalid LLM model.")
-            return client
-        except Exception as e:
-            self.logger.exception(f"Error occurred while creating client | {e!s}")
-            raise e
+        setup_time = (dt.now(self.ist_timezone) - _start_time).total_seconds()
+        self.logger.info(
+            f"Pooled MagenticOne runtime built for {key} in {setup_time} s"
+        )
+        return WarmRuntime(key, runtime, actual_surfer)
 
     async def _execute(self, content: str, runtime):
         self.logger.info("Executing orchestration.")
@@ -219,18 +223,19 @@ class MagenticOne(MultiAgentFramework):
         )
         final_answer = ""
         try:
-            with open(log_file) as f:
-                data = f.read()
-                if data:
-                    final_answers = [
-                        json.loads(line).get("message", "")
-                        for line in data.split("\n")
-                        if line.strip()
-                        and "Orchestrator (final answer)"
-                        in json.loads(line).get("source", "")
-                    ]
-                    if len(final_answers):
-                        final_answer = final_answers[-1].strip()
+            # The final answer is among the last events: scan from the end and parse
+            # only the lines that can hold it, each once
+            for line in read_lines_backwards(log_file):
+                if FINAL_ANSWER_SOURCE_BYTES not in line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # E.g. a last line cut short
+                    continue
+                if FINAL_ANSWER_SOURCE in event.get("source", ""):
+                    final_answer = event.get("message", "").strip()
+                    break
             if not final_answer:
                 self.logger.warning(f"No final answer found in logs for {task_id}")
             else:
@@ -247,6 +252,14 @@ class MagenticOne(MultiAgentFramework):
         self.logger.info(
             f"Starting Magentic multi-agent task with query: {agentic_task_request.query[:100]}"
         )
+        warm_runtime = await magentic_one_pool.checkout(
+            (
+                agentic_task_request.llm_model,
+                agentic_task_request.enable_internet,
+                bool(agentic_task_request.files),
+            )
+        )
+        reusable = False
         try:
             (
                 runtime,
@@ -262,20 +275,46 @@ class MagenticOne(MultiAgentFramework):
                 enable_internet=agentic_task_request.enable_internet,
                 save_screenshots=True,
                 input_files=agentic_task_request.files,
+                warm_runtime=warm_runtime,
             )
-            ORCHESTRATOR_INIT_PROMPT2 = """
+            init_prompt = """
             Date and time today is : {now}. Use it only if it is relevant.  
             User wants you to perform the following task:
             User Query: {initial_query}
             """
             if agentic_task_request.files:
                 file_paths = str([file.file_local_path for file in agentic_task_request.files])
-                ORCHESTRATOR_INIT_PROMPT2 += f"\n\nUser has also provided the following files: {file_paths}"
+                init_prompt += (
+                    f"\n\nUser has also provided the following files: {file_paths}"
+                )
+                # Documents converted at upload time, read instead of parsing the
+                # originals (a list, a dict's braces would break the .format below)
+                text_paths = [
+                    f"{file.file_local_path} -> {file.file_text_path}"
+                    for file in agentic_task_request.files
+                    if file.file_text_path
+                ]
+                if text_paths:
+                    init_prompt += (
+                        "\nTheir text has already been extracted to markdown, read "
+                        "these files instead of the originals "
+                        f"(original -> extracted text): {text_paths}"
+                    )
+                page_images = [
+                    path
+                    for file in agentic_task_request.files
+                    for path in file.file_page_image_paths
+                ]
+                if page_images:
+                    init_prompt += (
+                        f"\nImages of their pages are available at: {page_images}"
+                    )
 
-            content = ORCHESTRATOR_INIT_PROMPT2.format(
+            content = init_prompt.format(
                 initial_query=agentic_task_request.query, now=now
             )
             response = await self._execute(content, runtime)
+            reusable = True
             self.logger.info(f"Response from the framework: {response}")
             final_response = self.__extract_final_response_from_log_file(
                 log_file, agentic_task_request.task_id
@@ -285,9 +324,284 @@ class MagenticOne(MultiAgentFramework):
             else:
                 status = TaskStatus.FAILED.value
             self.logger.info(f"TaskID Completed | Status: {status}, Final Response: {final_response}")
-            return final_response, status
+            return TaskResponse(
+                task_id=agentic_task_request.task_id,
+                status=status,
+                task_request=TaskRequest(
+                    task_id=agentic_task_request.task_id,
+                    query=agentic_task_request.query,
+                    multi_agent_framework=MultiAgentFrameworks.MAGENTIC_ONE.value,
+                    llm_model=agentic_task_request.llm_model,
+                    enable_internet=agentic_task_request.enable_internet,
+                ),
+                task_output=TaskOutput(final_response=final_response),
+            )
         except Exception as e:
             self.logger.error(
                 f"Error occurred while starting the task: {agentic_task_request.task_id} | {e!s}"
             )
             raise e
+        finally:
+            # A runtime interrupted mid-task is not reset, it is replaced
+            await magentic_one_pool.checkin(warm_runtime, reusable=reusable)
+
+
+# Source of the orchestrator's final answer event in the JSONL event log
+FINAL_ANSWER_SOURCE = "Orchestrator (final answer)"
+FINAL_ANSWER_SOURCE_BYTES = FINAL_ANSWER_SOURCE.encode()
+
+# Orchestrator limits of every pooled runtime
+MAX_TIME = 25 * 60
+MAX_ROUNDS = 120
+
+# Downloads and debug folder of idle pooled browsers, tasks point them at their own
+WARM_LOGS_DIR = os.path.join("logs", "magentic_one_pool")
+
+# (llm_model, enable_internet, with FileSurfer): runtimes only serve tasks of their key
+RuntimeKey = tuple[str, bool, bool]
+
+class PooledLedgerOrchestrator(LedgerOrchestrator):
+    """LedgerOrchestrator whose per-task state is cleared by a ``ResetMessage``.
+
+    ``BaseOrchestrator._reset`` does nothing, so a reused orchestrator would keep the
+    previous task, facts, plan, chat history, round count and start time: the next
+    task would skip ``_initialize_task`` and inherit the old limits. Resets the
+    orchestrator publishes itself (replanning) are not delivered back to it.
+    """
+
+    async def _reset(self, cancellation_token: CancellationToken) -> None:
+        self._task = ""
+        self._team_description = ""
+        self._facts = ""
+        self._plan = ""
+        self._chat_history = []
+        self._num_rounds = 0
+        self._start_time = -1.0
+        self._should_replan = True
+        self._stall_counter = 0
+        self._replan_counter = 0
+
+
+class WarmRuntime:
+    """A runtime with its agents registered and, for web tasks, its browser running."""
+
+    def __init__(
+        self,
+        key: RuntimeKey,
+        runtime: SingleThreadedAgentRuntime,
+        web_surfer: MultimodalWebSurfer | None,
+    ):
+        """Wrap a runtime built for ``key``, not used by any task yet."""
+        self.key = key
+        self.runtime = runtime
+        self.web_surfer = web_surfer
+        self.uses = 0
+
+
+class MagenticOneRuntimePool:
+    """Pre-warmed MagenticOne runtimes, reused across tasks.
+
+    Building a runtime (agent registration, model client, headless Chromium launch)
+    takes seconds. Checking one out of the pool takes milliseconds. Runtimes are keyed
+    by ``RuntimeKey`` because the orchestrator's agent list depends on it.
+    ``warm_up`` keeps ``min_size`` runtimes of the default key ready, and at most
+    ``max_size`` exist at once. When the pool is full, idle runtimes of other keys
+    are evicted, or the caller waits for a checkin.
+
+    A runtime is health-checked (browser page responds) on checkout. On checkin its
+    browser forgets the task (folders, cookies, site storage, extra tabs) and it is
+    reset with a ``ResetMessage`` broadcast: workers clear their chat histories and
+    ``PooledLedgerOrchestrator`` its task, ledger, round count and timer. After
+    ``max_uses`` tasks it is rebuilt.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[RuntimeKey], Awaitable[WarmRuntime]],
+        min_size: int = settings.MAGENTIC_ONE_POOL_MIN_SIZE,
+        max_size: int = settings.MAGENTIC_ONE_POOL_MAX_SIZE,
+        max_uses: int = settings.MAGENTIC_ONE_POOL_MAX_USES,
+        health_check_timeout: float = settings.MAGENTIC_ONE_POOL_HEALTH_CHECK_SECONDS,
+    ):
+        """Runtimes come from ``build``, limits default to MAGENTIC_ONE_POOL_*."""
+        self.build = build
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.health_check_timeout = health_check_timeout
+        self.logger = get_logger()
+        self._idle: dict[RuntimeKey, deque[WarmRuntime]] = {}
+        self._size = 0
+        self._changed = asyncio.Condition()
+        # Closes of evicted runtimes, referenced until done
+        self._closing: set[asyncio.Task] = set()
+
+    async def warm_up(self, key: RuntimeKey):
+        """Build runtimes of ``key`` until ``min_size`` of them are idle."""
+        while (
+            len(self._idle.get(key, ())) < self.min_size and self._size < self.max_size
+        ):
+            self._size += 1
+            try:
+                warm_runtime = await self.build(key)
+            except Exception:
+                self._size -= 1
+                raise
+            self._idle.setdefault(key, deque()).append(warm_runtime)
+        self.logger.info(
+            f"MagenticOne pool warmed up | {key}: {len(self._idle.get(key, ()))} idle"
+        )
+
+    async def checkout(self, key: RuntimeKey) -> WarmRuntime:
+        """Take a healthy idle runtime of ``key``, or build one once there is room."""
+        async with self._changed:
+            while True:
+                idle = self._idle.get(key)
+                while idle:
+                    warm_runtime = idle.popleft()
+                    if await self._is_healthy(warm_runtime):
+                        return warm_runtime
+                    self.logger.warning(
+                        f"Discarding unhealthy MagenticOne runtime {key}"
+                    )
+                    await self._discard(warm_runtime)
+                if self._size < self.max_size or self._evict_idle():
+                    self._size += 1
+                    break
+                await self._changed.wait()
+        try:
+            return await self.build(key)
+        except Exception:
+            async with self._changed:
+                self._size -= 1
+                self._changed.notify()
+            raise
+
+    async def checkin(self, warm_runtime: WarmRuntime, reusable: bool = True):
+        """Give a runtime back, reset for the next task or closed if not reusable."""
+        warm_runtime.uses += 1
+        if reusable and warm_runtime.uses < self.max_uses:
+            reusable = await self._reset(warm_runtime)
+        else:
+            reusable = False
+        async with self._changed:
+            if reusable:
+                self._idle.setdefault(warm_runtime.key, deque()).append(warm_runtime)
+            else:
+                await self._discard(warm_runtime)
+            self._changed.notify()
+
+    async def close(self):
+        """Close the idle runtimes."""
+        async with self._changed:
+            for idle in self._idle.values():
+                while idle:
+                    await self._discard(idle.popleft())
+
+    def _evict_idle(self) -> bool:
+        for idle in self._idle.values():
+            if idle:
+                self._size -= 1
+                closing = asyncio.create_task(self._close(idle.popleft()))
+                self._closing.add(closing)
+                closing.add_done_callback(self._closing.discard)
+                return True
+        return False
+
+    async def _is_healthy(self, warm_runtime: WarmRuntime) -> bool:
+        if warm_runtime.web_surfer is None:
+            return True
+        page = getattr(warm_runtime.web_surfer, "_page", None)
+        if page is None or page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(
+                page.evaluate("1"), timeout=self.health_check_timeout
+            )
+        except Exception as e:
+            self.logger.warning(f"MagenticOne browser health check failed: {e!s}")
+            return False
+        return True
+
+    async def _reset(self, warm_runtime: WarmRuntime) -> bool:
+        runtime = warm_runtime.runtime
+        try:
+            if warm_runtime.web_surfer is not None:
+                await self._clear_browser(warm_runtime.web_surfer)
+            runtime.start()
+            await runtime.publish_message(
+                ResetMessage(), topic_id=TopicId(type="default", source="default")
+            )
+            await asyncio.wait_for(
+                runtime.stop_when_idle(), timeout=self.health_check_timeout * 6
+            )
+        except Exception as e:
+            self.logger.warning(
+                f"Could not reset MagenticOne runtime {warm_runtime.key}: {e!s}"
+            )
+            return False
+        return True
+
+    async def _clear_browser(self, web_surfer: MultimodalWebSurfer):
+        # Before the ResetMessage: the surfer's reset may save a screenshot
+        web_surfer.downloads_folder = WARM_LOGS_DIR
+        web_surfer.debug_dir = WARM_LOGS_DIR
+        web_surfer.to_save_screenshots = False
+        context = getattr(web_surfer, "_context", None)
+        page = getattr(web_surfer, "_page", None)
+        if context is None or page is None:
+            return
+        for other in context.pages:
+            if other is not page:
+                await other.close()
+        await context.clear_cookies()
+        # Session storage lives in the tab, the rest per origin
+        await page.evaluate("() => { try { sessionStorage.clear() } catch {} }")
+        state = await context.storage_state()
+        origins = {entry["origin"] for entry in state["origins"]}
+        url = urlsplit(page.url)
+        if url.scheme in ("http", "https"):
+            origins.add(f"{url.scheme}://{url.netloc}")
+        cdp = await context.new_cdp_session(page)
+        try:
+            for origin in origins:
+                await cdp.send(
+                    "Storage.clearDataForOrigin",
+                    {"origin": origin, "storageTypes": "all"},
+                )
+        finally:
+            await cdp.detach()
+
+    async def _discard(self, warm_runtime: WarmRuntime):
+        self._size -= 1
+        await self._close(warm_runtime)
+
+    async def _close(self, warm_runtime: WarmRuntime):
+        with contextlib.suppress(Exception):  # Already stopped
+            await warm_runtime.runtime.stop()
+        web_surfer = warm_runtime.web_surfer
+        if web_surfer is None:
+            return
+        try:
+            context = getattr(web_surfer, "_context", None)
+            if context is not None:
+                await context.close()
+            playwright = getattr(web_surfer, "_playwright", None)
+            if playwright is not None:
+                await playwright.stop()
+        except Exception as e:
+            self.logger.warning(f"Could not close MagenticOne browser: {e!s}")
+
+
+magentic_one_pool = MagenticOneRuntimePool(
+    build=lambda key: MagenticOne()._build_runtime(key)
+)
+
+
+async def warm_up_pool():
+    """Fill the pool with web-enabled runtimes of the warm model, logging failures."""
+    llm_model = settings.MAGENTIC_ONE_POOL_WARM_MODEL or get_default_model().id
+    try:
+        await magentic_one_pool.warm_up((llm_model, True, False))
+    except Exception as e:
+        get_logger().exception(f"Could not warm up the MagenticOne pool: {e!s}")
@@ -0,0 +1,186 @@
+"""Runs blocking framework adapters off the event loop, in processes or threads."""
+
+import asyncio
+import inspect
+import multiprocessing
+import queue
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from app.core.enums import SyncExecutorMode
+from app.core.logging import get_logger
+from app.core.settings import settings
+
+ProgressCallback = Callable[[dict[str, Any]], Awaitable[None] | None]
+
+
+class SyncTaskError(Exception):
+    """A synchronous framework job raised or its process died."""
+
+
+class ProgressReporter:
+    """Handed to a job as its last argument, ``report({...})`` sends progress back."""
+
+    def __init__(self, messages):
+        """Send progress through the job's ``messages`` queue."""
+        self.messages = messages
+
+    def __call__(self, progress: dict[str, Any]):
+        """Report one progress update of the job."""
+        self.messages.put(("progress", progress))
+
+
+def _run_job(fn: Callable, args: tuple, messages):
+    try:
+        result = fn(*args, ProgressReporter(messages))
+    except BaseException as e:
+        messages.put(("error", f"{type(e).__name__}: {e!s}"))
+    else:
+        messages.put(("result", result))
+
+
+class SyncTaskExecutor:
+    """Runs blocking framework adapters (AG2 agent loops) off the event loop.
+
+    In ``process`` mode every job gets its own spawned process, at most
+    ``max_workers`` at a time, so a timeout or cancellation can terminate it. In
+    ``thread`` mode jobs share a thread pool. That is cheaper, but a cancelled or
+    timed-out job keeps its thread until the agent loop returns on its own.
+
+    Jobs are module-level functions (picklable) taking ``report`` as their last
+    argument. Progress and the result come back through a queue that is drained
+    without blocking the loop.
+    """
+
+    def __init__(
+        self,
+        mode: str = settings.SYNC_EXECUTOR_MODE,
+        max_workers: int = settings.SYNC_EXECUTOR_MAX_WORKERS,
+        timeout: float = settings.SYNC_TASK_TIMEOUT_SECONDS,
+        poll_interval: float = 0.2,
+    ):
+        """Defaults come from the SYNC_EXECUTOR_* settings."""
+        self.mode = mode
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.logger = get_logger()
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._thread_pool: ThreadPoolExecutor | None = None
+        self._processes: dict[str, multiprocessing.Process] = {}
+        self._jobs: dict[str, asyncio.Task] = {}
+
+    async def run(
+        self,
+        task_id: str,
+        fn: Callable,
+        *args,
+        on_progress: ProgressCallback | None = None,
+        timeout: float | None = None,
+    ) -> Any:
+        """Run ``fn(*args, report)`` and return its result.
+
+        Raises:
+            TimeoutError: The job ran longer than its timeout and was stopped.
+            SyncTaskError: The job raised, or its process exited without a result.
+
+        """
+        job = asyncio.create_task(self._run(str(task_id), fn, args, on_progress))
+        self._jobs[str(task_id)] = job
+        try:
+            return await asyncio.wait_for(job, timeout=timeout or self.timeout)
+        except TimeoutError:
+            self.logger.exception(f"Sync job for task {task_id} timed out, stopping it")
+            raise
+        finally:
+            self._jobs.pop(str(task_id), None)
+
+    def cancel(self, task_id: str) -> bool:
+        """Stop the job of a task; returns False if it has none running."""
+        job = self._jobs.get(str(task_id))
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def shutdown(self):
+        """Terminate running job processes and drop the thread pool."""
+        for process in self._processes.values():
+            process.terminate()
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+
+    async def _run(self, task_id: str, fn: Callable, args: tuple, on_progress):
+        async with self._semaphore:
+            if self.mode == SyncExecutorMode.THREAD.value:
+                return await self._run_in_thread(task_id, fn, args, on_progress)
+            return await self._run_in_process(task_id, fn, args, on_progress)
+
+    async def _run_in_process(
+        self, task_id: str, fn: Callable, args: tuple, on_progress
+    ):
+        context = multiprocessing.get_context("spawn")
+        messages = context.Queue()
+        process = context.Process(
+            target=_run_job, args=(fn, args, messages), daemon=True
+        )
+        process.start()
+        self._processes[task_id] = process
+        try:
+            return await self._collect(task_id, messages, process.is_alive, on_progress)
+        finally:
+            self._processes.pop(task_id, None)
+            if process.is_alive():
+                process.terminate()
+            # Reap finished children without blocking on them
+            multiprocessing.active_children()
+
+    async def _run_in_thread(
+        self, task_id: str, fn: Callable, args: tuple, on_progress
+    ):
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="sync-maf"
+            )
+        messages: queue.Queue = queue.Queue()
+        future = asyncio.get_running_loop().run_in_executor(
+            self._thread_pool, _run_job, fn, args, messages
+        )
+        return await self._collect(
+            task_id, messages, lambda: not future.done(), on_progress
+        )
+
+    async def _collect(
+        self, task_id: str, messages, is_running: Callable[[], bool], on_progress
+    ):
+        while True:
+            running = is_running()
+            while True:
+                try:
+                    kind, payload = messages.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "result":
+                    return payload
+                if kind == "error":
+                    raise SyncTaskError(payload)
+                await self._report(task_id, payload, on_progress)
+            if not running:
+                error = f"Sync job for task {task_id} exited without a result"
+                raise SyncTaskError(error)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _report(self, task_id: str, progress: dict, on_progress):
+        if on_progress is None:
+            return
+        try:
+            result = on_progress(progress)
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            self.logger.exception(f"Progress callback failed for task {task_id}")
+
+
+sync_task_executor = SyncTaskExecutor()
@@ -0,0 +1,174 @@
+"""Health-based ranking of the deployments that can serve a model."""
+
+import asyncio
+import contextlib
+import time
+
+import httpx
+from openai import APIConnectionError
+
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.models.llm import get_deployment_id, get_equivalent_models
+from app.services.rate_limiter import rate_limiter
+
+logger = get_logger()
+
+# Weight of the latest observation in the moving averages
+EWMA_ALPHA = 0.2
+# A deployment failing every call scores this many times worse than a healthy one
+ERROR_PENALTY = 4.0
+# Floor of the rate budget fraction, so an exhausted bucket ranks last but finite
+MIN_BUDGET = 0.05
+
+
+class _DeploymentHealth:
+    def __init__(self):
+        self.latency: float | None = None  # EWMA of successful call latency, seconds
+        self.error_rate = 0.0  # EWMA of 429/5xx outcomes
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.failovers = 0
+
+
+class ModelRouter:
+    """Ranks the deployments able to serve a model's completions.
+
+    The candidates for a model are itself and its capability-equivalent deployments
+    (``get_equivalent_models``), by deployment id (``get_deployment_id``): ids on
+    the same endpoint and deployment are one candidate with one health, so a call
+    never fails over to the deployment that just failed. They are ordered by their
+    average latency, made worse by their recent 429/5xx rate and by how little of
+    their rate-limit budget is left. A deployment that just answered 429/5xx cools
+    down: it ranks after all others until ``Retry-After`` (or
+    ``LLM_ROUTER_COOLDOWN_SECONDS``) has passed. Deployments never called yet are
+    ranked as fast as the fastest one, so they get tried. Health is observed per
+    process.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.LLM_ROUTER_ENABLED,
+        cooldown_seconds: float = settings.LLM_ROUTER_COOLDOWN_SECONDS,
+    ):
+        """Rank deployments, a disabled router only returns the requested model."""
+        self.enabled = enabled
+        self.cooldown_seconds = cooldown_seconds
+        self._health: dict[str, _DeploymentHealth] = {}
+
+    def candidates(self, model_id: str) -> list[str]:
+        """Deployment ids to try for a completion of ``model_id``, best first."""
+        deployment_id = get_deployment_id(model_id)
+        if not self.enabled:
+            return [deployment_id]
+        model_ids = list(
+            dict.fromkeys(
+                get_deployment_id(model.id) for model in get_equivalent_models(model_id)
+            )
+        ) or [deployment_id]
+        if len(model_ids) == 1:
+            return model_ids
+        now = time.monotonic()
+        latencies = [
+            self._health[candidate].latency
+            for candidate in model_ids
+            if candidate in self._health and self._health[candidate].latency is not None
+        ]
+        default_latency = min(latencies, default=1.0)
+
+        def rank(candidate: str) -> tuple:
+            health = self._health.get(candidate) or _DeploymentHealth()
+            if health.cooldown_until > now:
+                return (1, health.cooldown_until, 0)
+            latency = health.latency if health.latency is not None else default_latency
+            score = (
+                latency
+                * (1 + ERROR_PENALTY * health.error_rate)
+                / max(rate_limiter.remaining(candidate), MIN_BUDGET)
+            )
+            # On equal scores the requested model wins
+            return (0, score, candidate != deployment_id)
+
+        return sorted(model_ids, key=rank)
+
+    def record_success(self, model_id: str, latency: float):
+        """Fold a successful call and its latency into the deployment's health."""
+        health = self._get(model_id)
+        health.calls += 1
+        health.latency = (
+            latency if health.latency is None else _ewma(health.latency, latency)
+        )
+        health.error_rate = _ewma(health.error_rate, 0.0)
+
+    def record_failure(self, model_id: str, retry_after: float | None = None):
+        """Record a 429/5xx or unreachable deployment and start its cooldown."""
+        health = self._get(model_id)
+        health.calls += 1
+        health.failures += 1
+        health.error_rate = _ewma(health.error_rate, 1.0)
+        health.cooldown_until = time.monotonic() + (
+            retry_after or self.cooldown_seconds
+        )
+
+    def fail_over(self, error: Exception, candidates: list[str], index: int) -> bool:
+        """Record a failed call of ``candidates[index]``; True to try the next one."""
+        status_code = getattr(error, "status_code", None)
+        if not (
+            status_code == httpx.codes.TOO_MANY_REQUESTS
+            or (status_code is not None and httpx.codes.is_server_error(status_code))
+            or isinstance(
+                error, APIConnectionError | asyncio.TimeoutError | ConnectionError
+            )
+        ):
+            return False
+        self.record_failure(candidates[index], _retry_after(error))
+        if index + 1 >= len(candidates):
+            return False
+        self.record_failover(candidates[index], candidates[index + 1])
+        return True
+
+    def record_failover(self, from_model_id: str, to_model_id: str):
+        """Count a call moved from one deployment to the next."""
+        self._get(from_model_id).failovers += 1
+        logger.warning(f"LLM call failed over from {from_model_id} to {to_model_id}")
+
+    def stats(self) -> dict:
+        """Health of every deployment called by this process."""
+        now = time.monotonic()
+        return {
+            model_id: {
+                "calls": health.calls,
+                "failures": health.failures,
+                "failovers": health.failovers,
+                "latency_ms": round(health.latency * 1000, 1)
+                if health.latency is not None
+                else None,
+                "error_rate": round(health.error_rate, 3),
+                "cooling_down": health.cooldown_until > now,
+                "rate_budget": round(rate_limiter.remaining(model_id), 3),
+            }
+            for model_id, health in self._health.items()
+        }
+
+    def _get(self, model_id: str) -> _DeploymentHealth:
+        health = self._health.get(model_id)
+        if health is None:
+            health = self._health[model_id] = _DeploymentHealth()
+        return health
+
+
+def _retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    with contextlib.suppress(TypeError, ValueError):
+        return float(response.headers.get("retry-after"))
+    return None
+
+
+def _ewma(average: float, value: float) -> float:
+    return (1 - EWMA_ALPHA) * average + EWMA_ALPHA * value
+
+
+model_router = ModelRouter()
@@ -0,0 +1,189 @@
+"""Client-side rate limits of LLM models, as token buckets."""
+
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from app.core.enums import RateLimiterBackend
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.models.llm import LLMModel, get_model
+from app.repository.rate_limit_repository import RateLimitRepository
+
+logger = get_logger()
+
+
+class BucketStore(ABC):
+    """Where token buckets live; ``reserve`` must refill and take atomically."""
+
+    @abstractmethod
+    async def reserve(
+        self, bucket_key: str, amount: float, capacity: float, rate: float
+    ) -> float:
+        """Take ``amount`` and return the tokens left, negative when in debt."""
+
+
+class LocalBucketStore(BucketStore):
+    """Buckets of this process only."""
+
+    def __init__(self):
+        """Buckets start full."""
+        # key -> (tokens, updated at)
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    async def reserve(
+        self, bucket_key: str, amount: float, capacity: float, rate: float
+    ) -> float:
+        """Refill the bucket in memory, then take ``amount`` from it."""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(bucket_key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate) - amount
+        self._buckets[bucket_key] = (tokens, now)
+        return tokens
+
+
+class PostgresBucketStore(BucketStore):
+    """Buckets in the rate_limit_buckets table, shared by API replicas and workers."""
+
+    def __init__(self):
+        """Buckets are rows, created full on first use."""
+        self.repository = RateLimitRepository()
+
+    async def reserve(
+        self, bucket_key: str, amount: float, capacity: float, rate: float
+    ) -> float:
+        """Refill and take ``amount`` in one statement on the bucket's row."""
+        return await self.repository.reserve(bucket_key, amount, capacity, rate)
+
+
+class _ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.delayed_calls = 0
+        self.waiting = 0
+        self.tokens = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class ModelRateLimiter:
+    """Request and token buckets per ``LLMModel.id``.
+
+    A model with ``api_rate_limit`` and/or ``token_rate_limit`` gets one bucket each.
+    A bucket holds one period's allowance (``rate_limit_in_seconds``) and refills
+    continuously. A call reserves one request and its estimated prompt tokens
+    *before* it is sent, and waits as long as the buckets are in debt. Reservation
+    order is therefore arrival order. Completion tokens are charged afterwards
+    through ``charge`` and delay the next callers. Models without limits pass
+    straight through but are still counted in ``stats``.
+    """
+
+    def __init__(self, store: BucketStore):
+        """Keep the buckets in ``store``."""
+        self.store = store
+        self._stats: dict[str, _ModelStats] = defaultdict(_ModelStats)
+        # Bucket level seen by this process' last reservation:
+        # key -> (tokens, at, capacity, rate)
+        self._levels: dict[str, tuple[float, float, float, float]] = {}
+
+    async def acquire(self, model_id: str, tokens: int = 0) -> float:
+        """Wait until a call of ``tokens`` prompt tokens may go; returns the delay."""
+        stats = self._stats[model_id]
+        stats.calls += 1
+        stats.tokens += tokens
+        model = get_model(model_id)
+        if model is None or not (model.api_rate_limit or model.token_rate_limit):
+            return 0.0
+
+        delay = 0.0
+        if model.api_rate_limit:
+            delay = max(
+                delay, await self._reserve(model, "requests", model.api_rate_limit, 1)
+            )
+        if model.token_rate_limit and tokens:
+            delay = max(
+                delay,
+                await self._reserve(model, "tokens", model.token_rate_limit, tokens),
+            )
+        if delay > 0:
+            stats.delayed_calls += 1
+            stats.wait_total += delay
+            stats.wait_max = max(stats.wait_max, delay)
+            stats.waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                stats.waiting -= 1
+        return delay
+
+    async def charge(self, model_id: str, tokens: int):
+        """Debit tokens spent after the fact (completion tokens), without waiting."""
+        model = get_model(model_id)
+        if not tokens or model is None or not model.token_rate_limit:
+            return
+        self._stats[model_id].tokens += tokens
+        try:
+            await self._reserve(model, "tokens", model.token_rate_limit, tokens)
+        except Exception:
+            logger.exception(f"Could not charge {tokens} tokens to {model_id}")
+
+    def remaining(self, model_id: str) -> float:
+        """Fraction (0 to 1) of the model's tightest bucket left, 1 if unlimited.
+
+        Estimated from this process' last reservation plus the refill since, so it
+        costs no store round trip and may be optimistic in the shared mode.
+        """
+        now = time.monotonic()
+        fraction = 1.0
+        for kind in ("requests", "tokens"):
+            level = self._levels.get(f"{model_id}:{kind}")
+            if level is None:
+                continue
+            tokens, at, capacity, rate = level
+            fraction = min(
+                fraction, max(0.0, min(capacity, tokens + (now - at) * rate) / capacity)
+            )
+        return fraction
+
+    def stats(self) -> dict:
+        """Count calls, delays and tokens per model, for the health endpoint."""
+        return {
+            model_id: {
+                "calls": stats.calls,
+                "delayed_calls": stats.delayed_calls,
+                "waiting": stats.waiting,
+                "tokens": stats.tokens,
+                "avg_delay_ms": (
+                    round(stats.wait_total / stats.calls * 1000, 3)
+                    if stats.calls
+                    else 0.0
+                ),
+                "max_delay_ms": round(stats.wait_max * 1000, 3),
+            }
+            for model_id, stats in self._stats.items()
+        }
+
+    async def _reserve(
+        self, model: LLMModel, kind: str, limit: int, amount: float
+    ) -> float:
+        period = (
+            model.rate_limit_in_seconds or settings.RATE_LIMIT_DEFAULT_PERIOD_SECONDS
+        )
+        rate = limit / period
+        # A single call larger than a whole period's allowance must still get through
+        amount = min(amount, limit)
+        bucket_key = f"{model.id}:{kind}"
+        tokens = await self.store.reserve(bucket_key, amount, limit, rate)
+        self._levels[bucket_key] = (tokens, time.monotonic(), limit, rate)
+        return max(0.0, -tokens / rate)
+
+
+def create_bucket_store(backend: str) -> BucketStore:
+    """Store for a RATE_LIMITER_BACKEND value."""
+    if backend == RateLimiterBackend.POSTGRES.value:
+        return PostgresBucketStore()
+    return LocalBucketStore()
+
+
+rate_limiter = ModelRateLimiter(create_bucket_store(settings.RATE_LIMITER_BACKEND))
@@ -0,0 +1,274 @@
+"""Deduplication of identical task submissions."""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import time
+from collections import Counter
+from collections.abc import AsyncIterator
+from typing import NamedTuple
+
+from app.core.enums import TaskDedupeMode, TaskStatus
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.models.task import Task
+from app.repository.task_repository import TaskRepository
+
+logger = get_logger()
+
+TERMINAL_STATUSES = (
+    TaskStatus.SUCCESS.value,
+    TaskStatus.FAILED.value,
+    TaskStatus.PARTIAL_SUCCESS.value,
+)
+
+
+class SharedResult(NamedTuple):
+    """Result of an identical task that a task takes instead of running."""
+
+    mode: str
+    source: Task
+    fingerprint: str
+
+    def metadata(self) -> dict:
+        """Return the ``task_metadata.dedupe`` of the task taking the result."""
+        return {
+            "fingerprint": self.fingerprint,
+            "mode": self.mode,
+            "source_task_id": str(self.source.task_id),
+        }
+
+
+class TaskDeduplicator:
+    """Singleflight and result reuse for identical task submissions.
+
+    Tasks are identical when their fingerprint matches: query, framework, LLM model,
+    internet access and the SHA-256 of their input files. When a task starts:
+
+    - an identical task that succeeded less than ``freshness_seconds`` ago has its
+      final response reused (``reused``);
+    - an identical task already running is waited for, through a shared future in
+      this process or by polling its row when it runs in another process, and its
+      result is taken once it succeeds (``coalesced``);
+    - otherwise the task runs and identical tasks attach to it (``leader``).
+
+    The outcome is recorded in ``task_metadata.dedupe``; only leaders are matched,
+    so a reused result never outlives the freshness window of the run it came from.
+    A leader touches its row every ``heartbeat_seconds``; one not updated for
+    ``lease_seconds`` is considered dead (its process crashed) and not waited for.
+    A task whose leader did not succeed, or still runs after ``max_wait_seconds``,
+    runs itself.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = settings.TASK_DEDUPE_ENABLED,
+        freshness_seconds: int = settings.TASK_DEDUPE_FRESHNESS_SECONDS,
+        max_wait_seconds: int = settings.TASK_DEDUPE_MAX_WAIT_SECONDS,
+        poll_seconds: float = settings.TASK_DEDUPE_POLL_SECONDS,
+    ):
+        """Deduplicate tasks, a disabled deduplicator runs every task."""
+        self.enabled = enabled
+        self.freshness_seconds = freshness_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.poll_seconds = poll_seconds
+        # Liveness of leaders, as for jobs of the task queue
+        self.lease_seconds = settings.TASK_QUEUE_LEASE_SECONDS
+        self.heartbeat_seconds = settings.TASK_QUEUE_HEARTBEAT_SECONDS
+        self.repository = TaskRepository()
+        # fingerprint -> (leader task_id, resolved with the task_id holding the result)
+        self._flights: dict[str, tuple[str, asyncio.Future]] = {}
+        self._stats: Counter[str] = Counter()
+
+    @staticmethod
+    def fingerprint(task: Task) -> str | None:
+        """SHA-256 of what determines a task's result.
+
+        None if the content of one of its files is unknown.
+        """
+        input_files = (task.task_metadata or {}).get("input_files") or {}
+        file_hashes = []
+        for file_name in task.input_file_names or []:
+            sha256 = (input_files.get(file_name) or {}).get("sha256")
+            if not sha256:
+                # Uploaded before the blob store
+                return None
+            file_hashes.append(sha256)
+        key = [
+            task.query,
+            task.multi_agent_framework,
+            task.llm_model,
+            bool(task.enable_internet),
+            sorted(file_hashes),
+        ]
+        return hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+
+    @contextlib.asynccontextmanager
+    async def deduplicate(self, task: Task) -> AsyncIterator[SharedResult | None]:
+        """Yield the result ``task`` can take, or None when it has to run.
+
+        A task that runs leads its fingerprint in this process until the block exits;
+        identical tasks started meanwhile wait for it.
+        """
+        fingerprint = self.fingerprint(task) if self.enabled else None
+        if fingerprint is None:
+            yield None
+            return
+        task_id = str(task.task_id)
+
+        shared = None
+        flight = self._flights.get(fingerprint)
+        try:
+            while flight is not None:
+                shared = await self._follow_local(task_id, fingerprint, *flight)
+                if shared is not None or self._flights.get(fingerprint) is flight:
+                    # Coalesced, or waited max_wait_seconds for a leader that still runs
+                    break
+                # The leader failed, follow its successor if another follower took over
+                flight = self._flights.get(fingerprint)
+        except Exception:
+            logger.exception(f"Task deduplication of {task_id} failed, running it")
+            flight = None
+        if shared is not None:
+            yield shared
+            return
+        # Still set if the leader in this process outlasted max_wait_seconds
+        waited_out = flight is not None
+
+        future = None
+        if fingerprint not in self._flights:
+            future = asyncio.get_running_loop().create_future()
+            self._flights[fingerprint] = (task_id, future)
+        shared = None
+        heartbeat = None
+        try:
+            try:
+                if not waited_out:
+                    shared = await self._find_shared(task_id, fingerprint)
+                if shared is None:
+                    self._stats["leaders"] += 1
+                    await self.repository.patch_metadata(
+                        task_id,
+                        "dedupe",
+                        {
+                            "fingerprint": fingerprint,
+                            "mode": TaskDedupeMode.LEADER.value,
+                        },
+                    )
+                    heartbeat = asyncio.create_task(self._heartbeat(task_id))
+            except Exception:
+                # Best effort, the task runs as if deduplication was disabled
+                logger.exception(f"Task deduplication of {task_id} failed, running it")
+                shared = None
+            yield shared
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            if future is not None:
+                self._flights.pop(fingerprint, None)
+                future.set_result(
+                    str(shared.source.task_id) if shared is not None else task_id
+                )
+
+    async def _find_shared(self, task_id: str, fingerprint: str) -> SharedResult | None:
+        fresh = await self.repository.find_dedupe_leader(
+            fingerprint,
+            (TaskStatus.SUCCESS.value,),
+            task_id,
+            updated_within_seconds=self.freshness_seconds,
+        )
+        if fresh is not None:
+            self._stats["reused"] += 1
+            logger.info(
+                f"Task {task_id} reuses the result of identical task {fresh.task_id}"
+            )
+            return SharedResult(TaskDedupeMode.REUSED.value, fresh, fingerprint)
+
+        # Led by another process (API replica or worker), poll its row
+        running = await self.repository.find_dedupe_leader(
+            fingerprint,
+            (TaskStatus.QUEUED.value, TaskStatus.IN_PROGRESS.value),
+            task_id,
+            updated_within_seconds=self.lease_seconds,
+        )
+        if running is None:
+            return None
+        leader_id = str(running.task_id)
+        await self._mark_waiting(task_id, fingerprint, leader_id)
+        deadline = time.monotonic() + self.max_wait_seconds
+        # Last updated_at of the leader and when it was first seen
+        alive = (running.updated_at, time.monotonic())
+        while running is not None and running.status not in TERMINAL_STATUSES:
+            now = time.monotonic()
+            if running.updated_at != alive[0]:
+                alive = (running.updated_at, now)
+            if now >= deadline or now - alive[1] >= self.lease_seconds:
+                # Waited long enough, or the leader stopped heartbeating
+                running = None
+                break
+            await asyncio.sleep(self.poll_seconds)
+            running = await self.repository.get(leader_id)
+        return self._coalesced(task_id, fingerprint, running)
+
+    async def _heartbeat(self, task_id: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await self.repository.touch(task_id)
+            except Exception:
+                logger.exception(f"Heartbeat of dedupe leader {task_id} failed")
+
+    async def _follow_local(
+        self, task_id: str, fingerprint: str, leader_id: str, flight: asyncio.Future
+    ) -> SharedResult | None:
+        await self._mark_waiting(task_id, fingerprint, leader_id)
+        try:
+            source_id = await asyncio.wait_for(
+                asyncio.shield(flight), self.max_wait_seconds
+            )
+        except TimeoutError:
+            return self._coalesced(task_id, fingerprint, None)
+        return self._coalesced(
+            task_id, fingerprint, await self.repository.get(source_id)
+        )
+
+    async def _mark_waiting(self, task_id: str, fingerprint: str, leader_id: str):
+        logger.info(f"Task {task_id} waits for identical task {leader_id}")
+        await self.repository.patch_metadata(
+            task_id,
+            "dedupe",
+            {
+                "fingerprint": fingerprint,
+                "mode": TaskDedupeMode.WAITING.value,
+                "source_task_id": leader_id,
+            },
+        )
+
+    def _coalesced(
+        self, task_id: str, fingerprint: str, source: Task | None
+    ) -> SharedResult | None:
+        if source is None or source.status != TaskStatus.SUCCESS.value:
+            # Failed or still running, the task runs on its own
+            self._stats["fallbacks"] += 1
+            logger.info(
+                f"Task {task_id} runs itself, "
+                "its identical task did not succeed in time"
+            )
+            return None
+        self._stats["coalesced"] += 1
+        return SharedResult(TaskDedupeMode.COALESCED.value, source, fingerprint)
+
+    def stats(self) -> dict:
+        """Outcome counters since startup and fingerprints led in this process."""
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            **{
+                key: self._stats[key]
+                for key in ("leaders", "coalesced", "reused", "fallbacks")
+            },
+        }
+
+
+task_deduplicator = TaskDeduplicator()
@@ -0,0 +1,204 @@
+"""Per-process concurrency slots and fair queuing of task executions."""
+
+import asyncio
+import bisect
+import contextlib
+import itertools
+from collections import Counter
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from fastapi import HTTPException
+
+from app.core.logging import get_logger
+from app.core.settings import settings
+
+logger = get_logger()
+
+QueuedCallback = Callable[[int], Awaitable[None]]
+
+
+class _Waiter:
+    def __init__(self, task_id: str, framework: str, model: str, sort_key: tuple):
+        self.task_id = task_id
+        self.framework = framework
+        self.model = model
+        self.sort_key = sort_key
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.sort_key < other.sort_key
+
+
+class TaskScheduler:
+    """Admission control and concurrency slots in front of the agent frameworks.
+
+    A task runs once a global slot and the slots of its framework and LLM model are
+    free. Otherwise it waits in a queue ordered by priority (higher first). Within a
+    priority level, start-time fair queuing alternates between users, so one user
+    starting many tasks cannot starve the others. Each user's own tasks stay FIFO.
+    A waiter whose framework or model is saturated does not block the ones behind it.
+    Once ``max_queued`` tasks are waiting, ``check_admission`` rejects new ones with
+    a 429.
+
+    Slots are per process: the API (background backend) and every ``app.worker``
+    process run their own scheduler.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = settings.TASK_SCHEDULER_MAX_CONCURRENT,
+        framework_limits: dict[str, int] | None = None,
+        model_limits: dict[str, int] | None = None,
+        max_queued: int = settings.TASK_SCHEDULER_MAX_QUEUED,
+    ):
+        """Limits default to the TASK_SCHEDULER_* settings."""
+        self.max_concurrent = max_concurrent
+        self.framework_limits = (
+            settings.TASK_SCHEDULER_FRAMEWORK_LIMITS
+            if framework_limits is None
+            else framework_limits
+        )
+        self.model_limits = (
+            settings.TASK_SCHEDULER_MODEL_LIMITS
+            if model_limits is None
+            else model_limits
+        )
+        self.max_queued = max_queued
+        self._running = 0
+        self._running_by_framework: Counter[str] = Counter()
+        self._running_by_model: Counter[str] = Counter()
+        self._waiting: list[_Waiter] = []  # sorted by sort_key
+        self._user_finish_tags: dict[str, int] = {}
+        self._virtual_time = 0
+        self._sequence = itertools.count()
+
+    def check_admission(self, count: int = 1):
+        """Reject ``count`` new tasks with a 429 unless the queue has room for them."""
+        if len(self._waiting) + count > self.max_queued:
+            logger.warning(
+                f"Task scheduler overloaded | running: {self._running}, "
+                f"waiting: {len(self._waiting)}"
+            )
+            raise HTTPException(
+                status_code=429,
+                detail="Too many tasks queued, retry later",
+                headers={
+                    "Retry-After": str(settings.TASK_SCHEDULER_RETRY_AFTER_SECONDS)
+                },
+            )
+
+    def queue_position(self, task_id: str) -> int | None:
+        """1-based position of a waiting task, None if it is not waiting here."""
+        for position, waiter in enumerate(self._waiting, start=1):
+            if waiter.task_id == str(task_id):
+                return position
+        return None
+
+    def stats(self) -> dict:
+        """Count running and waiting tasks, for the health endpoint."""
+        return {
+            "running": self._running,
+            "waiting": len(self._waiting),
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "running_by_framework": dict(self._running_by_framework),
+            "running_by_model": dict(self._running_by_model),
+        }
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        task_id: str,
+        framework: str,
+        model: str,
+        scheduling: dict | None = None,
+        on_queued: QueuedCallback | None = None,
+    ) -> AsyncIterator[None]:
+        """Hold a run slot for the task, waiting in the queue if none is free.
+
+        ``scheduling`` holds the optional ``priority`` (higher first) and ``user_id``
+        (fair share) of the task, as in its task_metadata.
+        ``on_queued(position)`` is awaited once if the task has to wait.
+        """
+        scheduling = scheduling or {}
+        waiter = self._enqueue(
+            str(task_id),
+            framework,
+            model,
+            scheduling.get("priority", 0),
+            scheduling.get("user_id") or "",
+        )
+        self._dispatch()
+        if not waiter.future.done():
+            try:
+                if on_queued is not None:
+                    await on_queued(self.queue_position(task_id))
+                await waiter.future
+            except BaseException:
+                # Cancelled, or on_queued failed: leave the queue or give the slot back
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                elif waiter.future.done() and not waiter.future.cancelled():
+                    # Slot was granted meanwhile
+                    self._release(waiter)
+                raise
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def _enqueue(
+        self, task_id: str, framework: str, model: str, priority: int, user_id: str
+    ) -> _Waiter:
+        # Start-time fair queuing: a user's next task starts after their previous one
+        start_tag = max(self._virtual_time, self._user_finish_tags.get(user_id, 0))
+        self._user_finish_tags[user_id] = start_tag + 1
+        waiter = _Waiter(
+            task_id,
+            framework,
+            model,
+            (-priority, start_tag, next(self._sequence), user_id),
+        )
+        bisect.insort(self._waiting, waiter)
+        return waiter
+
+    def _can_run(self, waiter: _Waiter) -> bool:
+        framework_limit = self.framework_limits.get(waiter.framework)
+        model_limit = self.model_limits.get(waiter.model)
+        return (
+            framework_limit is None
+            or self._running_by_framework[waiter.framework] < framework_limit
+        ) and (
+            model_limit is None or self._running_by_model[waiter.model] < model_limit
+        )
+
+    def _dispatch(self):
+        index = 0
+        while index < len(self._waiting) and self._running < self.max_concurrent:
+            waiter = self._waiting[index]
+            if waiter.future.done() or not self._can_run(waiter):
+                index += 1
+                continue
+            del self._waiting[index]
+            self._running += 1
+            self._running_by_framework[waiter.framework] += 1
+            self._running_by_model[waiter.model] += 1
+            _, start_tag, _, user_id = waiter.sort_key
+            self._virtual_time = max(self._virtual_time, start_tag)
+            if self._user_finish_tags.get(user_id, 0) <= self._virtual_time:
+                # Caught up with the virtual clock, the tag carries no information
+                self._user_finish_tags.pop(user_id, None)
+            waiter.future.set_result(None)
+
+    def _release(self, waiter: _Waiter):
+        self._running -= 1
+        self._running_by_framework[waiter.framework] -= 1
+        if self._running_by_framework[waiter.framework] <= 0:
+            del self._running_by_framework[waiter.framework]
+        self._running_by_model[waiter.model] -= 1
+        if self._running_by_model[waiter.model] <= 0:
+            del self._running_by_model[waiter.model]
+        self._dispatch()
+
+
+task_scheduler = TaskScheduler()
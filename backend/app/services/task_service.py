@@ -1,28 +1,66 @@
-import os
+"""Task lifecycle: creation, uploads, execution and progress streaming."""
 
-from fastapi import BackgroundTasks, HTTPException, UploadFile
+import asyncio
+import base64
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+from uuid import UUID, uuid4
+
+from fastapi import BackgroundTasks, HTTPException, Request, UploadFile
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from app.core.enums import MultiAgentFrameworks, TaskStatus
+from app.core.enums import (
+    KafkaTaskType,
+    MultiAgentFrameworks,
+    TaskEventType,
+    TaskExecutionBackend,
+    TaskStatus,
+)
 from app.core.logging import get_logger
-# from app.main import producer, KAFKA_TOPIC
+from app.core.settings import settings
 from app.models.task import Task
+from app.repository.task_queue_repository import TaskQueueRepository
 from app.repository.task_repository import TaskRepository
+from app.schemas.kafka import KafkaTaskRequest
 from app.schemas.task import (
     AgenticTaskRequest,
+    BulkTaskItemResult,
+    BulkTaskRequest,
+    BulkTaskResponse,
+    BulkTaskStartRequest,
     LiveStreamResponse,
-    LLMFileInput,
+    TaskEvent,
+    TaskFileAttachResponse,
+    TaskFileReference,
+    TaskListFilters,
     TaskOutput,
+    TaskPage,
     TaskRequest,
     TaskResponse,
+    TaskSummary,
 )
-from app.services.maf.impl.am1 import BrowserUse
+from app.services.blob_store import blob_store
+from app.services.event_hub import event_hub, format_sse
+from app.services.kafka.producer import producer
+from app.services.llm_cache import use_llm_cache
+from app.services.maf.impl.am1 import browser_use_live_urls
+from app.services.task_dedupe import task_deduplicator
+from app.services.task_scheduler import task_scheduler
+from app.services.uploads import StoredUpload, safe_file_name, stream_to_disk
 
 logger = get_logger()
 
 task_repository = TaskRepository()
+task_queue_repository = TaskQueueRepository()
+
+TERMINAL_TASK_STATUSES = (
+    TaskStatus.SUCCESS.value,
+    TaskStatus.FAILED.value,
+    TaskStatus.PARTIAL_SUCCESS.value,
+)
 
 # # Create sync engine and sessionmaker
 # sync_engine = create_engine(
@@ -31,6 +69,48 @@ task_repository = TaskRepository()
 # SyncSession = sessionmaker(sync_engine, autoflush=False, autocommit=False)
 
 
+def _new_task_values(task_request: TaskRequest) -> dict:
+    """Return the validated column values of a new task, 400 on an invalid request."""
+    # Ensure query is provided
+    if not task_request.query:
+        raise HTTPException(status_code=400, detail="Query is required")
+
+    # Get the multi-agent framework and LLM model
+    multi_agent_framework = task_request.multi_agent_framework
+    llm_model = (
+        task_request.llm_model if task_request.llm_model else "openai-gpt-4o-mini"
+    )
+
+    # Validate multi-agent framework
+    if multi_agent_framework not in [
+        maf_name.value for maf_name in MultiAgentFrameworks.__members__.values()
+    ]:
+        logger.error(
+            "Received invalid multi-agent framework: %s", multi_agent_framework
+        )
+        raise HTTPException(
+            status_code=400, detail="Invalid multi-agent framework provided"
+        )
+
+    return {
+        "query": task_request.query,
+        "multi_agent_framework": multi_agent_framework,
+        "llm_model": llm_model,
+        "enable_internet": task_request.enable_internet,
+        "status": TaskStatus.CREATED.value,
+        # Read back by the scheduler and the LLM cache when the task is executed
+        "task_metadata": {
+            key: value
+            for key, value in {
+                "priority": task_request.priority,
+                "user_id": task_request.user_id,
+                "enable_llm_cache": task_request.enable_llm_cache,
+            }.items()
+            if value
+        },
+    }
+
+
 async def create_task(task_request: TaskRequest, db: AsyncSession) -> TaskResponse:
     """Create a task synchronously."""
     if task_request.task_id:
@@ -40,41 +120,13 @@ async def create_task(task_request: TaskRequest, db: AsyncSession) -> TaskRespon
             "llm_model": task_request.llm_model,
             "enable_internet": task_request.enable_internet,
         }
-        task_response = await update_task(task_request.task_id, update_data)
+        task_response = await update_task(task_request.task_id, update_data, db=db)
         logger.info(f"Task {task_request.task_id} updated")
         return task_response
     try:
-        # Ensure query is provided
-        if not task_request.query:
-            raise HTTPException(status_code=400, detail="Query is required")
-
-        # Get the multi-agent framework and LLM model
-        multi_agent_framework = task_request.multi_agent_framework
-        llm_model = (
-            task_request.llm_model if task_request.llm_model else "openai-gpt-4o-mini"
-        )
-
-        # Validate multi-agent framework
-        if multi_agent_framework not in [
-            maf_name.value for maf_name in MultiAgentFrameworks.__members__.values()
-        ]:
-            logger.error(
-                "Received invalid multi-agent framework: %s", multi_agent_framework
-            )
-            raise HTTPException(
-                status_code=400, detail="Invalid multi-agent framework provided"
-            )
-
         # Create the task instance
-        task = Task(
-            query=task_request.query,
-            multi_agent_framework=multi_agent_framework,
-            llm_model=llm_model,
-            enable_internet=task_request.enable_internet,
-            status=TaskStatus.CREATED.value,
-            task_metadata={}
-        )
-        created_task = await task_repository.create(task)
+        task = Task(**_new_task_values(task_request))
+        created_task = await task_repository.create(task, db)
 
         # async with db.acquire() as conn:
         #     async with conn.transaction():
@@ -125,7 +177,7 @@ async def start_task(task_id: str, background_tasks: BackgroundTasks, db: AsyncS
         #
         # # Fetch the first result
         # task = result.scalars().first()
-        task = await task_repository.get(task_id)
+        task = await task_repository.get(task_id, db)
         # task = db.query(Task).filter(Task.task_id == task_id).first()
         # async with db.acquire() as conn:
         #     task = await conn.fetchrow("SELECT * FROM tasks WHERE task_id = $1", task_id)
@@ -136,21 +188,42 @@ async def start_task(task_id: str, background_tasks: BackgroundTasks, db: AsyncS
             raise HTTPException(status_code=404, detail="Task not found")
         logger.info(f"Task with ID {task_id} found: {task}")
 
-        background_tasks.add_task(execute_task, task, db)
-        # await producer.send_job(job, KAFKA_TOPIC)
         # update_task_details(
         #     task_id=task_id, final_response=response, status=status, db=db
         # )
+        backend = settings.TASK_EXECUTION_BACKEND
+        if backend == TaskExecutionBackend.BACKGROUND.value:
+            # Tasks wait in this process' scheduler, shed load before accepting more
+            task_scheduler.check_admission()
+
         update_data = {
-            "status": TaskStatus.IN_PROGRESS.value,
+            "status": TaskStatus.QUEUED.value,
         }
-        await update_task(str(task_id), update_data)
+        await update_task(str(task_id), update_data, db=db)
+
+        # Mark the task queued before dispatching, so a fast worker's status updates
+        # are never overwritten by this request. It turns in progress once it gets a
+        # scheduler slot.
+        if backend == TaskExecutionBackend.POSTGRES.value:
+            # Durable queue: a separate `app.worker` process picks the task up
+            await task_queue_repository.enqueue(str(task.task_id), db=db)
+        elif backend == TaskExecutionBackend.KAFKA.value:
+            # Consumer group members in `app.worker` dispatch it to execute_task
+            job = KafkaTaskRequest(
+                task_id=str(task.task_id),
+                task_type=KafkaTaskType.EXECUTE_TASK.value,
+                payload={"multi_agent_framework": task.multi_agent_framework},
+            )
+            await producer.send_job(job, settings.KAFKA_TASK_TOPIC)
+        else:
+            # Runs after the response, once the request session is closed
+            background_tasks.add_task(execute_task, task)
         # await update_task_details(task_id, response, status, db)
 
         # Return the response from the framework
         task_response = TaskResponse(
             task_id=task.task_id.__str__(),
-            status=TaskStatus.IN_PROGRESS.value,
+            status=TaskStatus.QUEUED.value,
             task_request=TaskRequest(
                 query=task.query,
                 multi_agent_framework=task.multi_agent_framework,
@@ -176,7 +249,167 @@ async def start_task(task_id: str, background_tasks: BackgroundTasks, db: AsyncS
         raise HTTPException(status_code=500, detail="Failed to start task")
 
 
-async def execute_task(task: TaskResponse, db: AsyncSession):
+def _check_bulk_size(count: int):
+    if count > settings.TASK_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.TASK_BULK_MAX_ITEMS} tasks per request",
+        )
+
+
+async def create_tasks_bulk(
+    bulk_request: BulkTaskRequest, db: AsyncSession
+) -> BulkTaskResponse:
+    """Validate and create many tasks with multi-row ``INSERT ... RETURNING``.
+
+    Items are validated like ``create_task``; an invalid item is reported in its
+    result and does not stop the others. Updating existing tasks (``task_id``) is
+    not supported here.
+    """
+    _check_bulk_size(len(bulk_request.tasks))
+    results = []
+    rows = []
+    for index, task_request in enumerate(bulk_request.tasks):
+        result = BulkTaskItemResult(index=index)
+        results.append(result)
+        if task_request.task_id:
+            result.error = "task_id is not accepted, bulk requests only create tasks"
+            continue
+        try:
+            values = _new_task_values(task_request)
+        except HTTPException as e:
+            result.error = e.detail
+            continue
+        # Every row has the same keys, so the rows share multi-row INSERT batches.
+        # The id is a UUID like the RETURNING rows, or they cannot be matched back.
+        rows.append({"task_id": uuid4(), "input_file_names": [], **values})
+        result.task_id = str(rows[-1]["task_id"])
+
+    try:
+        created = await task_repository.create_many(rows, db) if rows else []
+    except SQLAlchemyError as db_err:
+        logger.exception("Database error during bulk task creation")
+        raise HTTPException(
+            status_code=500, detail="Database error occurred during task creation"
+        ) from db_err
+    statuses = {str(row.task_id): row.status for row in created}
+    for result in results:
+        if result.task_id is not None:
+            result.status = statuses[result.task_id]
+    logger.info(
+        f"Created {len(created)} tasks in bulk, "
+        f"{len(results) - len(created)} rejected"
+    )
+    return BulkTaskResponse(
+        succeeded=len(created), failed=len(results) - len(created), results=results
+    )
+
+
+async def _dispatch_tasks(
+    tasks: list[Task], background_tasks: BackgroundTasks, db: AsyncSession
+):
+    """Hand queued tasks to the TASK_EXECUTION_BACKEND in one batch."""
+    backend = settings.TASK_EXECUTION_BACKEND
+    if backend == TaskExecutionBackend.POSTGRES.value:
+        await task_queue_repository.enqueue_many(
+            [str(task.task_id) for task in tasks], db=db
+        )
+    elif backend == TaskExecutionBackend.KAFKA.value:
+        await producer.send_jobs(
+            [
+                KafkaTaskRequest(
+                    task_id=str(task.task_id),
+                    task_type=KafkaTaskType.EXECUTE_TASK.value,
+                    payload={"multi_agent_framework": task.multi_agent_framework},
+                )
+                for task in tasks
+            ],
+            settings.KAFKA_TASK_TOPIC,
+        )
+    else:
+        background_tasks.add_task(_execute_tasks, tasks)
+
+
+async def start_tasks_bulk(
+    bulk_request: BulkTaskStartRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession,
+) -> BulkTaskResponse:
+    """Queue many tasks with one ``UPDATE ... RETURNING``, dispatch them in one batch.
+
+    Tasks are dispatched like ``start_task`` for the TASK_EXECUTION_BACKEND: one
+    multi-row INSERT into the job queue, one batch of Kafka messages or one
+    background run. Unknown, malformed or repeated IDs are reported per item.
+    """
+    _check_bulk_size(len(bulk_request.task_ids))
+    results = [
+        BulkTaskItemResult(index=index, task_id=task_id)
+        for index, task_id in enumerate(bulk_request.task_ids)
+    ]
+    by_id: dict[str, BulkTaskItemResult] = {}
+    for result in results:
+        try:
+            task_id = str(UUID(result.task_id))
+        except ValueError:
+            result.error = "Invalid task ID"
+            continue
+        if task_id in by_id:
+            result.error = "Duplicate task ID"
+            continue
+        result.task_id = task_id
+        by_id[task_id] = result
+
+    try:
+        tasks = []
+        if by_id:
+            backend = settings.TASK_EXECUTION_BACKEND
+            if backend == TaskExecutionBackend.BACKGROUND.value:
+                task_scheduler.check_admission(len(by_id))
+            tasks = await task_repository.update_many(
+                list(by_id), {"status": TaskStatus.QUEUED.value}, db
+            )
+            # Dispatch in request order
+            order = {task_id: position for position, task_id in enumerate(by_id)}
+            tasks.sort(key=lambda task: order[str(task.task_id)])
+            await _dispatch_tasks(tasks, background_tasks, db)
+
+    except HTTPException:
+        logger.exception("HTTP Error starting tasks in bulk")
+        raise
+
+    except Exception as e:
+        logger.exception("Error starting tasks in bulk")
+        raise HTTPException(status_code=500, detail="Failed to start tasks") from e
+
+    for task in tasks:
+        by_id[str(task.task_id)].status = TaskStatus.QUEUED.value
+    for result in by_id.values():
+        if result.status is None:
+            result.error = "Task not found"
+    logger.info(
+        f"Started {len(tasks)} tasks in bulk, {len(results) - len(tasks)} rejected"
+    )
+    return BulkTaskResponse(
+        succeeded=len(tasks), failed=len(results) - len(tasks), results=results
+    )
+
+
+async def _execute_tasks(tasks: list[Task]):
+    """Run tasks started together concurrently, the scheduler bounds how many run."""
+    outcomes = await asyncio.gather(
+        *(execute_task(task) for task in tasks), return_exceptions=True
+    )
+    for task, outcome in zip(tasks, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"Error executing task with ID {task.task_id}: {outcome!s}")
+
+
+async def execute_task(task: TaskResponse):
+    """Run the task with its multi-agent framework and store the outcome.
+
+    Executions run for minutes: they use short-lived sessions per update instead of
+    pinning a pooled connection for their whole duration.
+    """
     logger.info(f"Executing task with ID {task.task_id} in background. MAS Framework: {task.multi_agent_framework}")
     # Initialize the corresponding framework based on the task's multi_agent_framework
     if task.multi_agent_framework == MultiAgentFrameworks.MAGENTIC_ONE.value:
@@ -195,6 +428,26 @@ async def execute_task(task: TaskResponse, db: AsyncSession):
         raise HTTPException(
             status_code=400, detail="Unsupported multi-agent framework"
         )
+    # Identical submissions take the result of a running or fresh identical task
+    async with task_deduplicator.deduplicate(task) as shared:
+        if shared is not None:
+            logger.info(
+                f"Task with ID {task.task_id} {shared.mode} the result of task "
+                f"{shared.source.task_id}"
+            )
+            await update_task(
+                task.task_id,
+                {
+                    "status": TaskStatus.SUCCESS.value,
+                    "final_response": shared.source.final_response,
+                },
+                metadata_patch={"dedupe": shared.metadata()},
+            )
+            return
+        await _run_task(task, maf)
+
+
+async def _run_task(task: TaskResponse, maf):
     # Create the request object for the agentic task
     agentic_task_request = AgenticTaskRequest(
         task_id=task.task_id.__str__(),
@@ -203,47 +456,77 @@ async def execute_task(task: TaskResponse, db: AsyncSession):
         enable_internet=task.enable_internet,
     )
     if task.input_file_names:
-        local_file_dir = os.path.join("uploads", task.task_id.__str__())
-        # os.makedirs(local_file_dir, exist_ok=True)
-        agentic_task_request.files=[LLMFileInput(file_name=_file, file_local_path=f"{local_file_dir}/{_file}") for _file in
-               task.input_file_names] if task.input_file_names else None
-
-    # Start the task via the framework and capture the response
-    # response, status = await maf.start_task(agentic_task_request)
-    task_response: TaskResponse = await maf.start_task(agentic_task_request)
+        # Task files are links to their blobs, fetched from the store if needed
+        stored_files = (task.task_metadata or {}).get("input_files", {})
+        agentic_task_request.files = [
+            await blob_store.resolve(
+                task.task_id, file_name, stored_files.get(file_name)
+            )
+            for file_name in task.input_file_names
+        ]
+
+    async def on_queued(position: int):
+        logger.info(f"Task with ID {task.task_id} queued at position {position}")
+        await event_hub.publish(
+            task.task_id,
+            TaskEventType.STATUS.value,
+            {"status": TaskStatus.QUEUED.value, "queue_position": position},
+        )
+
+    scheduling = task.task_metadata or {}
+    async with task_scheduler.slot(
+        task.task_id,
+        framework=task.multi_agent_framework,
+        model=task.llm_model,
+        scheduling=scheduling,
+        on_queued=on_queued,
+    ):
+        await update_task(task.task_id, {"status": TaskStatus.IN_PROGRESS.value})
+        # Start the task via the framework and capture the response
+        # response, status = await maf.start_task(agentic_task_request)
+        with use_llm_cache(scheduling.get("enable_llm_cache", False)):
+            task_response: TaskResponse = await maf.start_task(agentic_task_request)
     logger.info(f"Task with ID {task.task_id} finished. Status: {task_response.status}\n"
                 f"Response: {task_response.task_output.final_response if task_response.task_output else None}")
     update_data = {
         "status": task_response.status,
         "final_response": task_response.task_output.final_response if task_response.task_output else None,
-        "task_metadata": task_response.task_metadata,
     }
-    await update_task(task.task_id, update_data)
-
-def get_web_surfer_url(task: Task):
-    web_surfer_url = None
-    if task.multi_agent_framework == MultiAgentFrameworks.AM1.value and task.enable_internet and task.task_metadata:
-        browser_use_task_id = task.task_metadata.get("browser_use_task_id")
-        if browser_use_task_id:
-            logger.info(f"Task is using BrowserUse framework: {browser_use_task_id} | {task.task_id} ")
-            web_surfer_url = task.task_metadata.get("web_surfer_url")
-            if web_surfer_url:
-                logger.info(f"Web Surfer URL found in task metadata: {web_surfer_url}")
-                return web_surfer_url
-            browser_use = BrowserUse()
-            browser_use_task_response = browser_use.get_task_details(browser_use_task_id)
-            print(f"BrowserUse task response: {browser_use_task_response}")
-            web_surfer_url = browser_use_task_response.get("live_url")
-        else:
-            logger.error(f"BrowserUse task ID not found in task metadata: {task.task_id}")
-            return None
+    # Merge rather than overwrite, metadata may have been patched while the task ran
+    await update_task(
+        task.task_id, update_data, metadata_patch=task_response.task_metadata
+    )
+
+def get_web_surfer_url(task: Task) -> str | None:
+    """Live URL of a task, from the cache or task metadata; never waits on BrowserUse.
+
+    A running AM1 task whose URL is not known yet gets a background lookup scheduled,
+    later reads (and the task's event stream) pick up the result.
+    """
+    if not (
+        task.multi_agent_framework == MultiAgentFrameworks.AM1.value
+        and task.enable_internet
+        and task.task_metadata
+    ):
+        return None
+    browser_use_task_id = task.task_metadata.get("browser_use_task_id")
+    if not browser_use_task_id:
+        logger.error(f"BrowserUse task ID not found in task metadata: {task.task_id}")
+        return None
+    web_surfer_url = browser_use_live_urls.get(task.task_id)
+    if web_surfer_url is None:
+        web_surfer_url = task.task_metadata.get("web_surfer_url")
+    if web_surfer_url is None and task.status not in TERMINAL_TASK_STATUSES:
+        browser_use_live_urls.refresh(task.task_id, browser_use_task_id)
     return web_surfer_url
 
-async def get_task_details(task_id: str) -> TaskResponse:
+async def get_task_details(
+    task_id: str, db: AsyncSession | None = None
+) -> TaskResponse:
     """Retrieve a task by its ID asynchronously."""
     try:
         # Retrieve the task by ID
-        task: type[Task] | None = await task_repository.get(task_id)
+        task: type[Task] | None = await task_repository.get(task_id, db)
 
         if task is None:
             logger.warning(f"Task with ID {task_id} not found.")
@@ -271,6 +554,11 @@ async def get_task_details(task_id: str) -> TaskResponse:
             ),
             input_file_names=task.input_file_names,
             task_metadata=task.task_metadata,
+            queue_position=(
+                task_scheduler.queue_position(task_id)
+                if task.status == TaskStatus.QUEUED.value
+                else None
+            ),
             created_at=task.created_at.isoformat() if task.created_at else None,
             updated_at=task.updated_at.isoformat() if task.updated_at else None,
         )
@@ -289,7 +577,12 @@ async def get_all_tasks(offset: int, limit: int, db: AsyncSession) -> list[TaskR
         #     tasks = [dict(row) for row in results]
         #     logger.info(f"Fetched {len(tasks)} tasks from database.")
         #     return tasks
-        sql_query = select(Task).offset(offset).limit(limit)
+        sql_query = (
+            select(Task)
+            .order_by(Task.created_at.desc(), Task.task_id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
         result = await db.execute(sql_query)
         items = result.scalars().all()
         tasks_list = [
@@ -324,6 +617,62 @@ async def get_all_tasks(offset: int, limit: int, db: AsyncSession) -> list[TaskR
         return {"error": "Failed to fetch tasks", "message": str(e)}
 
 
+def _encode_cursor(created_at: datetime, task_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), str(task_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), str(task_id)
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Invalid task list cursor {cursor!r}: {e!s}")
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def list_tasks(
+    limit: int,
+    cursor: str | None = None,
+    filters: TaskListFilters | None = None,
+    db: AsyncSession | None = None,
+) -> TaskPage:
+    """List task summaries newest first, one keyset page at a time.
+
+    Unlike ``get_all_tasks`` the cost of a page does not grow with its depth, and
+    neither final responses, metadata nor live URLs are loaded.
+    """
+    rows = await task_repository.list_summaries(
+        limit=limit + 1,
+        after=_decode_cursor(cursor) if cursor else None,
+        filters=(
+            {k: v for k, v in filters.model_dump().items() if v} if filters else None
+        ),
+        db=db,
+    )
+    # The extra row only tells whether there is a next page
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        TaskSummary(
+            task_id=str(row.task_id),
+            status=row.status,
+            query=row.query,
+            multi_agent_framework=row.multi_agent_framework,
+            llm_model=row.llm_model,
+            enable_internet=row.enable_internet,
+            created_at=row.created_at,
+            updated_at=row.updated_at,
+        )
+        for row in rows
+    ]
+    next_cursor = (
+        _encode_cursor(rows[-1].created_at, rows[-1].task_id) if has_more else None
+    )
+    logger.info(f"Listed {len(items)} tasks | cursor: {cursor}, has more: {has_more}")
+    return TaskPage(items=items, next_cursor=next_cursor)
+
+
 # async def get_all_tasks_old_v2(offset: int, limit: int, db: AsyncSession):
 #     """Retrieve all tasks asynchronously with pagination."""
 #     try:
@@ -468,8 +817,16 @@ async def get_all_tasks(offset: int, limit: int, db: AsyncSession) -> list[TaskR
 #         raise HTTPException(status_code=500, detail="Failed to update task")
 
 
-async def update_task(task_id: str, update_data: dict) -> TaskResponse:
-    updated_task = await task_repository.update(task_id=task_id, update_data=update_data)
+async def update_task(
+    task_id: str,
+    update_data: dict,
+    metadata_patch: dict | None = None,
+    db: AsyncSession | None = None,
+) -> TaskResponse:
+    """Update the task and publish the final answer and status changes."""
+    updated_task = await task_repository.update(
+        task_id=task_id, update_data=update_data, metadata_patch=metadata_patch, db=db
+    )
     task_response = TaskResponse(
         task_id=str(updated_task.task_id),
         status=updated_task.status,
@@ -489,26 +846,224 @@ async def update_task(task_id: str, update_data: dict) -> TaskResponse:
         updated_at=updated_task.updated_at.isoformat() if updated_task.updated_at else None,
     )
     logger.info(f"Updated task with ID {task_id} from database | {task_response}")
+    # Final answer goes out before the status, streams stop on a terminal status
+    if update_data.get("final_response"):
+        await event_hub.publish(
+            task_id,
+            TaskEventType.FINAL_ANSWER.value,
+            {"final_response": updated_task.final_response},
+        )
+    if "status" in update_data:
+        await event_hub.publish(
+            task_id, TaskEventType.STATUS.value, {"status": updated_task.status}
+        )
     return task_response
 
-async def upload_file_to_task(task_id: str, input_file: UploadFile) -> TaskResponse:
-    # return TaskResponse(task_id=task_id, input_file_names=[input_file.filename])
-    # Fetch the task from the database
-    task_response: TaskResponse = await get_task_details(task_id)
-    if input_file.filename in task_response.input_file_names:
+
+async def stream_task_events(task_id: str, request: Request) -> AsyncIterator[str]:
+    """Open a server-sent-events stream of a task's progress.
+
+    The stream starts with a snapshot of the task and then relays events from the hub
+    until the task reaches a terminal status or the client disconnects.
+    """
+    # Subscribe before reading the snapshot so no event falls in between
+    subscription = event_hub.subscribe(task_id)
+    queue = await subscription.__aenter__()
+    try:
+        task = await task_repository.get(task_id)
+    except Exception:
+        await subscription.__aexit__(None, None, None)
+        raise
+    if task is None:
+        await subscription.__aexit__(None, None, None)
+        logger.warning(f"Task with ID {task_id} not found for event stream.")
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _task_event_stream(task, queue, subscription, request)
+
+
+async def _task_event_stream(
+    task: Task, queue: asyncio.Queue, subscription, request: Request
+):
+    try:
+        snapshot = TaskEvent(
+            task_id=str(task.task_id),
+            event=TaskEventType.STATUS.value,
+            data={
+                "status": task.status,
+                "web_surfer_url": (task.task_metadata or {}).get("web_surfer_url"),
+                "final_response": task.final_response,
+            },
+        )
+        yield format_sse(snapshot)
+        if task.status in TERMINAL_TASK_STATUSES:
+            return
+
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), timeout=settings.EVENT_STREAM_KEEPALIVE_SECONDS
+                )
+            except TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
+            if (
+                event.event == TaskEventType.STATUS.value
+                and event.data.get("status") in TERMINAL_TASK_STATUSES
+            ):
+                return
+    finally:
+        await subscription.__aexit__(None, None, None)
+
+async def upload_file_to_task(
+    task_id: str, input_file: UploadFile, db: AsyncSession | None = None
+) -> TaskResponse:
+    """Attach one uploaded file to the task, see ``upload_files_to_task``."""
+    return await upload_files_to_task(task_id, [input_file], db)
+
+
+async def _discard_uploads(stored_files: list[StoredUpload], referenced: bool):
+    """Drop the staged files of a failed upload and their blob references."""
+    if referenced:
+        await blob_store.release([stored.sha256 for stored in stored_files])
+    for stored in stored_files:
+        await asyncio.to_thread(stored.discard)
+
+
+async def upload_files_to_task(
+    task_id: str, input_files: list[UploadFile], db: AsyncSession | None = None
+) -> TaskResponse:
+    """Stream files into the blob store and record them on the task.
+
+    Files are written in chunks (constant memory), hashed on the way and checked
+    against the size limits. Contents already in the blob store are not stored again.
+    Names are appended in one atomic UPDATE; sizes and SHA-256 digests go to
+    ``task_metadata.input_files``.
+    """
+    if not input_files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(input_files) > settings.UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.UPLOAD_MAX_FILES} files per upload",
+        )
+    file_names = await _check_new_file_names(
+        task_id, [input_file.filename for input_file in input_files], db
+    )
+
+    budget = settings.UPLOAD_MAX_REQUEST_BYTES
+    stored_files = []
+    referenced = False
+    try:
+        for input_file, file_name in zip(input_files, file_names):
+            stored = await stream_to_disk(
+                input_file, file_name, blob_store.staging_dir, budget
+            )
+            stored_files.append(stored)
+            budget -= stored.size
+        await blob_store.store(
+            {stored.part_path: (stored.sha256, stored.size) for stored in stored_files},
+            db,
+        )
+        referenced = True
+        updated_task = await task_repository.append_input_files(
+            task_id,
+            {stored.file_name: stored.metadata() for stored in stored_files},
+            db,
+        )
+    except BaseException:
+        await _discard_uploads(stored_files, referenced)
+        raise
+    if updated_task is None:
+        # Another upload recorded one of the names meanwhile
+        await _discard_uploads(stored_files, referenced)
         raise HTTPException(status_code=400, detail="File already uploaded to task")
+    logger.info(
+        f"Uploaded {len(stored_files)} files to task with ID {task_id} successfully."
+    )
+    await blob_store.preprocess(
+        {stored.file_name: stored.sha256 for stored in stored_files}
+    )
+    return _file_task_response(updated_task)
+
+
+async def attach_files_by_hash(
+    task_id: str, files: list[TaskFileReference], db: AsyncSession | None = None
+) -> TaskFileAttachResponse:
+    """Add files to a task by SHA-256, without uploading contents the store already has.
+
+    Files whose contents are stored are recorded at once; the others are returned as
+    ``missing`` and have to be uploaded.
+    """
+    file_names = await _check_new_file_names(
+        task_id, [file.file_name for file in files], db
+    )
+    hashes = dict(zip(file_names, (file.sha256.lower() for file in files)))
+    sizes = await blob_store.reference(list(hashes.values()), db)
+    found = {name: sha256 for name, sha256 in hashes.items() if sha256 in sizes}
+    missing = [name for name in file_names if name not in found]
+    task = None
+    if found:
+        try:
+            task = await task_repository.append_input_files(
+                task_id,
+                {
+                    name: {"size": sizes[sha256], "sha256": sha256}
+                    for name, sha256 in found.items()
+                },
+                db,
+            )
+        except BaseException:
+            await blob_store.release(list(found.values()))
+            raise
+        if task is None:
+            await blob_store.release(list(found.values()))
+            raise HTTPException(status_code=400, detail="File already uploaded to task")
+        logger.info(
+            f"Attached {len(found)} stored files to task with ID {task_id} by hash."
+        )
+        # Converted already if the content was uploaded before, otherwise done now
+        await blob_store.preprocess(found)
+    return TaskFileAttachResponse(
+        task_id=task_id,
+        attached=list(found),
+        missing=missing,
+        input_file_names=task.input_file_names if task is not None else [],
+    )
+
+
+async def _check_new_file_names(
+    task_id: str, file_names: list[str | None], db: AsyncSession | None
+) -> list[str]:
+    """Safe names of files to add to a task.
 
-    input_file_names = task_response.input_file_names + [input_file.filename] if task_response.input_file_names else [input_file.filename]
+    Raises a 400 on duplicate names and a 404 if the task is missing.
+    """
+    names = [safe_file_name(file_name) for file_name in file_names]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Duplicate file names in upload")
+    task = await task_repository.get(task_id, db)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if set(names) & set(task.input_file_names or []):
+        raise HTTPException(status_code=400, detail="File already uploaded to task")
+    return names
 
-    # Create a folder with name task_id and save the file
-    folder_path = os.path.join("uploads", task_id)
-    os.makedirs(folder_path, exist_ok=True)
 
-    # Save the file in the created folder
-    file_path = os.path.join(folder_path, input_file.filename)
-    with open(file_path, "wb") as file:
-        file.write(await input_file.read())
-        updated_task_response: TaskResponse = await update_task(task_id=task_id,
-                                 update_data={"input_file_names": input_file_names})
-        logger.info(f"Uploaded task with ID {task_id} successfully.")
-        return updated_task_response
+def _file_task_response(task: Task) -> TaskResponse:
+    return TaskResponse(
+        task_id=str(task.task_id),
+        status=task.status,
+        task_request=TaskRequest(
+            query=task.query,
+            multi_agent_framework=task.multi_agent_framework,
+            llm_model=task.llm_model,
+            enable_internet=task.enable_internet,
+        ),
+        input_file_names=task.input_file_names,
+        task_metadata=task.task_metadata,
+        created_at=task.created_at.isoformat() if task.created_at else None,
+        updated_at=task.updated_at.isoformat() if task.updated_at else None,
+    )
@@ -0,0 +1,140 @@
+"""Worker draining the Postgres job queue, run by ``python -m app.worker``."""
+
+import asyncio
+import os
+import socket
+import uuid
+
+from app.core.enums import JobStatus, TaskStatus
+from app.core.exceptions import TaskNotFoundError
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.models.task import TaskJob
+from app.repository.task_queue_repository import TaskQueueRepository
+from app.repository.task_repository import TaskRepository
+from app.services import task_service
+
+
+class TaskWorker:
+    """Drains the ``task_jobs`` queue and runs each claimed task via ``execute_task``.
+
+    Several workers (processes or hosts) can run side by side; row locking in
+    ``TaskQueueRepository.claim`` keeps them from picking the same job. Each running
+    job is kept alive by a heartbeat that extends its lease. If the lease is lost, the
+    execution is cancelled because another worker has taken the job over.
+    """
+
+    def __init__(self, worker_id: str | None = None, concurrency: int | None = None):
+        """Defaults to a unique worker id and TASK_WORKER_CONCURRENCY jobs at once."""
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        )
+        self.concurrency = concurrency or settings.TASK_WORKER_CONCURRENCY
+        self.lease_seconds = settings.TASK_QUEUE_LEASE_SECONDS
+        self.heartbeat_seconds = settings.TASK_QUEUE_HEARTBEAT_SECONDS
+        self.poll_seconds = settings.TASK_QUEUE_POLL_SECONDS
+        self.queue_repository = TaskQueueRepository()
+        self.task_repository = TaskRepository()
+        self.logger = get_logger()
+        self._running = False
+        self._active: set[asyncio.Task] = set()
+
+    async def run(self):
+        """Claim and execute jobs until ``stop`` is called, then drain running jobs."""
+        self._running = True
+        self.logger.info(
+            f"Task worker {self.worker_id} started | concurrency: {self.concurrency}, "
+            f"lease: {self.lease_seconds}s, heartbeat: {self.heartbeat_seconds}s"
+        )
+        while self._running:
+            try:
+                await self._reap_expired()
+                claimed = await self._fill_slots()
+            except Exception:
+                self.logger.exception(f"Task worker {self.worker_id} poll failed")
+                claimed = 0
+            if not claimed:
+                await asyncio.sleep(self.poll_seconds)
+
+        if self._active:
+            self.logger.info(
+                f"Task worker {self.worker_id} waiting for "
+                f"{len(self._active)} running jobs"
+            )
+            await asyncio.gather(*self._active, return_exceptions=True)
+        self.logger.info(f"Task worker {self.worker_id} stopped")
+
+    def stop(self):
+        """Stop claiming jobs, ``run`` returns once the running ones finished."""
+        self._running = False
+
+    async def _fill_slots(self) -> int:
+        claimed = 0
+        while self._running and len(self._active) < self.concurrency:
+            job = await self.queue_repository.claim(self.worker_id, self.lease_seconds)
+            if job is None:
+                break
+            running_job = asyncio.create_task(self._process(job))
+            self._active.add(running_job)
+            running_job.add_done_callback(self._active.discard)
+            claimed += 1
+        return claimed
+
+    async def _process(self, job: TaskJob):
+        job_id, task_id = str(job.job_id), str(job.task_id)
+        execution = asyncio.create_task(self._execute(task_id))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, execution))
+        try:
+            await execution
+        except asyncio.CancelledError:
+            self.logger.warning(
+                f"Job {job_id} for task {task_id} cancelled on worker {self.worker_id}"
+            )
+            return
+        except Exception as e:
+            self.logger.exception(f"Job {job_id} for task {task_id} failed")
+            failed_job = await self.queue_repository.fail(
+                job_id, self.worker_id, str(e)
+            )
+            if failed_job and failed_job.status == JobStatus.FAILED.value:
+                await self._mark_task_failed(task_id)
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self.queue_repository.complete(job_id, self.worker_id)
+        self.logger.info(f"Job {job_id} for task {task_id} completed")
+
+    async def _execute(self, task_id: str):
+        task = await self.task_repository.get(task_id)
+        if task is None:
+            raise TaskNotFoundError(task_id)
+        await task_service.execute_task(task)
+
+    async def _heartbeat(self, job_id: str, execution: asyncio.Task):
+        while not execution.done():
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                owned = await self.queue_repository.heartbeat(
+                    job_id, self.worker_id, self.lease_seconds
+                )
+            except Exception:
+                self.logger.exception(f"Heartbeat for job {job_id} failed")
+                continue
+            if not owned:
+                self.logger.error(
+                    f"Worker {self.worker_id} lost the lease on job {job_id}; "
+                    "cancelling"
+                )
+                execution.cancel()
+                return
+
+    async def _reap_expired(self):
+        for job in await self.queue_repository.reap_expired():
+            await self._mark_task_failed(str(job.task_id))
+
+    async def _mark_task_failed(self, task_id: str):
+        try:
+            await task_service.update_task(task_id, {"status": TaskStatus.FAILED.value})
+        except Exception:
+            self.logger.exception(f"Could not mark task {task_id} as failed")
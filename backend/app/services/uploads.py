@@ -0,0 +1,91 @@
+"""Streaming of uploaded files to the staging folder of the blob store."""
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import uuid
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.settings import settings
+
+
+class StoredUpload:
+    """An uploaded file staged on disk, until the blob store takes it over."""
+
+    def __init__(self, file_name: str, part_path: str):
+        """Stage ``file_name`` at ``part_path``, size and digest follow the write."""
+        self.file_name = file_name
+        self.part_path = part_path
+        self.size = 0
+        self.sha256 = ""
+
+    def discard(self):
+        """Remove the staged file, if still there."""
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.part_path)
+
+    def metadata(self) -> dict:
+        """Size and digest recorded in ``task_metadata.input_files``."""
+        return {"size": self.size, "sha256": self.sha256}
+
+
+def safe_file_name(file_name: str | None) -> str:
+    """Return the base name of an upload, reject names leaving the task folder."""
+    name = os.path.basename((file_name or "").replace("\\", "/")).strip()
+    if not name or name in (".", "..") or name.startswith(".") or "\0" in name:
+        raise HTTPException(status_code=400, detail=f"Invalid file name: {file_name!r}")
+    return name
+
+
+def _check_size(file_name: str, size: int, limit: int):
+    if size > limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{file_name} exceeds the upload size limit of {limit} bytes",
+        )
+
+
+def _write_chunk(file: BinaryIO, digest, chunk: bytes):
+    digest.update(chunk)
+    file.write(chunk)
+
+
+async def stream_to_disk(
+    upload: UploadFile, file_name: str, folder: str, budget: int
+) -> StoredUpload:
+    """Copy an upload to ``folder`` chunk by chunk, hashing it on the way.
+
+    Reads and writes happen in worker threads one chunk at a time, so memory stays at
+    one chunk whatever the file size. The file is written to a ``.part`` file that
+    the caller hands to the blob store.
+
+    Args:
+        upload (UploadFile): The uploaded file (spooled by Starlette).
+        file_name (str): Safe name of the file in the task.
+        folder (str): Staging folder, created if missing.
+        budget (int): Bytes left of the request's limit.
+
+    Returns:
+        StoredUpload: Size and SHA-256 of the written file.
+
+    """
+    os.makedirs(folder, exist_ok=True)
+    stored = StoredUpload(file_name, os.path.join(folder, f"{uuid.uuid4().hex}.part"))
+    limit = min(settings.UPLOAD_MAX_FILE_BYTES, budget)
+    digest = hashlib.sha256()
+    try:
+        with await asyncio.to_thread(open, stored.part_path, "wb") as file:
+            while chunk := await upload.read(settings.UPLOAD_CHUNK_BYTES):
+                stored.size += len(chunk)
+                _check_size(file_name, stored.size, limit)
+                await asyncio.to_thread(_write_chunk, file, digest, chunk)
+    except BaseException:
+        await asyncio.to_thread(stored.discard)
+        raise
+    finally:
+        await upload.close()
+    stored.sha256 = digest.hexdigest()
+    return stored
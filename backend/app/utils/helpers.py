@@ -0,0 +1,25 @@
+"""Small helpers shared by the services."""
+
+import os
+from collections.abc import Iterator
+
+
+def read_lines_backwards(path: str, block_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield the lines of a file from last to first, without their line endings.
+
+    The file is read in blocks from its end, so memory is bounded by the block size
+    plus the longest line, and stopping early never touches the start of the file.
+    """
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        partial = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + partial).split(b"\n")
+            # The first piece may continue in the previous block
+            partial = lines.pop(0)
+            for line in reversed(lines):
+                yield line.rstrip(b"\r")
+        yield partial.rstrip(b"\r")
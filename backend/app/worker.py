@@ -0,0 +1,83 @@
+"""Standalone task worker process.
+
+Run one or more of these next to the API when ``TASK_EXECUTION_BACKEND`` is
+``postgres`` (drains the task_jobs table) or ``kafka`` (joins the
+KAFKA_CONSUMER_GROUP on KAFKA_TASK_TOPIC):
+
+    python -m app.worker
+"""
+
+import asyncio
+import signal
+
+from app.core.enums import TaskExecutionBackend
+from app.core.logging import get_logger
+from app.core.settings import settings
+from app.db.database import sessionmanager
+from app.services.document_preprocessor import document_preprocessor
+from app.services.event_hub import event_hub
+from app.services.kafka.consumer import create_task_consumer
+from app.services.llm_cache import llm_response_cache
+from app.services.llm_clients import llm_client_registry
+from app.services.maf.impl.magentic_one import magentic_one_pool, warm_up_pool
+from app.services.maf.sync_executor import sync_task_executor
+from app.services.task_worker import TaskWorker
+
+logger = get_logger()
+
+
+async def run_queue_worker():
+    """Drain the Postgres job queue until SIGINT/SIGTERM."""
+    worker = TaskWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+async def run_kafka_consumer():
+    """Consume the task topic until SIGINT/SIGTERM, then let running jobs finish."""
+    consumer = create_task_consumer()
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    await consumer.start()
+    consuming = asyncio.create_task(consumer.consume())
+    await stopped.wait()
+    consumer.running = False
+    await consuming
+    await consumer.stop()
+
+
+async def main():
+    """Run the worker of TASK_EXECUTION_BACKEND and clean up once it stops."""
+    sessionmanager.init()
+    # Workers publish progress; use EVENT_HUB_BACKEND=postgres so the API sees it
+    await event_hub.start()
+    backend = settings.TASK_EXECUTION_BACKEND
+    logger.info(f"Starting worker for backend: {backend}")
+    warming_up = None
+    if settings.MAGENTIC_ONE_POOL_MIN_SIZE:
+        warming_up = asyncio.create_task(warm_up_pool())
+    try:
+        if backend == TaskExecutionBackend.KAFKA.value:
+            await run_kafka_consumer()
+        else:
+            await run_queue_worker()
+    finally:
+        sync_task_executor.shutdown()
+        if warming_up is not None:
+            warming_up.cancel()
+        # Tasks run here whatever the pool size, close their runtimes and clients
+        await magentic_one_pool.close()
+        await llm_client_registry.close()
+        llm_response_cache.close()
+        document_preprocessor.shutdown()
+        await event_hub.stop()
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
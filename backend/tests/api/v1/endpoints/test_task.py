@@ -0,0 +1,72 @@
+"""Task endpoints through the ASGI app, against Postgres (see ``tests/conftest.py``)."""
+
+import httpx
+
+from app.db.database import sessionmanager
+from app.main import app
+from app.repository.task_repository import TaskRepository
+
+
+def test_create_and_upload_check_out_one_connection_each(run_with_db):
+    """Each request checks out one pooled connection, however many queries it runs."""
+
+    async def requests():
+        checkouts = []
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://test")
+        async with client:
+            before = sessionmanager.pool_checkouts
+            response = await client.post(
+                "/task/",
+                json={
+                    "query": "pool checkouts",
+                    "multi_agent_framework": "AM1",
+                    "enable_internet": False,
+                },
+            )
+            checkouts.append(sessionmanager.pool_checkouts - before)
+            assert response.status_code == httpx.codes.CREATED, response.text
+            task_id = response.json()["task_id"]
+            try:
+                before = sessionmanager.pool_checkouts
+                response = await client.post(
+                    f"/task/{task_id}/upload",
+                    files={"input_file": ("notes.txt", b"notes", "text/plain")},
+                )
+                checkouts.append(sessionmanager.pool_checkouts - before)
+                assert response.status_code == httpx.codes.OK, response.text
+                assert response.json()["input_file_names"] == ["notes.txt"]
+            finally:
+                await TaskRepository().delete(task_id)
+        return checkouts
+
+    # The request session holds one connection for every repository call it makes
+    assert run_with_db(requests) == [1, 1]
+
+
+def test_bulk_create_returns_a_result_per_item(run_with_db):
+    """Created rows are matched back to their items, invalid items are reported."""
+    task = {"query": "bulk", "multi_agent_framework": "AM1", "enable_internet": False}
+
+    async def create():
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://test")
+        async with client:
+            response = await client.post(
+                "/task/bulk", json={"tasks": [task, {**task, "query": ""}, task]}
+            )
+        body = response.json()
+        for result in body["results"]:
+            if result["task_id"]:
+                await TaskRepository().delete(result["task_id"])
+        return response.status_code, body
+
+    status_code, body = run_with_db(create)
+
+    assert status_code == httpx.codes.CREATED, body
+    assert (body["succeeded"], body["failed"]) == (2, 1)
+    assert [result["error"] for result in body["results"]] == [
+        None,
+        "Query is required",
+        None,
+    ]
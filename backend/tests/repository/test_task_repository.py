@@ -0,0 +1,100 @@
+"""TaskRepository against Postgres, see ``tests/conftest.py``."""
+
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import func, update
+
+from app.core.enums import TaskDedupeMode, TaskStatus
+from app.db.database import sessionmanager
+from app.models.task import Task
+from app.repository.task_repository import TaskRepository
+
+WRITERS = 100
+LEASE_SECONDS = 120
+
+
+def new_task(query: str) -> Task:
+    """Unsaved task with some metadata already set."""
+    return Task(
+        query=query,
+        multi_agent_framework="AM1",
+        llm_model="test",
+        enable_internet=False,
+        status=TaskStatus.CREATED.value,
+        task_metadata={"kept": True},
+    )
+
+
+def test_concurrent_patch_metadata_keeps_every_key(run_with_db):
+    """Concurrent writers of different keys never overwrite each other."""
+    repository = TaskRepository()
+
+    async def patch_concurrently():
+        task = await repository.create(new_task("concurrent patch_metadata"))
+        task_id = str(task.task_id)
+        try:
+            await asyncio.gather(
+                *(
+                    # Top-level and nested keys, the parent is created on the fly
+                    repository.patch_metadata(
+                        task_id, f"key_{i}" if i % 2 else ["nested", f"key_{i}"], i
+                    )
+                    for i in range(WRITERS)
+                )
+            )
+            return (await repository.get(task_id)).task_metadata
+        finally:
+            await repository.delete(task_id)
+
+    metadata = run_with_db(patch_concurrently)
+
+    assert metadata["kept"] is True
+    for i in range(WRITERS):
+        if i % 2:
+            assert metadata[f"key_{i}"] == i
+        else:
+            assert metadata["nested"][f"key_{i}"] == i
+
+
+def test_running_leaders_are_found_while_they_heartbeat(run_with_db):
+    """A leader not updated within the lease is dead, ``touch`` keeps it alive."""
+    repository = TaskRepository()
+    running = (TaskStatus.IN_PROGRESS.value,)
+
+    async def find_after_silence():
+        task = await repository.create(new_task("dedupe heartbeat"))
+        task_id = str(task.task_id)
+        fingerprint = f"fingerprint-{task_id}"
+        try:
+            await repository.patch_metadata(
+                task_id,
+                "dedupe",
+                {"fingerprint": fingerprint, "mode": TaskDedupeMode.LEADER.value},
+            )
+            async with sessionmanager.session() as session:
+                # The leader's process died ten minutes ago
+                await session.execute(
+                    update(Task)
+                    .where(Task.task_id == task_id)
+                    .values(
+                        status=TaskStatus.IN_PROGRESS.value,
+                        updated_at=func.now() - timedelta(minutes=10),
+                    )
+                )
+                await session.commit()
+            found = []
+            for _ in range(2):
+                leader = await repository.find_dedupe_leader(
+                    fingerprint,
+                    running,
+                    "00000000-0000-0000-0000-000000000000",
+                    updated_within_seconds=LEASE_SECONDS,
+                )
+                found.append(leader is not None)
+                assert await repository.touch(task_id)
+            return found
+        finally:
+            await repository.delete(task_id)
+
+    assert run_with_db(find_after_silence) == [False, True]
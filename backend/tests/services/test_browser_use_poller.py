@@ -0,0 +1,146 @@
+"""BrowserUse poller against a fake BrowserUse API (httpx.MockTransport)."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.maf.impl.am1 import BrowserUse, BrowserUsePoller
+
+MAX_POLL_ERRORS = 3
+
+
+class FakeBrowserUse:
+    """BrowserUse API answering ``/task/{id}/status`` and ``/task/{id}`` in memory."""
+
+    def __init__(
+        self, statuses: list, details: dict | None = None, steps: list | None = None
+    ):
+        """Answer ``statuses`` in order, the last one repeats.
+
+        An int is returned as an error with that status code. ``steps`` are the step
+        lists of successive detail fetches, the last one repeats.
+        """
+        self.statuses = list(statuses)
+        self.details = details or {}
+        self.steps = list(steps or [])
+        self.status = "running"
+        self.requests: list[str] = []
+
+    @staticmethod
+    def _next(answers: list):
+        """Next of ``answers``, the last one repeats."""
+        answer = answers[0]
+        if len(answers) > 1:
+            answers.pop(0)
+        return answer
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        """MockTransport handler."""
+        self.requests.append(request.url.path)
+        if request.url.path.endswith("/status"):
+            status = self._next(self.statuses)
+            if isinstance(status, int):
+                return httpx.Response(status, json={"detail": "error"})
+            self.status = status
+            return httpx.Response(200, json=status)
+        details = {**self.details, "status": self.status}
+        if self.steps:
+            # Polled through the details only, they move the task forward too
+            self.status = details["status"] = self._next(self.statuses)
+            details["steps"] = self._next(self.steps)
+        return httpx.Response(200, json=details)
+
+
+def run_poller(server: FakeBrowserUse, on_step=None, **poller_kwargs):
+    """Wait for a task of ``server`` with a fast polling BrowserUsePoller."""
+
+    async def _wait():
+        BrowserUse._client = httpx.AsyncClient(
+            base_url="http://browser-use.test",
+            transport=httpx.MockTransport(server.handler),
+        )
+        try:
+            poller = BrowserUsePoller(
+                **{
+                    "min_interval": 0.001,
+                    "max_interval": 0.001,
+                    "steps_refresh_interval": 60,
+                    **poller_kwargs,
+                }
+            )
+            return await asyncio.wait_for(
+                poller.wait("browser-task", on_step), timeout=5
+            )
+        finally:
+            await BrowserUse.aclose()
+
+    return asyncio.run(_wait())
+
+
+def test_returns_details_once_finished():
+    """The full details are returned once the status is terminal."""
+    server = FakeBrowserUse(["running", "running", "finished"], {"output": "done"})
+
+    assert run_poller(server) == {"output": "done", "status": "finished"}
+
+
+def test_retries_transient_errors():
+    """5xx and 429 answers are polled again."""
+    server = FakeBrowserUse(
+        ["running", 503, 429, "running", 502, "finished"], {"output": "done"}
+    )
+
+    details = run_poller(server, max_consecutive_errors=MAX_POLL_ERRORS)
+    assert details == {"output": "done", "status": "finished"}
+
+
+def test_fails_on_client_error():
+    """Other 4xx answers fail the wait at once."""
+    server = FakeBrowserUse([404])
+
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        run_poller(server)
+    assert error.value.response.status_code == httpx.codes.NOT_FOUND
+    # Not retried
+    assert server.requests.count("/task/browser-task/status") == 1
+
+
+def test_fails_after_consecutive_errors():
+    """The wait fails after ``max_consecutive_errors`` failed polls in a row."""
+    server = FakeBrowserUse([503])
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_poller(server, max_consecutive_errors=MAX_POLL_ERRORS)
+    assert server.requests.count("/task/browser-task/status") == MAX_POLL_ERRORS
+
+
+def test_fails_after_max_wait():
+    """A task still running after ``max_wait`` raises TimeoutError."""
+    server = FakeBrowserUse(["running"])
+
+    with pytest.raises(TimeoutError, match="did not finish"):
+        run_poller(server, max_wait=0.05)
+
+
+def test_emits_each_step_once():
+    """Growing step lists only hand the new steps to ``on_step``, in order."""
+    step_lists = [
+        [],
+        ["s1"],
+        ["s1", "s2", "s3"],
+        ["s1", "s2", "s3"],
+        ["s1", "s2", "s3", "s4"],
+    ]
+    server = FakeBrowserUse(
+        ["running"] * (len(step_lists) - 1) + ["finished"], steps=step_lists
+    )
+    emitted = []
+
+    def on_step(task_id, step):
+        emitted.append((task_id, step))
+
+    # Details, and so steps, are fetched on every poll
+    run_poller(server, on_step=on_step, steps_refresh_interval=0)
+
+    assert emitted == [("browser-task", step) for step in ("s1", "s2", "s3", "s4")]
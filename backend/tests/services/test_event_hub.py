@@ -0,0 +1,87 @@
+"""EventHub fan-out, in memory and over Postgres LISTEN/NOTIFY (see ``conftest.py``)."""
+
+import asyncio
+
+import asyncpg
+
+from app.core.settings import settings
+from app.services.event_hub import EventHub, InMemoryEventBackend, PostgresEventBackend
+
+STEP = "step"
+
+
+async def next_event(queue: asyncio.Queue):
+    """Next event of a subscriber queue, failing the test instead of hanging."""
+    return await asyncio.wait_for(queue.get(), timeout=5)
+
+
+def test_in_memory_subscribe_publish_unsubscribe():
+    """Subscribers get the events of their task until they unsubscribe."""
+
+    async def fan_out():
+        hub = EventHub(InMemoryEventBackend(), queue_size=2)
+        await hub.start()
+        async with (
+            hub.subscribe("task-1") as first,
+            hub.subscribe("task-1") as second,
+            hub.subscribe("task-2") as other,
+        ):
+            await hub.publish("task-1", STEP, {"n": 1})
+            assert (await next_event(first)).data == {"n": 1}
+            assert (await next_event(second)).data == {"n": 1}
+            assert other.empty()
+        # Unsubscribed queues are forgotten
+        assert not hub._subscribers
+        await hub.publish("task-1", STEP, {"n": 2})
+        await hub.stop()
+
+    asyncio.run(fan_out())
+
+
+def test_in_memory_slow_subscriber_drops_oldest_events():
+    """A full queue drops its oldest event instead of blocking the publisher."""
+
+    async def overflow():
+        hub = EventHub(InMemoryEventBackend(), queue_size=2)
+        await hub.start()
+        async with hub.subscribe("task-1") as queue:
+            for n in range(3):
+                await hub.publish("task-1", STEP, {"n": n})
+            return [queue.get_nowait().data["n"] for _ in range(queue.qsize())]
+
+    assert asyncio.run(overflow()) == [1, 2]
+
+
+def test_postgres_backend_reconnects(database):
+    """Events flow again once both connections were terminated by the server."""
+    dsn = settings.DATABASE_URL.replace("+asyncpg", "")
+
+    async def reconnect():
+        backend = PostgresEventBackend(dsn, "task_events_test")
+        backend.RECONNECT_MIN_SECONDS = 0.01
+        hub = EventHub(backend)
+        await hub.start()
+        try:
+            async with hub.subscribe("task-1") as queue:
+                await hub.publish("task-1", STEP, {"n": 1})
+                assert (await next_event(queue)).data == {"n": 1}
+
+                lost = backend._listener, backend._publisher
+                admin = await asyncpg.connect(dsn)
+                try:
+                    for connection in lost:
+                        await admin.execute(
+                            "SELECT pg_terminate_backend($1)",
+                            connection.get_server_pid(),
+                        )
+                finally:
+                    await admin.close()
+                while backend._listener in lost or backend._publisher in lost:
+                    await asyncio.sleep(0.01)
+
+                await hub.publish("task-1", STEP, {"n": 2})
+                assert (await next_event(queue)).data == {"n": 2}
+        finally:
+            await hub.stop()
+
+    asyncio.run(asyncio.wait_for(reconnect(), timeout=10))
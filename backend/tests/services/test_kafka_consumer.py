@@ -0,0 +1,173 @@
+"""KafkaConsumer retries, dead letters and fetch sizes, with an in-memory Kafka."""
+
+import asyncio
+from types import SimpleNamespace
+
+from aiokafka import TopicPartition
+
+from app.core.enums import KafkaTaskType, TaskStatus
+from app.schemas.kafka import KafkaTaskRequest
+from app.services.kafka.consumer import KafkaConsumer, _PartitionState
+
+TASK_TOPIC = "agent_tasks"
+RETRY_TOPIC = "agent_tasks_retry"
+DEAD_LETTER_TOPIC = "agent_tasks_dead_letter"
+MAX_ATTEMPTS = 3
+AGENT_CRASHED = "agent crashed"
+BROKER_DOWN = "broker unavailable"
+
+
+class FakeProducer:
+    """Records what is published, the first ``failures`` sends raise."""
+
+    def __init__(self, failures: int = 0):
+        """Fail the first ``failures`` sends."""
+        self.failures = failures
+        self.sent: list[tuple[str, dict]] = []
+
+    async def send_job(self, job: KafkaTaskRequest, topic: str):
+        """Publish a job like ``KafkaProducer.send_job``."""
+        await self.send_message(job.model_dump(mode="json"), topic)
+
+    async def send_message(self, value, topic: str):
+        """Publish any JSON value like ``KafkaProducer.send_message``."""
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError(BROKER_DOWN)
+        self.sent.append((topic, value))
+
+
+class FakeAIOKafkaConsumer:
+    """Assigned partitions without messages, stops its owner on the first fetch."""
+
+    def __init__(self, owner: KafkaConsumer, partitions: list[TopicPartition]):
+        """Assign ``partitions`` to ``owner``."""
+        self.owner = owner
+        self.partitions = partitions
+        self.max_records: list[int] = []
+
+    def assignment(self):
+        """Partitions assigned to this member."""
+        return set(self.partitions)
+
+    async def getmany(self, timeout_ms: int, max_records: int):
+        """Record the fetch size and return no messages."""
+        self.max_records.append(max_records)
+        self.owner.running = False
+        return {}
+
+    def pause(self, tp):
+        """Ignored."""
+
+    def resume(self, tp):
+        """Ignored."""
+
+    async def commit(self, offsets):
+        """Ignored."""
+
+
+def new_consumer(producer: FakeProducer, outcome) -> KafkaConsumer:
+    """Consumer publishing to ``producer``, running jobs with ``outcome``."""
+    consumer = KafkaConsumer("localhost:9092", TASK_TOPIC, partition_concurrency=2)
+    consumer.retry_topic = RETRY_TOPIC
+    consumer.dead_letter_topic = DEAD_LETTER_TOPIC
+    consumer.max_attempts = MAX_ATTEMPTS
+    consumer.producer = producer
+    consumer.running = True
+    consumer._process_execute_task_job = outcome
+    return consumer
+
+
+def message(offset: int, attempts: int = 0) -> SimpleNamespace:
+    """Deserialized task topic message carrying a job."""
+    job = KafkaTaskRequest(
+        task_id="task-1", task_type=KafkaTaskType.EXECUTE_TASK.value, attempts=attempts
+    )
+    return SimpleNamespace(
+        topic=TASK_TOPIC, partition=0, offset=offset, value=job.model_dump(mode="json")
+    )
+
+
+async def dispatch(consumer: KafkaConsumer, *messages) -> _PartitionState:
+    """Dispatch messages of one partition and wait until they are handled."""
+    tp = TopicPartition(TASK_TOPIC, 0)
+    state = _PartitionState(consumer.partition_concurrency)
+    for msg in messages:
+        state.pending[msg.offset] = False
+        consumer._dispatch(tp, state, msg)
+    await asyncio.gather(*consumer._in_flight)
+    return state
+
+
+async def fail(job):
+    """Job run that crashes."""
+    raise RuntimeError(AGENT_CRASHED)
+
+
+async def succeed(job):
+    """Job run that succeeds."""
+
+
+def test_failed_job_is_retried_before_its_offset_is_committed():
+    """The offset is only committable once the retry is published."""
+    # The first publish fails, the offset waits until the retry is written
+    producer = FakeProducer(failures=1)
+    consumer = new_consumer(producer, fail)
+
+    state = asyncio.run(dispatch(consumer, message(0)))
+
+    assert [topic for topic, _ in producer.sent] == [RETRY_TOPIC]
+    retry = producer.sent[0][1]
+    assert retry["attempts"] == 1
+    assert retry["not_before"] is not None
+    assert retry["last_error"] == AGENT_CRASHED
+    assert state.committable_offset() == 1
+
+
+def test_job_is_dead_lettered_after_max_attempts(monkeypatch):
+    """The last attempt is dead-lettered and its task marked as failed."""
+    producer = FakeProducer()
+    consumer = new_consumer(producer, fail)
+    updates = []
+
+    async def update_task(task_id, update_data):
+        updates.append((task_id, update_data))
+
+    monkeypatch.setattr("app.services.task_service.update_task", update_task)
+    messages = message(0, attempts=MAX_ATTEMPTS - 1), message(1)
+    state = asyncio.run(dispatch(consumer, *messages))
+
+    sent = dict(producer.sent)
+    assert set(sent) == {RETRY_TOPIC, DEAD_LETTER_TOPIC}
+    assert sent[DEAD_LETTER_TOPIC]["attempts"] == MAX_ATTEMPTS
+    assert sent[RETRY_TOPIC]["attempts"] == 1
+    assert updates == [("task-1", {"status": TaskStatus.FAILED.value})]
+    assert state.committable_offset() == len(messages)
+
+
+def test_invalid_job_is_dead_lettered():
+    """A message that is not a job is parked as it is."""
+    producer = FakeProducer()
+    consumer = new_consumer(producer, succeed)
+    invalid = SimpleNamespace(topic=TASK_TOPIC, partition=0, offset=0, value={"x": 1})
+
+    state = asyncio.run(dispatch(consumer, invalid))
+
+    assert [topic for topic, _ in producer.sent] == [DEAD_LETTER_TOPIC]
+    assert producer.sent[0][1]["message"] == {"x": 1}
+    assert state.committable_offset() == 1
+
+
+def test_fetches_are_capped_to_free_slots():
+    """Fetches never bring more messages than the partitions can start."""
+    producer = FakeProducer()
+    consumer = new_consumer(producer, succeed)
+    busy, idle = TopicPartition(TASK_TOPIC, 0), TopicPartition(TASK_TOPIC, 1)
+    consumer.consumer = FakeAIOKafkaConsumer(consumer, [busy, idle])
+    consumer.partitions[busy] = _PartitionState(2)
+    consumer.partitions[busy].pending[0] = False
+
+    asyncio.run(consumer.consume())
+
+    # One of the slots of both partitions is taken
+    assert consumer.consumer.max_records == [2 * consumer.partition_concurrency - 1]
@@ -0,0 +1,134 @@
+"""Keys and eviction of the LLM response cache."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import llm_cache
+from app.services.llm_cache import LLMResponseCache, cache_key
+
+MODEL = "gpt-4o"
+TTL_SECONDS = 60
+CODE = "def f():\n    return 1"
+
+
+def message(content: str) -> dict:
+    """Build a user message of ``content``."""
+    return {"role": "user", "content": content}
+
+
+def test_cache_key_is_stable():
+    """Equal requests get equal keys, whatever the key order and sequence type."""
+    first = cache_key(
+        MODEL, [message("hi")], tools=(), temperature=0.0, extra={"a": 1, "b": 2}
+    )
+    second = cache_key(
+        MODEL, (message("hi"),), tools=[], extra={"b": 2, "a": 1}, temperature=0.0
+    )
+    assert first == second
+
+
+def test_cache_key_ignores_line_endings_and_surrounding_whitespace():
+    """CRLF and leading or trailing whitespace do not change what the model sees."""
+    assert cache_key(MODEL, [message(CODE)]) == cache_key(
+        MODEL, [message("\n  " + CODE.replace("\n", "\r\n") + " \r\n")]
+    )
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        CODE.replace("    ", "  "),
+        CODE.replace("\n", " "),
+        "def  f():\n    return 1",
+    ],
+)
+def test_cache_key_keeps_inner_whitespace(other):
+    """Indentation, line breaks and spacing inside the text are part of the key."""
+    assert cache_key(MODEL, [message(CODE)]) != cache_key(MODEL, [message(other)])
+
+
+def test_cache_key_covers_model_tools_and_options():
+    """Another model, tool or option is another request."""
+    key = cache_key(MODEL, [message("hi")])
+    assert key != cache_key("gpt-4o-mini", [message("hi")])
+    assert key != cache_key(MODEL, [message("hi")], tools=[{"name": "search"}])
+    assert key != cache_key(MODEL, [message("hi")], temperature=0.7)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock of the cache, moved by the test."""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_memory_tier_evicts_least_recently_used(clock):
+    """Past memory_size entries, the least recently read one goes first."""
+    cache = LLMResponseCache(memory_size=2, path="", ttl_seconds=TTL_SECONDS)
+
+    async def fill():
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        assert await cache.get("a") == "1"
+        await cache.set("c", "3")
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(fill()) == ["1", None, "3"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["memory_entries"] == cache.memory_size
+
+
+def test_entries_expire_after_ttl(clock, tmp_path):
+    """Entries are served until ttl_seconds after they were stored, in both tiers."""
+    cache = LLMResponseCache(
+        memory_size=10,
+        path=str(tmp_path / "llm_cache.db"),
+        disk_size=10,
+        ttl_seconds=TTL_SECONDS,
+    )
+
+    async def expire():
+        await cache.set("a", "1")
+        clock.value += TTL_SECONDS - 1
+        fresh = await cache.get("a")
+        clock.value += 1
+        return fresh, await cache.get("a")
+
+    try:
+        assert asyncio.run(expire()) == ("1", None)
+    finally:
+        cache.close()
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_tier_keeps_most_recently_used_and_promotes_hits(clock, tmp_path):
+    """The disk tier is capped at disk_size entries and refills the memory tier."""
+    path = str(tmp_path / "llm_cache.db")
+    writer = LLMResponseCache(
+        memory_size=10, path=path, disk_size=2, ttl_seconds=TTL_SECONDS
+    )
+    reader = LLMResponseCache(
+        memory_size=10, path=path, disk_size=2, ttl_seconds=TTL_SECONDS
+    )
+
+    async def overflow():
+        for key in ("a", "b", "c"):
+            clock.value += 1
+            await writer.set(key, key.upper())
+        found = [await reader.get(key) for key in ("a", "b", "c")]
+        # Promoted: served from memory from now on
+        await reader.get("c")
+        return found
+
+    try:
+        found = asyncio.run(overflow())
+    finally:
+        writer.close()
+        reader.close()
+    assert found == [None, "B", "C"]
+    assert writer.stats()["evictions"] == 1
+    assert reader.stats()["hits_disk"] == len([value for value in found if value])
+    assert reader.stats()["hits_memory"] == 1
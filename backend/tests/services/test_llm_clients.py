@@ -0,0 +1,222 @@
+"""Rate limiting and failover of chat completions, with fake deployments."""
+
+import asyncio
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.llm import ModelRegistry, azure_openai_gpt_4o_v1
+from app.services import model_router as router_module
+from app.services.model_router import ModelRouter
+
+# The routed client wraps autogen's chat completion clients
+pytest.importorskip("autogen_core")
+from app.services import llm_clients
+
+REGIONS = (("east-lb", "east"), ("east", "east"), ("west", "west"))
+
+REGISTRY = ModelRegistry(
+    [
+        replace(
+            azure_openai_gpt_4o_v1,
+            id=model_id,
+            llm_metadata={
+                "model": "gpt-4o",
+                "endpoint": f"https://{region}.example",
+                "deployment": "gpt-4o",
+                "api_version": "2024-08-01-preview",
+            },
+        )
+        for model_id, region in REGIONS
+    ]
+)
+MESSAGES = []
+
+
+class FakeError(Exception):
+    """An API error with a status code."""
+
+    def __init__(self, status_code: int):
+        """Build the error, without a Retry-After header."""
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FakeDeployment:
+    """Answers with its name, or raises ``error``."""
+
+    def __init__(self, name: str, error: Exception | None = None):
+        """Serve as ``name``."""
+        self.name = name
+        self.error = error
+        self.calls = 0
+
+    async def create(self, messages, **kwargs):
+        """Count the call, then fail or answer."""
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.name
+
+    async def create_stream(self, messages, **kwargs):
+        """Count the call, then fail before the first chunk or stream the name."""
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        yield self.name
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """Route the routed clients with a fresh router on REGISTRY."""
+    monkeypatch.setattr(router_module, "get_deployment_id", REGISTRY.deployment_id)
+    monkeypatch.setattr(router_module, "get_equivalent_models", REGISTRY.equivalents)
+    monkeypatch.setattr(
+        router_module, "rate_limiter", SimpleNamespace(remaining=lambda model_id: 1.0)
+    )
+    monkeypatch.setattr(llm_clients, "get_deployment_id", REGISTRY.deployment_id)
+    router = ModelRouter(enabled=True, cooldown_seconds=30)
+    monkeypatch.setattr(llm_clients, "model_router", router)
+    return router
+
+
+def routed(model_id: str, deployments: dict[str, FakeDeployment]):
+    """Routed client of ``model_id`` over ``deployments`` by deployment id."""
+    registry = SimpleNamespace(
+        deployment=lambda model_id: deployments[REGISTRY.deployment_id(model_id)]
+    )
+    return llm_clients.RoutedChatCompletionClient(model_id, registry)
+
+
+async def stream(client) -> list:
+    """Chunks of a routed stream."""
+    return [chunk async for chunk in client.create_stream(MESSAGES)]
+
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_fails_over_to_another_deployment(router, status_code):
+    """A throttled deployment is not retried under its other id."""
+    deployments = {
+        "east-lb": FakeDeployment("east-lb", FakeError(status_code)),
+        "west": FakeDeployment("west"),
+    }
+    client = routed("east", deployments)
+    assert asyncio.run(client.create(MESSAGES)) == "west"
+    assert deployments["east-lb"].calls == 1
+    # The cooled down deployment is skipped by the next call
+    assert asyncio.run(client.create(MESSAGES)) == "west"
+    assert deployments["east-lb"].calls == 1
+    assert router.stats()["east-lb"]["failovers"] == 1
+
+
+def test_stream_fails_over_before_the_first_chunk(router):
+    """A stream failing before its first chunk continues on the next deployment."""
+    deployments = {
+        "east-lb": FakeDeployment("east-lb", FakeError(429)),
+        "west": FakeDeployment("west"),
+    }
+    assert asyncio.run(stream(routed("east-lb", deployments))) == ["west"]
+
+
+def test_raises_the_last_error_when_every_deployment_fails(router):
+    """With every deployment throttled, the caller gets the last 429."""
+    last = FakeError(429)
+    deployments = {
+        "east-lb": FakeDeployment("east-lb", FakeError(503)),
+        "west": FakeDeployment("west", last),
+    }
+    with pytest.raises(FakeError) as raised:
+        asyncio.run(routed("east", deployments).create(MESSAGES))
+    assert raised.value is last
+
+
+def test_client_errors_do_not_fail_over(router):
+    """A 400 is the caller's fault, no other deployment is tried."""
+    deployments = {
+        "east-lb": FakeDeployment("east-lb", FakeError(400)),
+        "west": FakeDeployment("west"),
+    }
+    with pytest.raises(FakeError):
+        asyncio.run(routed("east", deployments).create(MESSAGES))
+    assert deployments["west"].calls == 0
+
+
+class RecordingLimiter:
+    """Rate limiter recording what is reserved and charged, never waiting."""
+
+    def __init__(self):
+        """Start without calls."""
+        self.acquired: list[tuple[str, int]] = []
+        self.charged: list[tuple[str, int]] = []
+
+    async def acquire(self, model_id: str, tokens: int = 0) -> float:
+        """Record the reservation."""
+        self.acquired.append((model_id, tokens))
+        return 0.0
+
+    async def charge(self, model_id: str, tokens: int):
+        """Record the charge."""
+        self.charged.append((model_id, tokens))
+
+
+class CountingClient:
+    """Counts prompts as ``prompt_tokens`` tokens and completes with usage."""
+
+    def __init__(self, prompt_tokens: int | None, completion_tokens: int):
+        """Count ``prompt_tokens`` (None: unknown to the tokenizer)."""
+        self.prompt_tokens = prompt_tokens
+        self.result = llm_clients.CreateResult(
+            finish_reason="stop",
+            content="done",
+            usage=llm_clients.RequestUsage(
+                prompt_tokens=prompt_tokens or 0,
+                completion_tokens=completion_tokens,
+            ),
+            cached=False,
+        )
+
+    def count_tokens(self, messages, **kwargs) -> int:
+        """Tokens of the prompt."""
+        if self.prompt_tokens is None:
+            error = "Model not known to the tokenizer"
+            raise KeyError(error)
+        return self.prompt_tokens
+
+    async def create(self, messages, **kwargs):
+        """Complete."""
+        return self.result
+
+    async def create_stream(self, messages, **kwargs):
+        """Stream a chunk, then the result."""
+        yield "done"
+        yield self.result
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """Record what the rate-limited clients reserve and charge."""
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(llm_clients, "rate_limiter", limiter)
+    return limiter
+
+
+def test_rate_limited_client_reserves_prompt_and_charges_completion(limiter):
+    """Prompt tokens are reserved before the call, completion tokens after it."""
+    client = llm_clients.RateLimitedChatCompletionClient(
+        "east", CountingClient(prompt_tokens=120, completion_tokens=30)
+    )
+    asyncio.run(client.create(MESSAGES))
+    asyncio.run(stream(client))
+    assert limiter.acquired == [("east", 120), ("east", 120)]
+    assert limiter.charged == [("east", 30), ("east", 30)]
+
+
+def test_rate_limited_client_counts_requests_of_unknown_models(limiter):
+    """A prompt the tokenizer cannot count reserves a request only."""
+    client = llm_clients.RateLimitedChatCompletionClient(
+        "local", CountingClient(prompt_tokens=None, completion_tokens=5)
+    )
+    asyncio.run(client.create(MESSAGES))
+    assert limiter.acquired == [("local", 0)]
+    assert limiter.charged == [("local", 5)]
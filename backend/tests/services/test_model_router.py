@@ -0,0 +1,137 @@
+"""Ranking, cooldowns and failover decisions of the model router."""
+
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.llm import ModelRegistry, azure_openai_gpt_4o_v1
+from app.services import model_router as router_module
+from app.services.model_router import ModelRouter
+
+
+def azure(model_id: str, endpoint: str):
+    """Build an Azure gpt-4o deployment on ``endpoint``."""
+    return replace(
+        azure_openai_gpt_4o_v1,
+        id=model_id,
+        llm_metadata={
+            "model": "gpt-4o",
+            "endpoint": endpoint,
+            "deployment": "gpt-4o",
+            "api_version": "2024-08-01-preview",
+        },
+    )
+
+
+# The load-balanced id is configured on the direct east endpoint
+REGISTRY = ModelRegistry(
+    [
+        azure("east-lb", "https://east.example"),
+        azure("east", "https://east.example"),
+        azure("west", "https://west.example"),
+    ]
+)
+COOLDOWN = 30.0
+
+
+class FakeError(Exception):
+    """An API error with a status code and, maybe, a Retry-After header."""
+
+    def __init__(self, status_code: int | None, retry_after: str | None = None):
+        """Build the error, with a response carrying ``retry_after`` if given."""
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        headers = {} if retry_after is None else {"retry-after": retry_after}
+        self.response = SimpleNamespace(headers=headers)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Route on REGISTRY with a clock and rate budgets (``budgets``) set by the test."""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(
+        router_module, "time", SimpleNamespace(monotonic=lambda: now.value)
+    )
+    monkeypatch.setattr(router_module, "get_deployment_id", REGISTRY.deployment_id)
+    monkeypatch.setattr(router_module, "get_equivalent_models", REGISTRY.equivalents)
+    budgets = {}
+    monkeypatch.setattr(
+        router_module,
+        "rate_limiter",
+        SimpleNamespace(remaining=lambda model_id: budgets.get(model_id, 1.0)),
+    )
+    now.budgets = budgets
+    return now
+
+
+def test_ids_of_one_deployment_are_one_candidate(clock):
+    """Ids on the same endpoint and deployment are tried once, as the first id."""
+    router = ModelRouter(enabled=True, cooldown_seconds=COOLDOWN)
+    assert router.candidates("east") == ["east-lb", "west"]
+    assert router.candidates("east-lb") == ["east-lb", "west"]
+    assert router.candidates("west") == ["west", "east-lb"]
+    assert ModelRouter(enabled=False).candidates("east") == ["east-lb"]
+
+
+def test_ranks_by_latency_errors_and_budget(clock):
+    """Faster deployments go first, errors and an exhausted budget push them back."""
+    router = ModelRouter(enabled=True, cooldown_seconds=COOLDOWN)
+    router.record_success("east-lb", 0.5)
+    router.record_success("west", 0.2)
+    assert router.candidates("east") == ["west", "east-lb"]
+
+    clock.budgets["west"] = 0.1
+    assert router.candidates("east") == ["east-lb", "west"]
+
+    clock.budgets["west"] = 1.0
+    for _ in range(5):
+        router.record_failure("west")
+    clock.value += COOLDOWN + 1
+    assert router.candidates("east") == ["east-lb", "west"]
+
+
+def test_cooldown_ranks_last_until_it_passes(clock):
+    """A failed deployment ranks last until its cooldown ends."""
+    router = ModelRouter(enabled=True, cooldown_seconds=COOLDOWN)
+    router.record_success("east-lb", 0.1)
+    router.record_success("west", 0.5)
+    router.record_failure("east-lb", retry_after=5)
+    assert router.candidates("east") == ["west", "east-lb"]
+    assert router.stats()["east-lb"]["cooling_down"]
+
+    clock.value += 5.1
+    # Still a little worse for the recent error, but no longer cooling down
+    assert not router.stats()["east-lb"]["cooling_down"]
+    assert router.candidates("east")[0] == "east-lb"
+
+
+@pytest.mark.parametrize(
+    ("retry_after", "cooldown"),
+    [("7", 7.0), ("0.5", 0.5), ("soon", COOLDOWN), (None, COOLDOWN)],
+)
+def test_fail_over_honours_retry_after(clock, retry_after, cooldown):
+    """A 429 cools the deployment down for Retry-After seconds, if it is a number."""
+    router = ModelRouter(enabled=True, cooldown_seconds=COOLDOWN)
+    candidates = router.candidates("east")
+    assert router.fail_over(FakeError(429, retry_after), candidates, 0)
+    assert router._health["east-lb"].cooldown_until == clock.value + cooldown
+    assert router.stats()["east-lb"]["failovers"] == 1
+
+
+def test_fail_over_only_on_retriable_errors(clock):
+    """5xx and connection errors fail over, client errors and the last one do not."""
+    router = ModelRouter(enabled=True, cooldown_seconds=COOLDOWN)
+    candidates = router.candidates("east")
+    retriable = [FakeError(503), FakeError(429), ConnectionError("reset")]
+    for error in retriable:
+        assert router.fail_over(error, candidates, 0)
+
+    assert not router.fail_over(FakeError(400), candidates, 0)
+    assert not router.fail_over(ValueError("bad prompt"), candidates, 0)
+    assert router.stats()["east-lb"]["failures"] == len(retriable)
+
+    # The last candidate failing is recorded, there is nothing to fail over to
+    assert not router.fail_over(FakeError(503), candidates, 1)
+    assert router.stats()["west"]["failures"] == 1
+    assert router.stats()["west"]["cooling_down"]
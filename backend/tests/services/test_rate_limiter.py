@@ -0,0 +1,113 @@
+"""Token buckets of the LLM rate limiter, on a frozen clock."""
+
+import asyncio
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.llm import openai_gpt_4o_v1
+from app.services import rate_limiter as limiter_module
+from app.services.rate_limiter import LocalBucketStore, ModelRateLimiter
+
+PERIOD_SECONDS = 60
+# One request per second, 100 tokens per second
+REQUESTS = replace(
+    openai_gpt_4o_v1,
+    id="requests",
+    api_rate_limit=60,
+    rate_limit_in_seconds=PERIOD_SECONDS,
+)
+TOKENS = replace(
+    openai_gpt_4o_v1,
+    id="tokens",
+    token_rate_limit=6000,
+    rate_limit_in_seconds=PERIOD_SECONDS,
+)
+MODELS = {model.id: model for model in (REQUESTS, TOKENS)}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Monotonic clock of the buckets, moved by the test; MODELS are registered."""
+    now = SimpleNamespace(value=100.0)
+    monkeypatch.setattr(
+        limiter_module, "time", SimpleNamespace(monotonic=lambda: now.value)
+    )
+    monkeypatch.setattr(limiter_module, "get_model", MODELS.get)
+    return now
+
+
+def test_local_bucket_starts_full_goes_into_debt_and_refills(clock):
+    """A bucket gives its capacity at once, then owes, then refills at its rate."""
+    store = LocalBucketStore()
+
+    async def drain():
+        levels = [await store.reserve("key", 4, capacity=10, rate=2) for _ in range(3)]
+        clock.value += 3
+        levels.append(await store.reserve("key", 0, capacity=10, rate=2))
+        clock.value += 60
+        levels.append(await store.reserve("key", 1, capacity=10, rate=2))
+        levels.append(await store.reserve("other", 1, capacity=10, rate=2))
+        return levels
+
+    # Refilling never goes past the capacity, buckets are independent
+    assert asyncio.run(drain()) == [6, 2, -2, 4, 9, 9]
+
+
+def test_reserve_delay_is_the_debt_over_the_rate(clock):
+    """Past a period's allowance, each request waits one more refill interval."""
+    limiter = ModelRateLimiter(LocalBucketStore())
+
+    async def burst():
+        return [
+            await limiter._reserve(REQUESTS, "requests", REQUESTS.api_rate_limit, 1)
+            for _ in range(REQUESTS.api_rate_limit + 3)
+        ]
+
+    delays = asyncio.run(burst())
+    assert delays[: REQUESTS.api_rate_limit] == [0.0] * REQUESTS.api_rate_limit
+    assert delays[REQUESTS.api_rate_limit :] == [1.0, 2.0, 3.0]
+    assert limiter.remaining(REQUESTS.id) == 0.0
+
+    # Half a period later half the bucket is back, minus the debt
+    clock.value += PERIOD_SECONDS / 2
+    assert limiter.remaining(REQUESTS.id) == pytest.approx(27 / 60)
+
+
+def test_a_call_larger_than_the_limit_is_clamped(clock):
+    """A prompt above a whole period's tokens drains the bucket instead of owing."""
+    limiter = ModelRateLimiter(LocalBucketStore())
+    limit = TOKENS.token_rate_limit
+
+    async def oversized():
+        first = await limiter._reserve(TOKENS, "tokens", limit, limit * 5)
+        second = await limiter._reserve(TOKENS, "tokens", limit, 300)
+        return first, second
+
+    # 300 tokens at 100 tokens per second
+    assert asyncio.run(oversized()) == (0.0, 3.0)
+
+
+def test_acquire_waits_and_charge_delays_the_next_caller(clock, monkeypatch):
+    """``acquire`` sleeps the delay, completion tokens charged later count too."""
+    slept = []
+
+    async def sleep(delay):
+        slept.append(delay)
+
+    monkeypatch.setattr(limiter_module, "asyncio", SimpleNamespace(sleep=sleep))
+    limiter = ModelRateLimiter(LocalBucketStore())
+
+    async def calls():
+        await limiter.acquire(TOKENS.id, 5900)
+        await limiter.charge(TOKENS.id, 200)
+        return await limiter.acquire(TOKENS.id, 100), await limiter.acquire("free", 1)
+
+    assert asyncio.run(calls()) == (2.0, 0.0)
+    assert slept == [2.0]
+    stats = limiter.stats()[TOKENS.id]
+    assert stats["delayed_calls"] == 1
+    assert stats["tokens"] == sum((5900, 200, 100))
+    assert stats["max_delay_ms"] == pytest.approx(2000)
+    assert limiter.stats()["free"]["calls"] == 1
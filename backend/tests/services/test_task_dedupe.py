@@ -0,0 +1,145 @@
+"""Singleflight of identical tasks in one process, with an in-memory repository."""
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.core.enums import TaskDedupeMode, TaskStatus
+from app.models.task import Task
+from app.services.task_dedupe import TaskDeduplicator
+
+QUERY = "Summarize the latest release notes"
+
+
+class FakeRepository:
+    """Task rows by id; no task of another process leads anything."""
+
+    def __init__(self):
+        """Start without tasks."""
+        self.tasks: dict[str, SimpleNamespace] = {}
+        self.lookups: list[dict] = []
+        self.touched: list[str] = []
+
+    def add(self, task: Task):
+        """Store the row of ``task``."""
+        self.tasks[str(task.task_id)] = SimpleNamespace(
+            task_id=task.task_id, status=task.status, task_metadata={}
+        )
+
+    async def get(self, task_id: str):
+        """Row of ``task_id``."""
+        return self.tasks.get(task_id)
+
+    async def patch_metadata(self, task_id: str, path: str, value):
+        """Set one key of the row's metadata."""
+        self.tasks[task_id].task_metadata[path] = value
+
+    async def find_dedupe_leader(
+        self, fingerprint, statuses, exclude_task_id, **kwargs
+    ):
+        """Record the lookup, nothing is found."""
+        self.lookups.append({"statuses": statuses, **kwargs})
+
+    async def touch(self, task_id: str):
+        """Record a leader heartbeat."""
+        self.touched.append(task_id)
+
+
+def new_task() -> Task:
+    """Build an in-progress task of QUERY."""
+    return Task(
+        task_id=uuid.uuid4(),
+        query=QUERY,
+        multi_agent_framework="magentic-one",
+        llm_model="gpt-4o",
+        enable_internet=True,
+        status=TaskStatus.IN_PROGRESS.value,
+    )
+
+
+def deduplicator(max_wait_seconds: float = 5) -> TaskDeduplicator:
+    """Build an enabled deduplicator on a FakeRepository."""
+    deduplicator = TaskDeduplicator(
+        enabled=True,
+        freshness_seconds=600,
+        max_wait_seconds=max_wait_seconds,
+        poll_seconds=0.01,
+    )
+    deduplicator.repository = FakeRepository()
+    return deduplicator
+
+
+async def lead_and_follow(dedupe: TaskDeduplicator, leader_status: str, hold: float):
+    """Run a leader ending with ``leader_status`` after ``hold`` seconds.
+
+    Returns what an identical task started meanwhile gets, and the leader.
+    """
+    leader, follower = new_task(), new_task()
+    for task in (leader, follower):
+        dedupe.repository.add(task)
+    led = asyncio.Event()
+
+    async def lead():
+        async with dedupe.deduplicate(leader) as shared:
+            assert shared is None
+            led.set()
+            await asyncio.sleep(hold)
+            dedupe.repository.tasks[str(leader.task_id)].status = leader_status
+
+    async def follow():
+        await led.wait()
+        async with dedupe.deduplicate(follower) as shared:
+            return shared
+
+    _, shared = await asyncio.gather(lead(), follow())
+    return shared, leader
+
+
+def test_follower_takes_the_result_of_a_successful_leader():
+    """An identical task waits for the running one and shares its result."""
+    dedupe = deduplicator()
+    shared, leader = asyncio.run(
+        lead_and_follow(dedupe, TaskStatus.SUCCESS.value, hold=0.05)
+    )
+    assert shared.mode == TaskDedupeMode.COALESCED.value
+    assert shared.source.task_id == leader.task_id
+    assert dedupe.stats()["coalesced"] == 1
+    assert dedupe.stats()["in_flight"] == 0
+
+
+def test_follower_runs_itself_when_the_leader_fails():
+    """A failed leader's followers run, the first one leading the rest."""
+    dedupe = deduplicator()
+    shared, _ = asyncio.run(lead_and_follow(dedupe, TaskStatus.FAILED.value, hold=0.05))
+    assert shared is None
+    assert dedupe.stats()["fallbacks"] == 1
+    # The follower led the fingerprint after the leader
+    assert dedupe.stats()["leaders"] == len(dedupe.repository.tasks)
+    assert dedupe.stats()["in_flight"] == 0
+
+
+def test_follower_stops_waiting_after_max_wait():
+    """A leader still running after max_wait_seconds is not waited for any longer."""
+    dedupe = deduplicator(max_wait_seconds=0.05)
+    shared, _ = asyncio.run(lead_and_follow(dedupe, TaskStatus.SUCCESS.value, hold=0.3))
+    assert shared is None
+    assert dedupe.stats()["fallbacks"] == 1
+
+
+def test_only_live_leaders_of_other_processes_are_waited_for():
+    """The running-leader lookup is bounded by the lease, leaders heartbeat."""
+    dedupe = deduplicator()
+    dedupe.heartbeat_seconds = 0.01
+    task = new_task()
+    dedupe.repository.add(task)
+
+    async def lead():
+        async with dedupe.deduplicate(task):
+            await asyncio.sleep(0.05)
+
+    asyncio.run(lead())
+    running = dedupe.repository.lookups[-1]
+    assert TaskStatus.IN_PROGRESS.value in running["statuses"]
+    assert running["updated_within_seconds"] == dedupe.lease_seconds
+    assert dedupe.repository.touched
+    assert set(dedupe.repository.touched) == {str(task.task_id)}
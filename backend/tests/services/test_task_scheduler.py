@@ -0,0 +1,60 @@
+"""Slots of the task scheduler when a waiter is cancelled."""
+
+import asyncio
+
+import pytest
+
+from app.services.task_scheduler import TaskScheduler
+
+
+async def hold(
+    scheduler: TaskScheduler, task_id: str, release: asyncio.Event, **kwargs
+):
+    """Hold a slot of ``scheduler`` until ``release`` is set."""
+    async with scheduler.slot(task_id, "AM1", "gpt-4o", **kwargs):
+        await release.wait()
+
+
+async def cancel_while_queued(granted_meanwhile: bool):
+    """Cancel a task in ``on_queued``, possibly after it was granted its slot."""
+    scheduler = TaskScheduler(max_concurrent=1, framework_limits={}, model_limits={})
+    release_first = asyncio.Event()
+    first = asyncio.create_task(hold(scheduler, "first", release_first))
+    await asyncio.sleep(0)
+
+    in_on_queued = asyncio.Event()
+
+    async def on_queued(position: int):
+        in_on_queued.set()
+        await asyncio.Event().wait()  # a slow progress update
+
+    second = asyncio.create_task(
+        hold(scheduler, "second", asyncio.Event(), on_queued=on_queued)
+    )
+    await in_on_queued.wait()
+    if granted_meanwhile:
+        release_first.set()
+        await first
+    second.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    if not granted_meanwhile:
+        release_first.set()
+        await first
+
+    assert scheduler.stats()["running"] == 0
+    assert scheduler.stats()["waiting"] == 0
+    # The slot is free for the next task
+    release_third = asyncio.Event()
+    release_third.set()
+    await asyncio.wait_for(hold(scheduler, "third", release_third), timeout=1)
+
+
+def test_cancelled_in_on_queued_leaves_the_queue():
+    """A task cancelled while waiting leaves the queue."""
+    asyncio.run(cancel_while_queued(granted_meanwhile=False))
+
+
+def test_cancelled_in_on_queued_releases_a_granted_slot():
+    """A task cancelled right after it got its slot gives it back."""
+    asyncio.run(cancel_while_queued(granted_meanwhile=True))
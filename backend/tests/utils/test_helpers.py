@@ -0,0 +1,43 @@
+"""read_lines_backwards on files written to a temp dir."""
+
+import pytest
+
+from app.utils.helpers import read_lines_backwards
+
+BLOCK_SIZE = 4
+
+
+def lines_backwards(tmp_path, content: bytes, **kwargs) -> list[bytes]:
+    """Write ``content`` to a file and read its lines backwards."""
+    path = tmp_path / "lines.log"
+    path.write_bytes(content)
+    return list(read_lines_backwards(str(path), **kwargs))
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, BLOCK_SIZE, 64 * 1024])
+def test_lines_crossing_blocks(tmp_path, block_size):
+    """Lines longer than a block, or split across blocks, come back whole."""
+    content = b"first line\nsecond\n\nlast of all"
+
+    lines = lines_backwards(tmp_path, content, block_size=block_size)
+
+    assert lines == [b"last of all", b"", b"second", b"first line"]
+
+
+def test_trailing_newline(tmp_path):
+    """A file ending with a newline yields an empty last line first."""
+    lines = lines_backwards(tmp_path, b"a\nb\n", block_size=BLOCK_SIZE)
+
+    assert lines == [b"", b"b", b"a"]
+
+
+def test_crlf(tmp_path):
+    """Windows line endings are stripped, even when a block ends between them."""
+    lines = lines_backwards(tmp_path, b"one\r\ntwo\r\nthree", block_size=BLOCK_SIZE)
+
+    assert lines == [b"three", b"two", b"one"]
+
+
+def test_empty_file(tmp_path):
+    """An empty file is a single empty line."""
+    assert lines_backwards(tmp_path, b"") == [b""]
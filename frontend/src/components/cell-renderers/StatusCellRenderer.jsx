@@ -7,6 +7,7 @@ export const StatusCellRenderer = ({ value }) => {
         success: 'bg-green-100 text-green-700 border-green-300',
         failure: 'bg-red-100 text-red-700 border-red-300',
         created: 'bg-yellow-100 text-yellow-700 border-yellow-300',
+        queued: 'bg-indigo-100 text-indigo-700 border-indigo-300',
         in_progress: 'bg-blue-100 text-blue-700 border-blue-300',
         empty: 'bg-gray-100 text-gray-400 border-gray-300', // Subtle style for missing status
     };
@@ -16,6 +17,7 @@ export const StatusCellRenderer = ({ value }) => {
         success: 'bg-green-500',
         failure: 'bg-red-500',
         created: 'bg-yellow-500',
+        queued: 'bg-indigo-500',
         in_progress: 'bg-blue-500',
         empty: 'bg-gray-400',
     };
@@ -4,6 +4,7 @@ import StatusPillView from './StatusPill.view';
 const StatusPillController = ({ status }) => {
     const statusStyles = {
         success: 'bg-green-100 text-green-700 border border-green-300',
+        queued: 'bg-indigo-100 text-indigo-700 border border-indigo-300',
         in_progress: 'bg-blue-100 text-blue-700 border border-blue-300',
         failure: 'bg-red-100 text-red-700 border border-red-300',
         created: 'bg-gray-100 text-gray-700 border border-gray-300',
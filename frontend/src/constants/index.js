@@ -56,6 +56,7 @@ export const MULTI_AGENT_FRAMEWORKS = [
 
 export const TASKS_STATUS = {
     SUCCESS: 'success',
+    QUEUED: 'queued',
     IN_PROGRESS: 'in_progress',
     FAILED: 'failure',
     CREATED: 'created',